@@ -30,6 +30,7 @@
 #include "command_reader.h"
 #include "decode.h"
 #include "measures_handler.h"
+#include "oml_measures.h"
 #include "sniffer_server.h"
 
 #define TTY_PATH "/dev/ttyCN"
@@ -37,9 +38,10 @@
 
 static void usage(char *program_name)
 {
-    PRINT_ERROR("Usage: %s [-d] [-t tty_path] [-c oml_config_file]\n",
+    PRINT_ERROR("Usage: %s [-d] [-b fd] [-t tty_path] [-c oml_config_file]\n",
             program_name);
     PRINT_ERROR("  %c: debug mode, print measures\n", 'd');
+    PRINT_ERROR("  %c: write binary measures to file descriptor\n", 'b');
     PRINT_ERROR("  %c: Set tty path. Default %s\n", 't', TTY_PATH);
     PRINT_ERROR("  %c: OML config file path.\n", 'c');
 }
@@ -52,16 +54,20 @@ int main(int argc, char *argv[])
 
 
     int print_measures = 0;
+    int binary_fd = -1;
     char *tty_path = TTY_PATH;
     char *oml_config_file_path = NULL;
     char c;
     opterr = 0;
 
-    while ((c = getopt(argc, argv, "dt:c:")) != (char)-1) {
+    while ((c = getopt(argc, argv, "db:t:c:")) != (char)-1) {
         switch (c) {
             case 'd':
                 print_measures = 1;
                 break;
+            case 'b':
+                binary_fd = atoi(optarg);
+                break;
             case 't':
                 tty_path = optarg;
                 break;
@@ -69,7 +75,7 @@ int main(int argc, char *argv[])
                 oml_config_file_path = optarg;
                 break;
             case '?':
-                if (optopt == 't' || optopt == 'c')
+                if (optopt == 't' || optopt == 'c' || optopt == 'b')
                     PRINT_ERROR("Option -%c requires an " \
                             "argument.\n", optopt);
                 else if (isprint(optopt))
@@ -94,6 +100,7 @@ int main(int argc, char *argv[])
 
     // measures and OML
     measures_handler_start(print_measures, oml_config_file_path);
+    oml_measures_binary_output(binary_fd);
     atexit(measures_handler_stop);
 
     // stdin parsing
@@ -20,6 +20,8 @@
 *******************************************************************************/
 
 #include <stdio.h>
+#include <unistd.h>
+#include <errno.h>
 #include <oml2/omlc.h>
 #define OML_FROM_MAIN
 #include "control_node_measures_oml.h"
@@ -29,6 +31,48 @@
 
 static int oml_measure_started = 0;
 static int oml_print = 0;
+static int binary_fd = -1;
+
+
+/*
+ * Binary measures output, one fixed size frame per measure in native byte
+ * order. 48 bytes, so it can be decoded as 12 uint32 or 6 double values.
+ */
+struct binary_measure {
+    uint8_t  type;
+    uint8_t  crc_ok;
+    uint16_t reserved;
+    uint32_t timestamp_s;
+    uint32_t timestamp_us;
+    uint32_t reserved2;
+    double   values[4];
+} __attribute__((packed));
+
+
+void oml_measures_binary_output(int fd)
+{
+    binary_fd = fd;
+}
+
+
+static void binary_measure_write(uint8_t type, uint32_t timestamp_s,
+        uint32_t timestamp_us, double val0, double val1, double val2,
+        double val3, uint8_t crc_ok)
+{
+    struct binary_measure frame = {type, crc_ok, 0, timestamp_s,
+        timestamp_us, 0, {val0, val1, val2, val3}};
+    ssize_t ret;
+
+    if (binary_fd < 0)
+        return;
+    do {
+        ret = write(binary_fd, &frame, sizeof(frame));
+    } while (ret < 0 && errno == EINTR);
+    if (ret != sizeof(frame)) {
+        PRINT_ERROR("Binary measures output write failed: %zd\n", ret);
+        binary_fd = -1;
+    }
+}
 
 int oml_measures_start(char *oml_config_file_path, int print_measures)
 {
@@ -78,6 +122,9 @@ int oml_measures_stop(void)
 
     oml_measure_started = 0;
     oml_print = 0;
+    if (binary_fd >= 0)
+        close(binary_fd);
+    binary_fd = -1;
     return ret;
 }
 
@@ -91,6 +138,8 @@ void oml_measures_consumption(uint32_t timestamp_s, uint32_t timestamp_us,
     if (oml_print)
         PRINT_MEASURE("consumption_measure %u.%06u %f %f %f\n",
                 timestamp_s, timestamp_us, power, voltage, current);
+    binary_measure_write(BINARY_CONSUMPTION, timestamp_s, timestamp_us,
+            power, voltage, current, 0.0, 0);
 }
 
 void oml_measures_radio(uint32_t timestamp_s, uint32_t timestamp_us,
@@ -102,6 +151,8 @@ void oml_measures_radio(uint32_t timestamp_s, uint32_t timestamp_us,
     if (oml_print)
         PRINT_MEASURE("radio_measure %u.%06u %u %i\n",
                 timestamp_s, timestamp_us, channel, rssi);
+    binary_measure_write(BINARY_RADIO, timestamp_s, timestamp_us,
+            channel, rssi, 0.0, 0.0, 0);
 }
 
 void oml_measures_sniffer(uint32_t timestamp_s, uint32_t timestamp_us,
@@ -116,6 +167,8 @@ void oml_measures_sniffer(uint32_t timestamp_s, uint32_t timestamp_us,
         PRINT_MEASURE("sniffer %u.%06u %u %i %u %s %u\n",
                 timestamp_s, timestamp_us,
                 channel, rssi, lqi, (crc_ok ? "crc_ok" : "crc_error"), length);
+    binary_measure_write(BINARY_SNIFFER, timestamp_s, timestamp_us,
+            channel, rssi, lqi, length, crc_ok);
 }
 
 void oml_measures_event(uint32_t timestamp_s, uint32_t timestamp_us,
@@ -22,8 +22,16 @@
 #ifndef OML_MEASURES_H
 #define OML_MEASURES_H
 
+#include <stdint.h>
+
+/* Binary measures output frames types */
+#define BINARY_CONSUMPTION 1
+#define BINARY_RADIO       2
+#define BINARY_SNIFFER     3
+
 int oml_measures_start(char *oml_config_file_path, int print_measures);
 int oml_measures_stop(void);
+void oml_measures_binary_output(int fd);
 
 void oml_measures_consumption(uint32_t timestamp_s, uint32_t timestamp_us,
                               double power, double voltage, double current);
@@ -206,3 +206,39 @@ TEST(test_oml_measures, init_and_stop_error_cases)
     ret_init = oml_measures_start(OML_CONFIG_PATH, 0);
     ASSERT_EQ(-1, ret_init);
 }
+
+
+TEST(test_oml_measures, binary_output)
+{
+    omlc_init_do_mock = 0;
+    omlc_start_do_mock = 1;
+
+    int fds[2];
+    struct binary_measure frame;
+    ASSERT_EQ(0, pipe(fds));
+    ASSERT_EQ(48, sizeof(frame));
+
+    ASSERT_EQ(0, oml_measures_start(NULL, 0));
+    oml_measures_binary_output(fds[1]);
+
+    oml_measures_consumption(42, 69, 12.34, 3.3, 40.72);
+    ASSERT_EQ(sizeof(frame), read(fds[0], &frame, sizeof(frame)));
+    ASSERT_EQ(BINARY_CONSUMPTION, frame.type);
+    ASSERT_EQ(42, frame.timestamp_s);
+    ASSERT_EQ(69, frame.timestamp_us);
+    ASSERT_FLOAT_EQ(12.34, frame.values[0]);
+    ASSERT_FLOAT_EQ(3.3, frame.values[1]);
+    ASSERT_FLOAT_EQ(40.72, frame.values[2]);
+
+    oml_measures_sniffer(43, 0,  11, -91, 255, 1, 42);
+    ASSERT_EQ(sizeof(frame), read(fds[0], &frame, sizeof(frame)));
+    ASSERT_EQ(BINARY_SNIFFER, frame.type);
+    ASSERT_EQ(1, frame.crc_ok);
+    ASSERT_EQ(-91, frame.values[1]);
+    ASSERT_EQ(42, frame.values[3]);
+
+    // binary fd is closed on stop
+    ASSERT_EQ(0, oml_measures_stop());
+    ASSERT_EQ(0, read(fds[0], &frame, sizeof(frame)));
+    close(fds[0]);
+}
@@ -23,19 +23,21 @@
 
 """ auto tests implementation """
 
+import os
 import time
 import re
 import functools
 import logging
-from bisect import bisect
+import threading
 
 from subprocess import check_output, STDOUT
-from collections import defaultdict
 
 from gateway_code import common
 from gateway_code.autotest import open_linux_interface
 from gateway_code.profile import Consumption, Radio
 from gateway_code.utils.node_connection import OpenNodeConnection
+from gateway_code.utils.measures_buffer import MeasuresBuffer
+from gateway_code.utils.step_scheduler import StepScheduler
 import gateway_code.board_config as board_config
 
 LOGGER = logging.getLogger('gateway_code')
@@ -43,6 +45,20 @@ LOGGER = logging.getLogger('gateway_code')
 MAC_CMD = "cat /sys/class/net/eth0/address"
 MAC_RE = re.compile(r'([0-9a-f]{2}:){5}[0-9a-f]{2}')
 
+# Resources checks need exclusive access to
+ON_SERIAL = 'open_node_serial'
+CONTROL_NODE = 'control_node'
+RADIO = 'radio'
+
+# Leds consumption: samples used for each leds state, taken after the leds
+# switch settled, waiting at most LEDS_PERIOD seconds
+LEDS_SETTLE = 0.2
+LEDS_SAMPLES = 3
+LEDS_PERIOD = 1.0
+
+# Quick health checks time budget in seconds
+QUICK_BUDGET = 1.0
+
 
 def autotest_checker(*required):
     """Only run tests if required `commands` is implemented.
@@ -88,12 +104,20 @@ def tst_ok(bool_value):
     return 0 if bool_value else 1
 
 
+def _ignore_ret(func, *args):
+    """ Run check whose errors are only reported in the 'error' list """
+    func(*args)
+    return 0
+
+
 # pylint:disable=too-many-public-methods,too-many-instance-attributes
 class AutoTestManager(object):
     """ Gateway and open node auto tests """
 
     # Global used in tests to store checked open node features
     TESTED_FEATURES = set()
+    # Checks run concurrently when they do not share resources
+    CHECKS_WORKERS = 4
 
     def __init__(self, gateway_manager):
         self.g_m = gateway_manager
@@ -105,12 +129,53 @@ class AutoTestManager(object):
         self.on_serial = None
         self.linux_connection = None
 
-        self.ret_dict = {'ret': None, 'success': [], 'error': [], 'mac': {}}
-        self.cn_measures = []
+        self.ret_dict = {'ret': None, 'success': [], 'error': [], 'mac': {},
+                         'values': {}}
+        self.cn_measures = {
+            'consumption': MeasuresBuffer(('power', 'voltage', 'current')),
+            'radio': MeasuresBuffer(('channel', 'rssi')),
+        }
+        self._measures_cond = threading.Condition()
 
     def _measures_handler(self, measure_str):
         """ control node measures Handler """
-        self.cn_measures.append(measure_str.split(' '))
+        with self._measures_cond:
+            store_measure(self.cn_measures, measure_str.split(' '))
+            self._measures_cond.notify_all()
+
+    def _measures_binary_handler(self, records):
+        """ control node binary measures Handler """
+        with self._measures_cond:
+            for name, measures in self.cn_measures.items():
+                columns = records[name]
+                if len(columns):
+                    measures.extend(columns.timestamps,
+                                    [columns[col] for col in measures.names])
+            self._measures_cond.notify_all()
+
+    def _measures_clear(self):
+        """ Remove all stored control node measures """
+        with self._measures_cond:
+            for measures in self.cn_measures.values():
+                measures.clear()
+
+    def _wait_measures(self, predicate, timeout):
+        """ Wait until `predicate()` is True, evaluated on each new measure
+
+        Return False if still not True after `timeout` seconds. """
+        end = time.time() + timeout
+        with self._measures_cond:
+            while not predicate():
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return False
+                self._measures_cond.wait(remaining)
+        return True
+
+    def _consumption_varies(self):
+        """ Consumption measures have different values """
+        return len(set(consumption_values(
+            self.cn_measures['consumption']))) > 1
 
     @staticmethod
     def get_local_mac_addr():
@@ -124,7 +189,8 @@ class AutoTestManager(object):
         ret_val = 0
 
         # configure Control Node
-        ret_val += self.g_m.control_node.autotest_setup(self._measures_handler)
+        ret_val += self.g_m.control_node.autotest_setup(
+            self._measures_handler, self._measures_binary_handler)
 
         gwt_mac_addr = self.get_local_mac_addr()
         self.ret_dict['mac']['GWT'] = gwt_mac_addr
@@ -281,42 +347,12 @@ class AutoTestManager(object):
             self.check_echo()
             self.check_get_time()
 
-            self.get_uid()
-
             # Other tests, run on DC
 
             ret = self._open_node_start()
             ret_val += self._check(ret, 'switch_to_dc', ret)
 
-            # Test using leds commands
-            self.set_leds_off_and_on()
-
-            # test IMU
-            ret_val += self.test_gyro()
-            ret_val += self.test_magneto()
-            ret_val += self.test_accelero()
-
-            # test m3-on communication
-            ret_val += self.test_gpio()
-            ret_val += self.test_i2c()
-
-            # radio tests
-            ret_val += self.test_radio_ping_pong(channel)
-            ret_val += self.test_radio_with_rssi(channel)
-
-            # test consumption measures
-            ret_val += self.test_consumption_dc()
-            # m3 specific tests
-
-            # cannot test this with a8 I think
-            ret_val += self.test_leds_with_consumption()
-            # test m3 specific sensors
-            ret_val += self.test_pressure()
-            ret_val += self.test_light()
-            ret_val += self.test_flash(flash)
-
-            # run test_gps if requested
-            ret_val += self.test_gps(gps)
+            ret_val += self._run_checks(channel, flash, gps)
 
         except FatalError as err:
             # Fatal Error during test, don't run further tests
@@ -329,6 +365,125 @@ class AutoTestManager(object):
         self.ret_dict['ret'] = ret_val
         return self.ret_dict
 
+    def quick_tests(self, budget=QUICK_BUDGET):
+        """ Quick health check of the nodes, run within `budget` seconds
+
+        Nodes are not flashed nor reconfigured, their current state is
+        reused. Checks not started when the budget is exhausted are errors.
+        Checks durations are stored in 'durations'. """
+        ret_val = 0
+        begin = time.time()
+        durations = {}
+        for name, func in self._quick_checks():
+            if time.time() - begin > budget:
+                ret_val += self._check(1, name, 'not run, budget exceeded')
+                continue
+            start = time.time()
+            ret_val += self._check(func(), name)
+            durations[name] = round(time.time() - start, 3)
+        self.ret_dict['durations'] = durations
+
+        elapsed = time.time() - begin
+        ret_val += self._check(tst_ok(elapsed <= budget), 'quick_budget',
+                               round(elapsed, 3))
+        self.ret_dict['ret'] = ret_val
+        return self.ret_dict
+
+    def _quick_checks(self):
+        """ Quick health checks, in the order they are run """
+        c_n, o_n = self.g_m.control_node, self.g_m.open_node
+        checks = []
+        if getattr(c_n, 'TTY', None) is not None:
+            checks.append(('control_node_tty',
+                           functools.partial(self._tty_present, c_n.TTY)))
+        # open node tty only exists when it is powered
+        powered = getattr(c_n, 'open_node_state', 'start') == 'start'
+        if powered and getattr(o_n, 'TTY', None) is not None:
+            checks.append(('open_node_tty',
+                           functools.partial(self._tty_present, o_n.TTY)))
+        checks.append(('control_node_status', c_n.status))
+        checks.append(('open_node_status', o_n.status))
+        # control node commands change its state, like its time used for
+        # the experiment measures
+        if (getattr(c_n, 'protocol', None) is not None and
+                not self.g_m.experiment_is_running):
+            checks.append(('control_node_protocol',
+                           self._control_node_round_trip))
+        return checks
+
+    @staticmethod
+    def _tty_present(tty):
+        """ Check `tty` exists """
+        return tst_ok(os.path.exists(tty))
+
+    def _control_node_round_trip(self):
+        """ Send a command to the control node and check its answer
+
+        Reuse control node serial when running, start it only for this
+        check otherwise. """
+        c_n = self.g_m.control_node
+        if c_n.cn_serial.process is not None:
+            return c_n.protocol.set_time()
+        try:
+            ret = c_n.cn_serial.start()
+            if ret == 0:
+                ret = c_n.protocol.set_time()
+            return ret
+        finally:
+            c_n.cn_serial.stop()
+
+    def _checks(self, channel, flash, gps):
+        """ Checks run on DC, with the resources they use
+
+        Checks sharing a resource are run in this order. """
+        serial, c_n = ON_SERIAL, CONTROL_NODE
+        return [
+            # control node only, run while the first open node checks run.
+            # It only checks measures vary, consumption values are stored
+            # by 'leds_consumption' that runs alone
+            ('consumption_dc', self.test_consumption_dc, (c_n,)),
+            ('get_uid', functools.partial(_ignore_ret, self.get_uid),
+             (serial,)),
+            # Test using leds commands
+            ('leds_off_on', functools.partial(
+                _ignore_ret, self.set_leds_off_and_on), (serial,)),
+            # test IMU
+            ('gyro', self.test_gyro, (serial,)),
+            ('magneto', self.test_magneto, (serial,)),
+            ('accelero', self.test_accelero, (serial,)),
+            # test m3 specific sensors
+            ('pressure', self.test_pressure, (serial,)),
+            ('light', self.test_light, (serial,)),
+            ('flash', functools.partial(self.test_flash, flash), (serial,)),
+            # test m3-on communication
+            ('gpio', self.test_gpio, (serial, c_n)),
+            ('i2c', self.test_i2c, (serial, c_n)),
+            # radio tests
+            ('radio_ping_pong', functools.partial(
+                self.test_radio_ping_pong, channel), (serial, c_n, RADIO)),
+            ('radio_rssi', functools.partial(
+                self.test_radio_with_rssi, channel), (serial, c_n, RADIO)),
+            # cannot test this with a8 I think
+            ('leds_consumption', self.test_leds_with_consumption,
+             (serial, c_n)),
+            # run test_gps if requested, may be long
+            ('gps', functools.partial(self.test_gps, gps), (serial,)),
+        ]
+
+    def _run_checks(self, channel, flash, gps):
+        """ Run checks, concurrently when they use different resources
+
+        Checks durations are stored in 'durations'. """
+        sched = StepScheduler(max_workers=self.CHECKS_WORKERS)
+        for name, func, resources in self._checks(channel, flash, gps):
+            sched.add(name, func, resources=resources)
+        try:
+            return sched.run()
+        finally:
+            self.ret_dict['durations'] = dict(
+                (name, round(duration, 3))
+                for name, duration in sched.timings.items())
+
     def _check(self, ret, operation, log_message=''):
         """ Check the operation
         Adds `operation` to ret_dict in the correct failed or success entry
@@ -620,7 +775,7 @@ class AutoTestManager(object):
     @autotest_control_node_checker('radio')
     def test_radio_with_rssi(self, channel):
         """ Test radio with rssi"""
-        self.cn_measures = []
+        self._measures_clear()
         if channel is None:
             return 0
 
@@ -630,17 +785,26 @@ class AutoTestManager(object):
         radio = Radio("rssi", [channel], period=10, num_per_channel=0)
         cmd_on = ['radio_pkt', str(channel), '3dBm']
 
-        # get RSSI while sending 10 packets length 125
+        # -91 == no radio detected
+        def _radio_detected():
+            return any(int(v) != -91
+                       for v in self.cn_measures['radio'].column('rssi'))
+
+        # get RSSI while sending up to 10 packets length 125
         ret_val += self.g_m.control_node.protocol.config_radio(radio)
         for _itr in range(0, 10):  # pylint:disable=unused-variable
             self._on_call(cmd_on)
-            time.sleep(0.5)
+            if self._wait_measures(_radio_detected, 0.5):
+                break
         ret_val += self.g_m.control_node.protocol.config_radio(None)
 
-        # ('11', '-91')
-        # -91 == no radio detected
-        measures = extract_measures(self.cn_measures)
-        values = [v[1] for v in measures['radio']['values']]
+        with self._measures_cond:
+            values = [int(v)
+                      for v in self.cn_measures['radio'].column('rssi')]
+
+        self.ret_dict['values']['rssi'] = sorted(set(values))
+        if values:
+            self.ret_dict['values']['rssi_max'] = max(values)
 
         # check that there are values other than -91 measured
         test_ok = set([-91]) != set(values)
@@ -662,16 +826,17 @@ class AutoTestManager(object):
                             '588', '64', True, True, True)
         ret_val += self._open_node_start()
 
-        self.cn_measures = []
-        # store 2 secs of measures
+        self._measures_clear()
+        # get measures until they vary, for 2 seconds max
         ret_val += self.g_m.control_node.protocol.config_consumption(conso)
-        time.sleep(2)  # get measures for 2 seconds
+        self._wait_measures(self._consumption_varies, 2)
         ret_val += self.g_m.control_node.protocol.config_consumption(None)
-        time.sleep(2)  # wait 2 seconds for flush
+        # wait 2 seconds for flush if not enough measures
+        self._wait_measures(self._consumption_varies, 2)
 
         # (0.257343, 3.216250, 0.080003)
-        measures = extract_measures(self.cn_measures)
-        values = measures['consumption']['values']
+        with self._measures_cond:
+            values = consumption_values(self.cn_measures['consumption'])
 
         # Value ranges may be validated with an Idle firmware
         test_ok = len(set(values)) > 1
@@ -704,7 +869,7 @@ class AutoTestManager(object):
         conso = Consumption(self.g_m.open_node.ALIM, 'battery',
                             1100, 64,
                             True, True, True)
-        self.cn_measures = []
+        self._measures_clear()
         ret_val += self.g_m.control_node.protocol.config_consumption(conso)
 
         ret_val += self.g_m.control_node.open_stop('battery')
@@ -717,8 +882,8 @@ class AutoTestManager(object):
         time.sleep(1)  # Flush last values
 
         # (0.257343, 3.216250, 0.080003)
-        measures = extract_measures(self.cn_measures)
-        values = measures['consumption']['values']
+        with self._measures_cond:
+            values = consumption_values(self.cn_measures['consumption'])
 
         test_ok = len(set(values)) > 1
         ret_val += self._check(tst_ok(test_ok), 'consumption_batt', values)
@@ -732,10 +897,14 @@ class AutoTestManager(object):
         """ Test Leds with consumption
 
         Start consumption measure
-        Then switch different leds on and save the timestamp where it's done
+        Then switch different leds on and get the mean consumption of the
+        measures received after the switch
 
         Finally compare that consumption with no leds on was lower than
         with one or more leds on.
+
+        No other check runs at the same time, so the consumption with no
+        leds on is stored as the node consumption values.
         """
 
         self._on_call(['leds_off', '7'])
@@ -746,89 +915,94 @@ class AutoTestManager(object):
                             '1100', '64', True, True, True)
         ret_val += self._open_node_start()
 
-        self.cn_measures = []
-        leds_timestamps = []
+        self._measures_clear()
         # get consumption for all leds mode:
         #     no leds, each led, all leds
         ret_val += self.g_m.control_node.protocol.config_consumption(conso)
-        for leds in ['0', '1', '2', '4', '7']:
-            self._on_call(['leds_on', leds])
-            time.sleep(0.5)
-            leds_timestamps.append(time.time())
-            time.sleep(0.5)
-            self._on_call(['leds_off', '7'])
+        leds_means = [self._leds_consumption(leds)
+                      for leds in ['0', '1', '2', '4', '7']]
         ret_val += self.g_m.control_node.protocol.config_consumption(None)
-        time.sleep(1)  # wait last values
 
-        # (0.257343, 3.216250, 0.080003)
-        measures = extract_measures(self.cn_measures)
-        values = [v[0] for v in measures['consumption']['values']]
-        timestamps = measures['consumption']['timestamps']
-
-        led_consumption = []
-        LOGGER.debug("t0, tEnd: %r - %r", timestamps[0], timestamps[-1])
-        LOGGER.debug("leds_timestamps: %r", leds_timestamps)
-        for led_time in leds_timestamps:
-            try:
-                led_consumption.append(values[bisect(timestamps, led_time)])
-            except IndexError as err:  # pragma: no cover
-                LOGGER.debug(err)
-                led_consumption.append(float('NaN'))
+        for name, value in leds_means[0].items():
+            if value == value:  # NaN without measures
+                self.ret_dict['values']['consumption_' + name] = value
 
         # check that consumption is higher with each led than with no leds on
+        led_consumption = [means['power'] for means in leds_means]
         led_0 = led_consumption.pop(0)
+        # NaN, no measures, stored as None
+        deltas = [v - led_0 if v - led_0 == v - led_0 else None
+                  for v in led_consumption]
+        self.ret_dict['values']['leds_delta'] = deltas
+        if None not in deltas:
+            self.ret_dict['values']['leds_delta_min'] = min(deltas)
         test_ok = all([led_0 < v for v in led_consumption])
         ret_val += self._check(tst_ok(test_ok), 'leds_using_conso',
                                (led_0, led_consumption))
         return ret_val
 
+    def _leds_consumption(self, leds):
+        """ Mean consumption values with `leds` on, NaN without measures
+
+        Use LEDS_SAMPLES measures after LEDS_SETTLE seconds, or the ones
+        received in LEDS_PERIOD seconds. """
+        conso_measures = self.cn_measures['consumption']
+        self._on_call(['leds_on', leds])
+        start = time.time() + LEDS_SETTLE
+        self._wait_measures(
+            lambda: len(conso_measures.column('power', start)) >= LEDS_SAMPLES,
+            LEDS_PERIOD)
+        with self._measures_cond:
+            means = dict((name, conso_measures.mean(name, start))
+                         for name in ('power', 'voltage', 'current'))
+        self._on_call(['leds_off', '7'])
+        LOGGER.debug('leds %s: consumption %r', leds, means)
+        return means
+
     @autotest_control_node_checker('open_node_power')
     def _open_node_start(self):
         return self.g_m.control_node.open_start('dc')
 
 
-def extract_measures(meas_list):
-    """ Extract the measures of meas_list
-
-    >>> measures_list = [                         \
-        ['measures_debug', 'consumption_measure', \
-            '123.450000', '1.0', '2.0', '3.0'],   \
-        ['measures_debug', 'radio_measure',       \
-            '122.000000', '22', '-91'],           \
-        ['measures_debug', 'consumption_measure', \
-            '124.000000', '4.0', '5.0', '6.0'],   \
-        ['measures_debug', 'unhandled_measure'],  \
-    ]
-    >>> expected_result = {                       \
-        'consumption': {                          \
-            'values': [(1.0, 2.0, 3.0), (4.0, 5.0, 6.0)],\
-            'timestamps': [123.45, 124.0]         \
-        },                                        \
-        'radio': {                                \
-            'values': [(22, -91)],                \
-            'timestamps': [122]                   \
-        }                                         \
+def store_measure(measures, meas):
+    """ Store text measure `meas` in `measures` buffers
+
+    >>> measures = {                                      \
+        'consumption': MeasuresBuffer(('power', 'voltage', 'current')),\
+        'radio': MeasuresBuffer(('channel', 'rssi')),     \
     }
-    >>> expected_result == extract_measures(measures_list)
-    True
+    >>> for meas in [                                     \
+        ['measures_debug', 'consumption_measure',         \
+            '123.450000', '1.0', '2.0', '3.0'],           \
+        ['measures_debug', 'radio_measure',               \
+            '122.000000', '22', '-91'],                   \
+        ['measures_debug', 'consumption_measure',         \
+            '124.000000', '4.0', '5.0', '6.0'],           \
+        ['measures_debug', 'unhandled_measure'],          \
+    ]: store_measure(measures, meas)
+    >>> consumption_values(measures['consumption'])
+    [(1.0, 2.0, 3.0), (4.0, 5.0, 6.0)]
+    >>> list(measures['consumption'].timestamps)
+    [123.45, 124.0]
+    >>> list(measures['radio'].column('rssi'))
+    [-91.0]
     """
-    meas_dict = defaultdict(lambda: dict({'values': [], 'timestamps': []}))
-
-    for meas in meas_list:
-        if meas[1] == 'consumption_measure':
-            # ['measures_debug', 'consumption_measure'
-            #     '1378387028.906210', '0.257343', '3.216250', '0.080003']
-            values = tuple([float(v) for v in meas[3:6]])
-            meas_dict['consumption']['values'].append(values)
-            meas_dict['consumption']['timestamps'].append(float(meas[2]))
-        elif meas[1] == 'radio_measure':
-            # ['measures_debug:', 'radio_measure',
-            #      '1378466517.186216', '11', '-91']
-            values = tuple([int(v) for v in meas[3:5]])
-            meas_dict['radio']['values'].append(values)
-            meas_dict['radio']['timestamps'].append(float(meas[2]))
-        else:
-            LOGGER.debug('unhandled measure type: %r', meas)
-
-    # keep 'defaultdict' to simplify usage
-    return meas_dict
+    if meas[1] == 'consumption_measure':
+        # ['measures_debug', 'consumption_measure'
+        #     '1378387028.906210', '0.257343', '3.216250', '0.080003']
+        values = [float(v) for v in meas[3:6]]
+        measures['consumption'].append(float(meas[2]), *values)
+    elif meas[1] == 'radio_measure':
+        # ['measures_debug:', 'radio_measure',
+        #      '1378466517.186216', '11', '-91']
+        values = [int(v) for v in meas[3:5]]
+        measures['radio'].append(float(meas[2]), *values)
+    else:
+        LOGGER.debug('unhandled measure type: %r', meas)
+
+
+def consumption_values(conso_measures):
+    """ Return consumption measures as (power, voltage, current) tuples """
+    return list(zip(conso_measures.column('power'),
+                    conso_measures.column('voltage'),
+                    conso_measures.column('current')))
@@ -0,0 +1,180 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Autotests results history
+
+Each autotest run result is appended as one json line to a local file in
+GATEWAY_STATE_PATH, with its timestamp, checks durations and measured
+values. It allows finding failing hardware from the last runs without
+running the autotests again.
+
+It is enabled with the 'autotest_history' gateway config key set to 'on'.
+When the file gets bigger than `max_size`, only its most recent half is
+kept.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+from gateway_code import config
+
+LOGGER = logging.getLogger('gateway_code')
+
+HISTORY_FILE = 'autotest_history.jsonl'
+MODES = ('off', 'on')
+MAX_SIZE = 1024 * 1024
+
+# Results entries stored in history
+FIELDS = ('ret', 'success', 'error', 'durations', 'values')
+# Durations changes smaller than this are not drifts
+DURATION_MIN_DELTA = 1.0
+
+
+def _median(values):
+    """ Median of non empty `values`
+
+    >>> _median([3, 1, 2])
+    2
+    >>> _median([4, 1, 2, 3])
+    2.5
+    """
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
+
+
+def _scalars(entries):
+    """ Numbers in `entries` dict """
+    return dict((key, value) for key, value in (entries or {}).items()
+                if isinstance(value, (int, float)) and
+                not isinstance(value, bool))
+
+
+class AutotestHistory(object):
+    """ Autotests results, one json line per run in `path` """
+    _lock = threading.Lock()
+
+    def __init__(self, path, max_size=MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+
+    def append(self, result, timestamp=None):
+        """ Store autotest `result` dict """
+        run = dict((key, result[key]) for key in FIELDS if key in result)
+        run['time'] = time.time() if timestamp is None else timestamp
+        line = json.dumps(run, separators=(',', ':'), sort_keys=True)
+        with self._lock:
+            try:
+                if not os.path.isdir(os.path.dirname(self.path)):
+                    os.makedirs(os.path.dirname(self.path))
+                with open(self.path, 'a') as history:
+                    history.write(line + '\n')
+                if os.path.getsize(self.path) > self.max_size:
+                    self._trim()
+            except (IOError, OSError) as err:
+                LOGGER.warning('Autotest history write error: %r', err)
+
+    def _trim(self):
+        """ Keep the most recent half of the runs """
+        runs = self._read()
+        tmp_path = '%s.%d' % (self.path, os.getpid())
+        with open(tmp_path, 'w') as history:
+            for run in runs[len(runs) // 2:]:
+                history.write(json.dumps(run, separators=(',', ':'),
+                                         sort_keys=True) + '\n')
+        os.rename(tmp_path, self.path)
+
+    def _read(self):
+        """ All runs, oldest first, invalid lines are ignored """
+        runs = []
+        try:
+            with open(self.path) as history:
+                for line in history:
+                    try:
+                        runs.append(json.loads(line))
+                    except ValueError:
+                        LOGGER.debug('Invalid autotest history line')
+        except IOError:
+            pass
+        return runs
+
+    def runs(self, last=None):
+        """ `last` runs, all by default, oldest first """
+        runs = self._read()
+        if last is not None:
+            runs = runs[-last:] if last > 0 else []
+        return runs
+
+    def drift(self, window=10, ratio=0.5, min_runs=3):
+        """ Compare the last run to the `window` previous ones
+
+        Return a dict with:
+
+        * 'durations', 'values': {name: {'reference': median, 'last': value}}
+          for checks durations and measured values differing from the median
+          of the previous runs by more than `ratio` of it, when measured in
+          at least `min_runs` of them
+        * 'regressions': checks failing in the last run that succeeded in the
+          previous one
+        """
+        runs = self.runs(window + 1)
+        ret = {'durations': {}, 'values': {}, 'regressions': []}
+        if not runs:
+            return ret
+        last, previous = runs[-1], runs[:-1]
+
+        for field, min_delta in (('durations', DURATION_MIN_DELTA),
+                                 ('values', 0)):
+            references = [_scalars(run.get(field)) for run in previous]
+            for name, value in _scalars(last.get(field)).items():
+                values = [ref[name] for ref in references if name in ref]
+                if len(values) < min_runs:
+                    continue
+                reference = _median(values)
+                delta = abs(value - reference)
+                if delta > ratio * abs(reference) and delta > min_delta:
+                    ret[field][name] = {'reference': reference,
+                                        'last': value}
+
+        if previous:
+            succeeded = set(previous[-1].get('success', []))
+            ret['regressions'] = [check for check in last.get('error', [])
+                                  if check in succeeded]
+        return ret
+
+
+def from_config():
+    """ Return AutotestHistory if enabled by 'autotest_history' config key,
+    `None` otherwise """
+    mode = config.read_config('autotest_history', 'off')
+    if mode not in MODES:
+        LOGGER.error('Invalid autotest_history mode %r, disable it', mode)
+        return None
+    if mode == 'off':
+        return None
+    return AutotestHistory(os.path.join(config.GATEWAY_STATE_PATH,
+                                        HISTORY_FILE))
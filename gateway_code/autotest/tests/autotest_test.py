@@ -22,11 +22,14 @@
 
 """ Test the autotest module """
 
+import time
+import threading
 import unittest
 import mock
 import pytest
 
 from gateway_code.autotest import autotest
+from gateway_code.control_nodes.cn_iotlab import cn_measures
 from gateway_code.tests import utils
 
 
@@ -58,6 +61,39 @@ class TestProtocol(unittest.TestCase):
         self.assertTrue('message_1' in self.g_v.ret_dict['success'])
         self.assertTrue('message_2' in self.g_v.ret_dict['error'])
 
+    def test_measures_handler(self):
+        self.g_v._measures_handler(
+            'measures_debug: consumption_measure 42.000069 1.0 3.3 0.3')
+        self.g_v._measures_handler(
+            'measures_debug: radio_measure 42.000070 11 -20')
+        self.g_v._measures_handler('measures_debug: unknown 42.0')
+
+        conso = self.g_v.cn_measures['consumption']
+        self.assertEqual([(1.0, 3.3, 0.3)], autotest.consumption_values(conso))
+        self.assertEqual(1.0, conso.nearest('power', 43))
+        radio = self.g_v.cn_measures['radio']
+        self.assertEqual([-20], list(radio.column('rssi')))
+
+        self.g_v._measures_clear()
+        self.assertEqual(0, len(conso))
+
+    def test_measures_binary_handler(self):
+        records = cn_measures.MeasuresRecords()
+        records['consumption'].extend([42.0, 43.0], [[1.0, 2.0], [3.3, 3.3],
+                                                     [0.3, 0.6]])
+        records['sniffer'].extend([42.0], [[11], [-20], [1], [12]])
+        self.g_v._measures_binary_handler(records)
+        records = cn_measures.MeasuresRecords()
+        records['radio'].extend([44.0], [[11], [-20]])
+        self.g_v._measures_binary_handler(records)
+
+        conso = self.g_v.cn_measures['consumption']
+        self.assertEqual([(1.0, 3.3, 0.3), (2.0, 3.3, 0.6)],
+                         autotest.consumption_values(conso))
+        radio = self.g_v.cn_measures['radio']
+        self.assertEqual([44.0], list(radio.timestamps))
+        self.assertEqual([-20], list(radio.column('rssi')))
+
     @mock.patch('gateway_code.autotest.autotest.LOGGER.error')
     def test_run_test(self, mock_error):
         self.g_v.on_serial = mock.Mock()
@@ -90,6 +126,250 @@ class TestProtocol(unittest.TestCase):
         self.assertNotEqual(0, self.g_v.get_uid())
 
 
+class TestAutoTestsChecks(unittest.TestCase):
+
+    def setUp(self):
+        mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3')).start()
+        gateway_manager = mock.Mock()
+        self.g_v = autotest.AutoTestManager(gateway_manager)
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_checks(self):
+        checks = self.g_v._checks(11, True, False)
+        names = [name for name, _, _ in checks]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertIn('radio_rssi', names)
+
+        # all checks using the open node declare it
+        for name, _, resources in checks:
+            if name != 'consumption_dc':
+                self.assertIn(autotest.ON_SERIAL, resources, name)
+        # checks storing consumption values run alone
+        resources = dict((name, res) for name, _, res in checks)
+        self.assertEqual((autotest.CONTROL_NODE,), resources['consumption_dc'])
+        self.assertIn(autotest.ON_SERIAL, resources['leds_consumption'])
+
+    def test_run_checks(self):
+        def _check(duration, ret):
+            return lambda: time.sleep(duration) or ret
+
+        checks = [
+            ('cn', _check(0.3, 1), (autotest.CONTROL_NODE,)),
+            ('serial_1', _check(0.1, 0), (autotest.ON_SERIAL,)),
+            ('serial_2', _check(0.1, 2), (autotest.ON_SERIAL,)),
+        ]
+        with mock.patch.object(self.g_v, '_checks', return_value=checks):
+            t_ref = time.time()
+            self.assertEqual(3, self.g_v._run_checks(None, False, False))
+            self.assertGreater(0.5, time.time() - t_ref)
+
+        durations = self.g_v.ret_dict['durations']
+        self.assertEqual(['cn', 'serial_1', 'serial_2'], sorted(durations))
+        self.assertLessEqual(0.3, durations['cn'])
+
+    def test_run_checks_fatal_error(self):
+        def _fatal():
+            raise autotest.FatalError('check failed')
+
+        checks = [
+            ('fatal', _fatal, (autotest.ON_SERIAL,)),
+            ('next', mock.Mock(return_value=0), (autotest.ON_SERIAL,)),
+        ]
+        with mock.patch.object(self.g_v, '_checks', return_value=checks):
+            self.assertRaises(autotest.FatalError, self.g_v._run_checks,
+                              None, False, False)
+        self.assertFalse(checks[1][1].called)
+        self.assertEqual(['fatal'], list(self.g_v.ret_dict['durations']))
+
+
+class TestAutoTestsMeasures(unittest.TestCase):
+    """ Measures checks stopping as soon as the verdict is known """
+
+    def setUp(self):
+        mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3')).start()
+        gateway_manager = mock.Mock()
+        self.protocol = gateway_manager.control_node.protocol
+        self.protocol.config_consumption.return_value = 0
+        self.protocol.config_radio.return_value = 0
+        gateway_manager.control_node.open_start.return_value = 0
+        gateway_manager.open_node.ALIM = '3.3V'
+        self.g_v = autotest.AutoTestManager(gateway_manager)
+        self.on_call = mock.patch.object(self.g_v, '_on_call').start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def _conso(self, power):
+        self.g_v._measures_handler(
+            'measures_debug: consumption_measure %f %f 3.3 0.1' %
+            (time.time(), power))
+
+    def _feed(self, *measures):
+        """ Send measures from another thread """
+        def _run():
+            for measure in measures:
+                time.sleep(0.01)
+                self.g_v._measures_handler(measure)
+        threading.Thread(target=_run).start()
+
+    def test_wait_measures(self):
+        conso = self.g_v.cn_measures['consumption']
+        self._feed('measures_debug: consumption_measure 1.0 1.0 3.3 0.1',
+                   'measures_debug: consumption_measure 2.0 2.0 3.3 0.1')
+        self.assertTrue(self.g_v._wait_measures(lambda: len(conso) == 2, 5))
+        self.assertFalse(self.g_v._wait_measures(lambda: len(conso) > 2,
+                                                 0.1))
+
+    def test_consumption_dc(self):
+        def _config(conso):
+            if conso is not None:
+                self._feed(*['measures_debug: consumption_measure '
+                             '%d.0 %d.0 3.3 0.1' % (i, i) for i in (1, 2)])
+            return 0
+
+        self.protocol.config_consumption.side_effect = _config
+        t_ref = time.time()
+        self.assertEqual(0, self.g_v.test_consumption_dc())
+        self.assertGreater(1.0, time.time() - t_ref)
+        self.assertNotIn('consumption_power', self.g_v.ret_dict['values'])
+
+        # no measures, fails after the timeouts
+        self.protocol.config_consumption.side_effect = None
+        with mock.patch('gateway_code.autotest.autotest.time.time',
+                        side_effect=[0, 0, 3, 3, 6, 6]):
+            self.assertEqual(1, self.g_v.test_consumption_dc())
+
+    def test_radio_with_rssi(self):
+        self.on_call.side_effect = lambda cmd: self._feed(
+            'measures_debug: radio_measure %f 11 -42' % time.time())
+        self.assertEqual(0, self.g_v.test_radio_with_rssi(11))
+        self.assertEqual(1, self.on_call.call_count)
+        self.assertEqual([-42], self.g_v.ret_dict['values']['rssi'])
+        self.assertEqual(-42, self.g_v.ret_dict['values']['rssi_max'])
+
+    def test_leds_with_consumption(self):
+        powers = {'0': 1.0, '1': 2.0, '2': 2.0, '4': 2.0, '7': 3.0}
+
+        def _measure(power):
+            time.sleep(autotest.LEDS_SETTLE + 0.01)
+            for _ in range(autotest.LEDS_SAMPLES):
+                self._conso(power)
+
+        def _on_call(cmd):
+            if cmd[0] == 'leds_on':
+                threading.Thread(target=_measure,
+                                 args=(powers[cmd[1]],)).start()
+            return (0, ['ACK', cmd[0]])
+
+        self.on_call.side_effect = _on_call
+        t_ref = time.time()
+        self.assertEqual(0, self.g_v.test_leds_with_consumption())
+        self.assertGreater(5 * autotest.LEDS_PERIOD, time.time() - t_ref)
+        values = self.g_v.ret_dict['values']
+        self.assertEqual([1.0, 1.0, 1.0, 2.0], values['leds_delta'])
+        self.assertEqual(1.0, values['leds_delta_min'])
+        # no leds consumption values
+        self.assertAlmostEqual(1.0, values['consumption_power'])
+        self.assertAlmostEqual(3.3, values['consumption_voltage'])
+        self.assertAlmostEqual(0.1, values['consumption_current'])
+
+        # consumption not higher with leds
+        powers['4'] = 1.0
+        self.assertEqual(1, self.g_v.test_leds_with_consumption())
+
+    @mock.patch('gateway_code.autotest.autotest.LEDS_PERIOD', 0.01)
+    def test_leds_without_measures(self):
+        self.assertEqual(1, self.g_v.test_leds_with_consumption())
+        values = self.g_v.ret_dict['values']
+        self.assertEqual([None] * 4, values['leds_delta'])
+        self.assertNotIn('leds_delta_min', values)
+        self.assertNotIn('consumption_power', values)
+
+
+class TestAutoTestsQuick(unittest.TestCase):
+    """ Quick health checks reusing the nodes state """
+
+    def setUp(self):
+        mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3')).start()
+        self.g_m = mock.Mock()
+        self.g_m.experiment_is_running = False
+        self.c_n = self.g_m.control_node
+        self.c_n.TTY = '/dev/ttyCN'
+        self.c_n.open_node_state = 'start'
+        self.c_n.status.return_value = 0
+        self.c_n.protocol.set_time.return_value = 0
+        self.c_n.cn_serial.start.return_value = 0
+        self.c_n.cn_serial.process = None
+        self.g_m.open_node.TTY = '/dev/ttyON_M3'
+        self.g_m.open_node.status.return_value = 0
+        self.exists = mock.patch('os.path.exists', return_value=True).start()
+        self.g_v = autotest.AutoTestManager(self.g_m)
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_quick_tests(self):
+        ret_dict = self.g_v.quick_tests()
+        self.assertEqual(0, ret_dict['ret'])
+        self.assertEqual([], ret_dict['error'])
+        self.assertEqual(['control_node_tty', 'open_node_tty',
+                          'control_node_status', 'open_node_status',
+                          'control_node_protocol', 'quick_budget'],
+                         ret_dict['success'])
+        self.assertEqual(sorted(ret_dict['success'][:-1]),
+                         sorted(ret_dict['durations']))
+        self.exists.assert_any_call('/dev/ttyON_M3')
+
+        # control node serial started only for the round-trip
+        self.assertTrue(self.c_n.cn_serial.start.called)
+        self.assertTrue(self.c_n.cn_serial.stop.called)
+
+    def test_quick_tests_reuse_state(self):
+        # running control node serial, open node powered off
+        self.c_n.cn_serial.process = mock.Mock()
+        self.c_n.open_node_state = 'stop'
+
+        ret_dict = self.g_v.quick_tests()
+        self.assertEqual(0, ret_dict['ret'])
+        self.assertNotIn('open_node_tty', ret_dict['success'])
+        self.assertTrue(self.c_n.protocol.set_time.called)
+        self.assertFalse(self.c_n.cn_serial.start.called)
+        self.assertFalse(self.c_n.cn_serial.stop.called)
+
+    def test_quick_tests_experiment_running(self):
+        # control node time must not be changed during an experiment
+        self.g_m.experiment_is_running = True
+        self.c_n.cn_serial.process = mock.Mock()
+
+        ret_dict = self.g_v.quick_tests()
+        self.assertEqual(0, ret_dict['ret'])
+        self.assertNotIn('control_node_protocol', ret_dict['success'])
+        self.assertFalse(self.c_n.protocol.set_time.called)
+
+    def test_quick_tests_errors(self):
+        self.exists.side_effect = lambda tty: tty != '/dev/ttyCN'
+        self.c_n.cn_serial.start.return_value = 1
+
+        ret_dict = self.g_v.quick_tests()
+        self.assertEqual(2, ret_dict['ret'])
+        self.assertEqual(['control_node_tty', 'control_node_protocol'],
+                         ret_dict['error'])
+        self.assertFalse(self.c_n.protocol.set_time.called)
+        self.assertTrue(self.c_n.cn_serial.stop.called)
+
+    def test_quick_tests_budget(self):
+        self.c_n.status.side_effect = lambda: time.sleep(0.2) or 0
+
+        ret_dict = self.g_v.quick_tests(budget=0.1)
+        self.assertEqual(['open_node_status', 'control_node_protocol',
+                          'quick_budget'], ret_dict['error'])
+        self.assertEqual(3, ret_dict['ret'])
+        self.assertNotIn('open_node_status', ret_dict['durations'])
+        self.assertFalse(self.g_m.open_node.status.called)
+
+
 class TestProtocolGPS(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,143 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+# pylint: disable=missing-docstring
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from gateway_code.tests import utils
+from gateway_code.autotest import history
+
+
+def _result(ret=0, success=('echo',), error=(), durations=None,
+            values=None):
+    return {'ret': ret, 'success': list(success), 'error': list(error),
+            'mac': {'GWT': '00:11:22:33:44:55'},
+            'durations': durations or {}, 'values': values or {}}
+
+
+class TestAutotestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'state', 'history.jsonl')
+        self.history = history.AutotestHistory(self.path)
+
+    def test_append_runs(self):
+        self.assertEqual([], self.history.runs())
+        for num in range(5):
+            self.history.append(_result(ret=num), timestamp=num)
+
+        runs = self.history.runs(2)
+        self.assertEqual([3, 4], [run['ret'] for run in runs])
+        self.assertEqual(3, runs[0]['time'])
+        self.assertNotIn('mac', runs[0])
+        self.assertEqual(5, len(self.history.runs()))
+        self.assertEqual([], self.history.runs(0))
+
+        # one compact line per run
+        with open(self.path) as hist:
+            lines = hist.readlines()
+        self.assertEqual(5, len(lines))
+        self.assertNotIn(' ', lines[0])
+
+    def test_invalid_line(self):
+        self.history.append(_result(ret=1))
+        with open(self.path, 'a') as hist:
+            hist.write('{"ret": 2, "succ')  # interrupted write
+        self.history.append(_result(ret=3))
+        self.assertEqual([1], [run['ret'] for run in self.history.runs()])
+
+        with open(self.path, 'a') as hist:
+            hist.write('\n')
+        self.history.append(_result(ret=4))
+        self.assertEqual([1, 4], [run['ret'] for run in self.history.runs()])
+
+    def test_trim(self):
+        self.history.max_size = 1000
+        for num in range(20):
+            self.history.append(_result(ret=num))
+        self.assertLessEqual(os.path.getsize(self.path), 1000)
+        runs = self.history.runs()
+        self.assertEqual(19, runs[-1]['ret'])
+        self.assertEqual(list(range(20 - len(runs), 20)),
+                         [run['ret'] for run in runs])
+
+    def test_drift(self):
+        self.assertEqual({'durations': {}, 'values': {}, 'regressions': []},
+                         self.history.drift())
+
+        for power in (0.10, 0.11, 0.09):
+            self.history.append(_result(
+                success=('echo', 'rssi_measures'),
+                durations={'gyro': 1.0, 'light': 2.0, 'radio_rssi': 0.5},
+                values={'consumption_power': power, 'rssi_max': -40,
+                        'rssi': [-91, -40]}))
+        self.history.append(_result(
+            success=('echo',), error=('rssi_measures',),
+            durations={'gyro': 4.0, 'light': 2.5, 'radio_rssi': 5.0},
+            values={'consumption_power': 0.2, 'rssi_max': -91,
+                    'leds_delta_min': 0.01, 'rssi': [-91]}))
+
+        drift = self.history.drift()
+        self.assertEqual({'gyro': {'reference': 1.0, 'last': 4.0},
+                          'radio_rssi': {'reference': 0.5, 'last': 5.0}},
+                         drift['durations'])
+        self.assertEqual({'consumption_power': {'reference': 0.1,
+                                                'last': 0.2},
+                          'rssi_max': {'reference': -40, 'last': -91}},
+                         drift['values'])
+        self.assertEqual(['rssi_measures'], drift['regressions'])
+
+        # not enough previous runs
+        drift = self.history.drift(window=2)
+        self.assertEqual({}, drift['durations'])
+        self.assertEqual({}, drift['values'])
+
+    @mock.patch('gateway_code.autotest.history.LOGGER.warning')
+    def test_write_error(self, warning):
+        with open(os.path.join(self.tmp_dir, 'file'), 'w'):
+            pass
+        hist = history.AutotestHistory(
+            os.path.join(self.tmp_dir, 'file', 'history.jsonl'))
+        hist.append(_result())
+        self.assertTrue(warning.called)
+        self.assertEqual([], hist.runs())
+
+    def test_from_config(self):
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3')):
+            self.assertIsNone(history.from_config())
+
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+                'm3', autotest_history='on')):
+            self.assertTrue(history.from_config().path.endswith(
+                history.HISTORY_FILE))
+
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+                'm3', autotest_history='invalid')):
+            self.assertIsNone(history.from_config())
@@ -41,6 +41,10 @@ except ImportError:
 import functools
 
 import logging
+
+from gateway_code.utils import tty_watcher
+from gateway_code.utils import metrics
+
 LOGGER = logging.getLogger('gateway_code')
 
 
@@ -56,6 +60,7 @@ def logger_call(msg, log_lvl='info', err_lvl='warning'):
 
     Print a message before calling the function and an error message in case of
     non zero return value.
+    Calls durations are recorded in `metrics`.
 
     :param msg: message used in logs messages
     :param log_lvl: Logger level for info message
@@ -67,11 +72,13 @@ def logger_call(msg, log_lvl='info', err_lvl='warning'):
 
     def _wrap(func):
         """ Decorator implementation """
+        timed_func = metrics.timed()(func)
+
         @functools.wraps(func)
         def _wrapped_f(*args, **kwargs):
             """ Function wrapped with logs """
             log_msg(msg)
-            ret = func(*args, **kwargs)
+            ret = timed_func(*args, **kwargs)
             if ret:
                 log_err("%s FAILED: ret = %d", msg, ret)
             return ret
@@ -116,17 +123,19 @@ def wait_cond(timeout, value, fct, *args, **kwargs):
 TTY_DETECT_TIME = 3
 
 
+@metrics.timed('wait_tty')
 def wait_tty(dev_tty, logger, timeout=TTY_DETECT_TIME):
     """ Wait that tty is present """
-    if wait_cond(timeout, True, os.path.exists, dev_tty):
+    if tty_watcher.wait_tty(dev_tty, True, timeout):
         return 0
     logger.error('Error Open Node tty not visible: %s', dev_tty)
     return 1
 
 
+@metrics.timed('wait_no_tty')
 def wait_no_tty(dev_tty, timeout=TTY_DETECT_TIME):
     """ Wait until `dev_tty` is not present """
-    ret = wait_cond(timeout, False, os.path.exists, dev_tty)
+    ret = tty_watcher.wait_tty(dev_tty, False, timeout)
     return 0 if ret else 1
 
 
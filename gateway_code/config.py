@@ -42,6 +42,11 @@ GATEWAY_CONFIG_PATH = os.environ.get('IOTLAB_GATEWAY_CFG_DIR',
                                      '/var/local/config/')
 GATEWAY_CONFIG_PATH = os.path.abspath(GATEWAY_CONFIG_PATH)
 
+# Gateway state kept across restarts
+GATEWAY_STATE_PATH = os.environ.get('IOTLAB_GATEWAY_STATE_DIR',
+                                    '/var/lib/gateway-server/')
+GATEWAY_STATE_PATH = os.path.abspath(GATEWAY_STATE_PATH)
+
 IOTLAB_USERS = os.environ.get('IOTLAB_USERS_DIR', '/iotlab/users')
 EXP_FILES_DIR = os.path.join(IOTLAB_USERS, '{user}/.iot-lab/{exp_id}/')
 EXP_FILES = {
@@ -51,6 +56,8 @@ EXP_FILES = {
     'sniffer': 'sniffer/{node_id}.oml',
     'log': 'log/{node_id}.log',
 }
+# Optional capture of the open node serial output
+SERIAL_CAPTURE_FILE = 'serial/{node_id}'
 
 
 def create_user_file(file_path, mode='w'):
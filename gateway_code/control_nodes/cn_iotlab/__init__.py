@@ -21,15 +21,23 @@
 
 """ Control Node experiment implementation """
 
+import sys
 import time
 import logging
 
 import gateway_code.utils.ftdi_check
 from gateway_code.common import logger_call
 from gateway_code.nodes import ControlNodeBase
+from gateway_code.utils import tty_watcher
 from gateway_code.utils.openocd import OpenOCD
 from gateway_code.config import static_path
 from . import cn_interface, cn_protocol
+if sys.version_info >= (3, 8):
+    from .cn_interface_async import AsyncControlNodeSerial as ControlNodeSerial
+else:  # pragma: no cover
+    # asyncio subprocesses cannot be run from the loop thread before 3.8,
+    # no 'ThreadedChildWatcher'
+    ControlNodeSerial = cn_interface.ControlNodeSerial
 
 
 LOGGER = logging.getLogger('gateway_code')
@@ -44,7 +52,12 @@ class ControlNodeIotlab(ControlNodeBase):
     OPENOCD_PATH = '/opt/openocd-dev/bin/openocd'
     OPENOCD_CFG_FILE = static_path('iot-lab.cfg')
     OPENOCD_OPTS = (static_path('iot-lab-cn.cfg'),)
+    # long running openocd for reset/flash, gdb not needed
+    OPENOCD_TCL_PORT = 6667
     FW_CONTROL_NODE = static_path('control_node.elf')
+    # firmware answers commands after about one second
+    READY_TIMEOUT = 3
+    PING_TIMEOUT = 0.1
     FEATURES = ['leds',
                 'open_node_power',
                 'open_node_gpio', 'open_node_i2c',
@@ -55,8 +68,9 @@ class ControlNodeIotlab(ControlNodeBase):
         self.default_profile = default_profile
 
         self.openocd = OpenOCD.from_node(self)
-        self.cn_serial = cn_interface.ControlNodeSerial(self.TTY)
-        self.protocol = cn_protocol.Protocol(self.cn_serial.send_command)
+        self.cn_serial = ControlNodeSerial(self.TTY)
+        self.protocol = cn_protocol.Protocol(self.cn_serial.send_command,
+                                             self.cn_serial.send_commands)
         self.open_node_state = 'stop'
         self.profile = self.default_profile
 
@@ -70,10 +84,22 @@ class ControlNodeIotlab(ControlNodeBase):
         """ Start ControlNode serial interface """
         ret_val = 0
         ret_val += self.reset()
+        ret_val += self.serial_start(self.oml_xml_config(exp_id, exp_files))
+        return ret_val
+
+    def oml_xml_config(self, exp_id, exp_files=None):
+        """ Experiment OML configuration for `serial_start` """
+        return self.cn_serial.oml_xml_config(self.node_id, exp_id, exp_files)
+
+    def serial_start(self, oml_cfg=None):
+        """ Start ControlNode serial interface and open node, after reset
 
-        oml_cfg = self.cn_serial.oml_xml_config(self.node_id, exp_id,
-                                                exp_files)
+        `start` steps, run separately by the gateway manager to prepare the
+        experiment while the control node resets. """
+        ret_val = 0
         ret_val += self.cn_serial.start(oml_cfg)
+        if ret_val == 0:
+            ret_val += self._wait_protocol_ready()
         ret_val += self.open_start('dc')
         return ret_val
 
@@ -97,12 +123,14 @@ class ControlNodeIotlab(ControlNodeBase):
     @logger_call("Control node : Start experiment")
     def start_experiment(self, profile):
         """ Configure the experiment """
-        ret_val = 0
-        ret_val += self.protocol.green_led_blink()
-        ret_val += self.protocol.set_time()
-        ret_val += self.protocol.set_node_id(self.node_id)
-        ret_val += self.configure_profile(profile)
-        return ret_val
+        # commands are pipelined
+        ret = self.protocol.send_batch([
+            (self.protocol.green_led_blink,),
+            (self.protocol.set_time,),
+            (self.protocol.set_node_id, self.node_id),
+            (self.configure_profile, profile),
+        ])
+        return sum(ret)
 
     @logger_call("Control node : stop of the experiment")
     def stop_experiment(self):
@@ -115,13 +143,27 @@ class ControlNodeIotlab(ControlNodeBase):
         return ret_val
 
     @logger_call("Control node : autotest setup.""")
-    def autotest_setup(self, measures_handler):
-        """Setup node for autotests."""
+    def autotest_setup(self, measures_handler, binary_handler=None):
+        """Setup node for autotests.
+
+        Measures are read from the binary measures channel when
+        `binary_handler` is given, as text otherwise. """
         ret_val = 0
         ret_val += self.reset()
 
-        self.cn_serial.measures_debug = measures_handler
-        self.cn_serial.start()
+        ret = 1
+        if binary_handler is not None:
+            self.cn_serial.measures_binary = binary_handler
+            ret = self.cn_serial.start()
+            if ret:
+                LOGGER.warning('Control node binary measures not available')
+                self.cn_serial.stop()
+        if ret:
+            self.cn_serial.measures_debug = measures_handler
+            ret = self.cn_serial.start()
+        ret_val += ret
+        if ret_val == 0:
+            ret_val += self._wait_protocol_ready()
 
         ret_val += self.protocol.set_time()
         return ret_val
@@ -140,14 +182,16 @@ class ControlNodeIotlab(ControlNodeBase):
         """ Configure the given profile on the control node """
         LOGGER.info('Configure profile on Control Node')
         self.profile = profile or self.default_profile
-        ret_val = 0
-        # power_mode (start|stop dc|batt)
-        ret_val += self.protocol.start_stop(self.open_node_state,
-                                            self.profile.power)
-        # Monitoring
-        ret_val += self.protocol.config_consumption(self.profile.consumption)
-        ret_val += self.protocol.config_radio(self.profile.radio)
-        return ret_val
+        # commands are pipelined
+        ret = self.protocol.send_batch([
+            # power_mode (start|stop dc|batt)
+            (self.protocol.start_stop, self.open_node_state,
+             self.profile.power),
+            # Monitoring
+            (self.protocol.config_consumption, self.profile.consumption),
+            (self.protocol.config_radio, self.profile.radio),
+        ])
+        return sum(ret)
 
     @logger_call("Control node : start power of open node")
     def open_start(self, power=None):
@@ -179,7 +223,7 @@ class ControlNodeIotlab(ControlNodeBase):
         firmware_path = firmware_path or self.FW_CONTROL_NODE
         LOGGER.info('Flash firmware on Control Node %s', firmware_path)
         ret = self.openocd.flash(firmware_path)
-        self._wait_control_node_ready()
+        ret += self._wait_control_node_ready()
         return ret
 
     @logger_call("Control node : reset")
@@ -187,17 +231,37 @@ class ControlNodeIotlab(ControlNodeBase):
         """ Reset the Control Node using jtag """
         LOGGER.info('Reset Control Node')
         ret = self.openocd.reset()
-        self._wait_control_node_ready()
+        ret += self._wait_control_node_ready()
         return ret
 
-    @staticmethod
-    def _wait_control_node_ready():
-        """ Wait that the ControlNode firmware starts.
+    def _wait_control_node_ready(self):
+        """ Wait that the ControlNode tty is present.
+
+        The tty is handled by the ftdi and stays present while the firmware
+        restarts, the firmware readiness is checked with
+        `_wait_protocol_ready` once the serial interface is started. """
+        if tty_watcher.wait_tty(self.TTY, True, self.READY_TIMEOUT):
+            return 0
+        LOGGER.error('Control node tty not visible: %s', self.TTY)
+        return 1
+
+    def _wait_protocol_ready(self):
+        """ Wait that the ControlNode firmware answers commands.
 
-        It waits one second when starting, and may also trigger udev when
-        restarting a node. This take a bit more than 1.1 second.
-        So wait 2 seconds to be safe.  """
-        time.sleep(2)
+        The firmware waits one second when starting, so try a command
+        round-trip every `PING_TIMEOUT` until it answers. """
+        end_time = time.time() + self.READY_TIMEOUT
+        cmd = ['green_led_on']
+        while True:
+            ping_end = time.time() + self.PING_TIMEOUT
+            answer = self.cn_serial.send_command(cmd, self.PING_TIMEOUT)
+            if answer == [cmd[0], 'ACK']:
+                return 0
+            if ping_end > end_time:
+                LOGGER.error('Control node firmware not answering')
+                return 1
+            # do not spin when the answer failed without waiting
+            time.sleep(max(0, ping_end - time.time()))
 
     def status(self):
         """ Check Control node status """
@@ -25,6 +25,7 @@
 Manage sending commands and receiving messages
 """
 
+import os
 from subprocess import PIPE
 
 try:
@@ -39,6 +40,8 @@ import atexit
 
 from gateway_code import common
 from gateway_code.utils import subprocess_timeout
+from gateway_code.utils import metrics
+from . import cn_measures
 
 LOGGER = logging.getLogger('gateway_code')
 
@@ -64,40 +67,25 @@ OML_XML = '''
 '''
 
 
-class ControlNodeSerial(object):  # pylint:disable=too-many-instance-attributes
-    """
-    Class handling the communication with the control node serial program
-    """
+class ControlNodeSerialBase(object):
+    """ Common part of control node serial program interfaces
+
+    Implementations handle the process, `_ready` and `_answer` """
+    ANSWER_TIMEOUT = 1.0
 
     def __init__(self, tty):
         self.tty = tty
         self.process = None
-        self.reader_thread = None
-        self.msgs = queue.Queue(1)
         self.measures_debug = None
+        self.measures_binary = None
+        self.binary_reader_thread = None
 
-        self._send_mutex = threading.Semaphore(1)
-        self._wait_ready = queue.Queue(1)
         self._oml_cfg_file = None
+        self._binary_fd = None
 
-        # cleanup in case of error
-        atexit.register(self.stop)
-
-    def start(self, oml_xml_config=None):
-        """Start control node interface.
-
-        Run `control node serial program` and handle its answers.
-        """
-        common.empty_queue(self._wait_ready)
-
-        args = self._cn_interface_args(oml_xml_config)
-        self.process = subprocess_timeout.Popen(args, stderr=PIPE, stdin=PIPE)
-
-        self.reader_thread = threading.Thread(target=self._reader)
-        self.reader_thread.start()
-
-        ret = self._wait_ready.get()
-        return ret
+    def _pass_fds(self):
+        """ File descriptors to keep open in control node serial process """
+        return () if self._binary_fd is None else self._binary_fd[1:]
 
     def _cn_interface_args(self, oml_xml_config=None):
         """ Arguments for control_node_serial_interface """
@@ -112,8 +100,26 @@ class ControlNodeSerial(object):  # pylint:disable=too-many-instance-attributes
         if self.measures_debug is not None:
             args += ['-d']
 
+        # Binary measures
+        if self.measures_binary is not None:
+            self._binary_fd = os.pipe()
+            args += ['-b', str(self._binary_fd[1])]
+
         return args
 
+    def _binary_reader_start(self):
+        """ Start binary measures reader, once the process got the pipe """
+        if self._binary_fd is None:
+            return
+        read_fd, write_fd = self._binary_fd
+        self._binary_fd = None
+        # only the process should keep the write end to get EOF at exit
+        os.close(write_fd)
+
+        reader = cn_measures.MeasuresReader(read_fd, self.measures_binary)
+        self.binary_reader_thread = threading.Thread(target=reader.run)
+        self.binary_reader_thread.start()
+
     @staticmethod
     def _oml_config_file(oml_xml_config=None):
         """ Create oml config file """
@@ -137,44 +143,20 @@ class ControlNodeSerial(object):  # pylint:disable=too-many-instance-attributes
         cfg = OML_XML.format(node_id=node_id, exp_id=exp_id, **exp_files_dict)
         return cfg.strip()
 
-    def stop(self):
-        """ Stop control node interface.
-
-        Stop `control node serial program` and answers handler.  """
-
-        try:
-            self._process_stop(timeout=5)
-        except OSError:
-            LOGGER.error('Control node process already terminated')
-
-        if self.reader_thread is not None:
-            self.reader_thread.join()
+    def _cleanup(self):
+        """ Cleanup once process and answers reader are stopped """
+        if self.binary_reader_thread is not None:
+            self.binary_reader_thread.join()
+            self.binary_reader_thread = None
 
-        # remove process after reader_thread is joined
         self.process = None
         self.measures_debug = None
+        self.measures_binary = None
 
         # cleanup oml
         if self._oml_cfg_file is not None:
             self._oml_cfg_file.close()
             self._oml_cfg_file = None
-        return 0
-
-    def _process_stop(self, timeout=None):
-        """Stop or kill control node interface.
-
-        :raises: OSError if already terminated
-        """
-        try:
-            LOGGER.debug('Control node serial process terminate')
-            self.process.terminate()
-            self.process.wait(timeout=timeout)
-        except subprocess_timeout.TimeoutExpired:
-            # may not have been killed sometime
-            LOGGER.warning('Control node serial not terminated, kill it')
-            self.process.kill()
-        except AttributeError:
-            pass  # None
 
     def _handle_answer(self, line):
         """Handle control node answers
@@ -197,13 +179,18 @@ class ControlNodeSerial(object):  # pylint:disable=too-many-instance-attributes
         elif answer[0] == 'measures_debug:':  # measures output
             self.measures_handler(line)
         elif answer[0] == 'cn_serial_ready':  # cn_serial interface ready
-            self._wait_ready.put(0)
+            self._ready(0)
 
         else:  # control node answer to a command
-            try:
-                self.msgs.put_nowait(answer)
-            except queue.Full:
-                LOGGER.error('Control node answer queue full: %r', answer)
+            self._answer(answer)
+
+    def _ready(self, ret):
+        """ Control node serial program is ready or failed to start """
+        raise NotImplementedError()
+
+    def _answer(self, answer):
+        """ Handle control node answer to a command """
+        raise NotImplementedError()
 
     def measures_handler(self, line):
         """ Debug measures """
@@ -211,6 +198,84 @@ class ControlNodeSerial(object):  # pylint:disable=too-many-instance-attributes
         if self.measures_debug is not None:
             self.measures_debug(line)  # pylint:disable=not-callable
 
+
+class ControlNodeSerial(ControlNodeSerialBase):
+    """
+    Class handling the communication with the control node serial program
+    """
+
+    def __init__(self, tty):
+        super(ControlNodeSerial, self).__init__(tty)
+        self.reader_thread = None
+        self.msgs = queue.Queue(1)
+
+        self._send_mutex = threading.Semaphore(1)
+        self._wait_ready = queue.Queue(1)
+
+        # cleanup in case of error
+        atexit.register(self.stop)
+
+    @metrics.timed()
+    def start(self, oml_xml_config=None):
+        """Start control node interface.
+
+        Run `control node serial program` and handle its answers.
+        """
+        common.empty_queue(self._wait_ready)
+
+        args = self._cn_interface_args(oml_xml_config)
+        self.process = subprocess_timeout.Popen(args, stderr=PIPE, stdin=PIPE,
+                                                pass_fds=self._pass_fds())
+        self._binary_reader_start()
+
+        self.reader_thread = threading.Thread(target=self._reader)
+        self.reader_thread.start()
+
+        ret = self._wait_ready.get()
+        return ret
+
+    def stop(self):
+        """ Stop control node interface.
+
+        Stop `control node serial program` and answers handler.  """
+
+        try:
+            self._process_stop(timeout=5)
+        except OSError:
+            LOGGER.error('Control node process already terminated')
+
+        if self.reader_thread is not None:
+            self.reader_thread.join()
+
+        # remove process after reader_thread is joined
+        self._cleanup()
+        return 0
+
+    def _process_stop(self, timeout=None):
+        """Stop or kill control node interface.
+
+        :raises: OSError if already terminated
+        """
+        try:
+            LOGGER.debug('Control node serial process terminate')
+            self.process.terminate()
+            self.process.wait(timeout=timeout)
+        except subprocess_timeout.TimeoutExpired:
+            # may not have been killed sometime
+            LOGGER.warning('Control node serial not terminated, kill it')
+            self.process.kill()
+        except AttributeError:
+            pass  # None
+
+    def _ready(self, ret):
+        self._wait_ready.put(ret)
+
+    def _answer(self, answer):
+        try:
+            self.msgs.put_nowait(answer)
+        except queue.Full:
+            LOGGER.error('Control node answer queue full: %r', answer)
+
     def _reader(self):
         """ Reader thread worker.
 
@@ -223,13 +288,14 @@ class ControlNodeSerial(object):  # pylint:disable=too-many-instance-attributes
             self._handle_answer(line.strip())
         else:
             LOGGER.error('Control node serial reader thread ended prematurely')
-            self._wait_ready.put(1)  # in case of failure at startup
+            self._ready(1)  # in case of failure at startup
 
-    def send_command(self, command_args):
+    def send_command(self, command_args, timeout=None):
         """ Send given command to control node and wait for an answer
 
         :param command_args: command arguments
         :type command_args: list of string
+        :param timeout: answer timeout, `ANSWER_TIMEOUT` by default
         :return: received answers or `None` if timeout caught
         """
         command_str = ' '.join(command_args) + '\n'
@@ -239,8 +305,8 @@ class ControlNodeSerial(object):  # pylint:disable=too-many-instance-attributes
             try:
                 LOGGER.debug('control_node_cmd: %r', command_args)
                 self.process.stdin.write(command_str)
-                # wait for answer 1 second at max
-                answer_cn = self.msgs.get(block=True, timeout=1.0)
+                answer_cn = self.msgs.get(
+                    block=True, timeout=timeout or self.ANSWER_TIMEOUT)
             except queue.Empty:
                 LOGGER.error('control_node_serial answer timeout')
                 answer_cn = None
@@ -254,3 +320,38 @@ class ControlNodeSerial(object):  # pylint:disable=too-many-instance-attributes
                 LOGGER.debug('control_node_answer: %r', answer_cn)
 
         return answer_cn
+
+    def send_commands(self, commands_args):
+        """ Send given commands to control node back-to-back and wait for
+        all their answers
+
+        The control node handles commands in order, so answers are matched
+        in order. Each answer is waited 1 second at max.
+
+        :param commands_args: list of commands arguments
+        :type commands_args: list of list of string
+        :return: list of received answers with `None` for missing ones
+        """
+        commands_str = ''.join(' '.join(args) + '\n' for args in commands_args)
+        answers = []
+        with self._send_mutex:
+            # room for all answers, also removes old not treated answers
+            self.msgs = queue.Queue(len(commands_args))
+            try:
+                LOGGER.debug('control_node_cmds: %r', commands_args)
+                self.process.stdin.write(commands_str)
+                for _ in commands_args:
+                    answers.append(self.msgs.get(
+                        block=True, timeout=self.ANSWER_TIMEOUT))
+            except queue.Empty:
+                LOGGER.error('control_node_serial answer timeout')
+            except AttributeError:
+                LOGGER.error('control_node_serial stdin is None')
+            except IOError:
+                LOGGER.error('control_node_serial process is terminated')
+            finally:
+                self.msgs = queue.Queue(1)
+                LOGGER.debug('control_node_answers: %r', answers)
+
+        answers += [None] * (len(commands_args) - len(answers))
+        return answers
@@ -0,0 +1,212 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" asyncio interface with the `control node serial program`.
+
+Same contract as `cn_interface.ControlNodeSerial` without a reader thread:
+the process and its answers are handled by coroutines on the shared
+`gateway_code.utils.event_loop`. Synchronous methods wait for them, so it
+can be used by `cn_protocol.Protocol` and `ControlNodeIotlab`.
+
+Requires python >= 3.8 to run subprocesses from the loop thread.
+"""
+
+import os
+import asyncio
+import atexit
+import logging
+import weakref
+from asyncio.subprocess import PIPE
+
+from gateway_code.utils import event_loop
+from gateway_code.utils import metrics
+from .cn_interface import ControlNodeSerialBase
+
+LOGGER = logging.getLogger('gateway_code')
+
+# Running interfaces, stopped at exit
+_RUNNING = weakref.WeakSet()
+
+
+class AsyncControlNodeSerial(ControlNodeSerialBase):
+    """ asyncio communication with the control node serial program """
+    STOP_TIMEOUT = 5
+
+    def __init__(self, tty):
+        super(AsyncControlNodeSerial, self).__init__(tty)
+        self.reader_task = None
+        self._answers = None
+        self._wait_ready = None
+        self._send_lock = None
+
+    # Synchronous facade
+
+    @metrics.timed()
+    def start(self, oml_xml_config=None):
+        """Start control node interface.
+
+        Run `control node serial program` and handle its answers.
+        """
+        return event_loop.run(self.start_async(oml_xml_config))
+
+    def stop(self):
+        """ Stop control node interface.
+
+        Stop `control node serial program` and answers handler.  """
+        return event_loop.run(self.stop_async())
+
+    def send_command(self, command_args, timeout=None):
+        """ Send given command to control node and wait for an answer
+
+        :param command_args: command arguments
+        :type command_args: list of string
+        :param timeout: answer timeout, `ANSWER_TIMEOUT` by default
+        :return: received answers or `None` if timeout caught
+        """
+        return event_loop.run(self.send_command_async(command_args, timeout))
+
+    def send_commands(self, commands_args):
+        """ Send given commands to control node back-to-back and wait for
+        all their answers
+
+        :return: list of received answers with `None` for missing ones
+        """
+        return event_loop.run(self.send_commands_async(commands_args))
+
+    # Coroutines
+
+    async def start_async(self, oml_xml_config=None):
+        """ Start process and answers reader, return when it is ready """
+        self._answers = asyncio.Queue()
+        self._wait_ready = asyncio.get_event_loop().create_future()
+        self._send_lock = asyncio.Lock()
+
+        args = self._cn_interface_args(oml_xml_config)
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *args, stdin=PIPE, stderr=PIPE, pass_fds=self._pass_fds())
+        except OSError as err:
+            LOGGER.error('Control node serial start failed: %r', err)
+            self._binary_fd_close()
+            return 1
+        self._binary_reader_start()
+        _RUNNING.add(self)
+
+        self.reader_task = asyncio.ensure_future(self._reader())
+        return await self._wait_ready
+
+    def _binary_fd_close(self):
+        """ Close binary measures pipe when process was not started """
+        if self._binary_fd is not None:
+            for fd_num in self._binary_fd:
+                os.close(fd_num)
+            self._binary_fd = None
+
+    async def stop_async(self):
+        """ Stop process and wait answers reader end """
+        _RUNNING.discard(self)
+        if self.process is not None:
+            await self._process_stop(self.STOP_TIMEOUT)
+        if self.reader_task is not None:
+            await self.reader_task
+            self.reader_task = None
+        self._cleanup()
+        return 0
+
+    async def _process_stop(self, timeout):
+        """ Terminate process, kill it after `timeout` """
+        LOGGER.debug('Control node serial process terminate')
+        try:
+            self.process.terminate()
+        except ProcessLookupError:
+            LOGGER.error('Control node process already terminated')
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            LOGGER.warning('Control node serial not terminated, kill it')
+            self.process.kill()
+            await self.process.wait()
+
+    async def _reader(self):
+        """ Read and handle control node answers until process ends """
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                break
+            self._handle_answer(line.decode('utf-8', 'replace').strip())
+        if not self._wait_ready.done():
+            LOGGER.error('Control node serial reader ended prematurely')
+            self._ready(1)
+
+    def _ready(self, ret):
+        if not self._wait_ready.done():
+            self._wait_ready.set_result(ret)
+
+    def _answer(self, answer):
+        self._answers.put_nowait(answer)
+
+    def _empty_answers(self):
+        """ Remove old not treated answers """
+        while not self._answers.empty():
+            self._answers.get_nowait()
+
+    async def send_command_async(self, command_args, timeout=None):
+        """ Coroutine version of `send_command` """
+        return (await self.send_commands_async([command_args], timeout))[0]
+
+    async def send_commands_async(self, commands_args, timeout=None):
+        """ Coroutine version of `send_commands`
+
+        Each answer is waited `timeout`, `ANSWER_TIMEOUT` by default """
+        if self._send_lock is None:
+            LOGGER.error('control_node_serial stdin is None')
+            return [None] * len(commands_args)
+
+        commands_str = ''.join(' '.join(args) + '\n' for args in commands_args)
+        answers = []
+        async with self._send_lock:
+            self._empty_answers()
+            try:
+                LOGGER.debug('control_node_cmds: %r', commands_args)
+                self.process.stdin.write(commands_str.encode('utf-8'))
+                await self.process.stdin.drain()
+                for _ in commands_args:
+                    answers.append(await asyncio.wait_for(
+                        self._answers.get(), timeout or self.ANSWER_TIMEOUT))
+            except asyncio.TimeoutError:
+                LOGGER.error('control_node_serial answer timeout')
+            except AttributeError:
+                LOGGER.error('control_node_serial stdin is None')
+            except (IOError, ConnectionError):
+                LOGGER.error('control_node_serial process is terminated')
+            finally:
+                LOGGER.debug('control_node_answers: %r', answers)
+
+        answers += [None] * (len(commands_args) - len(answers))
+        return answers
+
+
+@atexit.register
+def _stop_all():  # pragma: no cover
+    """ Stop running interfaces at exit, single handler for all """
+    for cn_serial in list(_RUNNING):
+        cn_serial.stop()
@@ -0,0 +1,182 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Binary measures channel of `control node serial program`.
+
+When started with '-b <fd>', the control node serial program writes one
+48 bytes frame per measure, in native byte order, on file descriptor `fd`:
+
+    uint8 type, uint8 crc_ok, uint16 reserved,
+    uint32 timestamp_s, uint32 timestamp_us, uint32 reserved,
+    double values[4]
+
+Frames are decoded in bulk into array backed columns, without per measure
+text parsing.
+"""
+
+import os
+import array
+import errno
+import logging
+
+LOGGER = logging.getLogger('gateway_code')
+
+FRAME_SIZE = 48
+_WORDS = FRAME_SIZE // 4  # uint32 per frame
+_DOUBLES = FRAME_SIZE // 8  # double per frame, values at index 2 to 5
+
+CONSUMPTION = 1
+RADIO = 2
+SNIFFER = 3
+
+# measure type: (name, values columns)
+MEASURES = {
+    CONSUMPTION: ('consumption', ('power', 'voltage', 'current')),
+    RADIO: ('radio', ('channel', 'rssi')),
+    SNIFFER: ('sniffer', ('channel', 'rssi', 'lqi', 'length')),
+}
+
+
+def _array(typecode, data=b''):
+    """ Return an array of `typecode` initialized from bytes `data` """
+    arr = array.array(typecode)
+    if hasattr(arr, 'frombytes'):
+        arr.frombytes(data)
+    else:  # pragma: no cover
+        arr.fromstring(data)  # python2
+    return arr
+
+
+class MeasuresColumns(object):
+    """ Measures of one type stored as array columns """
+
+    def __init__(self, columns):
+        self.timestamps = _array('d')
+        self.names = tuple(columns)
+        self.columns = dict((name, _array('d')) for name in columns)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def extend(self, timestamps, values):
+        """ Add `timestamps` and `values` columns in columns order """
+        self.timestamps.extend(timestamps)
+        for name, column in zip(self.names, values):
+            self.columns[name].extend(column)
+
+
+class MeasuresRecords(object):
+    """ Decoded binary measures of all types
+
+    `crc_ok` is only stored for sniffer measures. """
+
+    def __init__(self):
+        self.measures = dict((name, MeasuresColumns(columns))
+                             for name, columns in MEASURES.values())
+        self.sniffer_crc_ok = _array('B')
+
+    def __getitem__(self, name):
+        return self.measures[name]
+
+    def decode(self, data):
+        """ Decode complete frames of `data` and add them to the records
+
+        :return: number of bytes decoded, remaining ones are an incomplete
+            frame """
+        num = len(data) // FRAME_SIZE
+        data = data[:num * FRAME_SIZE]
+        if not num:
+            return 0
+
+        kinds = bytearray(data[0::FRAME_SIZE])
+        frames = (_array('I', data), _array('d', data),
+                  bytearray(data[1::FRAME_SIZE]))
+
+        if len(set(kinds)) == 1:
+            # fast path, only one measure type, use slices
+            self._add(kinds[0], slice(None), *frames)
+        else:
+            for kind in set(kinds):
+                indexes = [i for i, k in enumerate(kinds) if k == kind]
+                self._add(kind, indexes, *frames)
+        return len(data)
+
+    def _add(self, kind, indexes,  # pylint:disable=too-many-arguments
+             words, doubles, crcs):
+        """ Add frames at `indexes` (list or slice) of type `kind` """
+        try:
+            name, columns = MEASURES[kind]
+        except KeyError:
+            LOGGER.error('Binary measures: unknown measure type %r', kind)
+            return
+
+        def _column(arr, offset, step):
+            """ Select column `offset` of frames in `indexes` """
+            if isinstance(indexes, slice):
+                return arr[offset::step]
+            return [arr[i * step + offset] for i in indexes]
+
+        seconds = _column(words, 1, _WORDS)
+        micros = _column(words, 2, _WORDS)
+        timestamps = [sec + usec / 1e6 for sec, usec in zip(seconds, micros)]
+        values = [_column(doubles, 2 + i, _DOUBLES)
+                  for i in range(len(columns))]
+        self.measures[name].extend(timestamps, values)
+
+        if kind == SNIFFER:
+            self.sniffer_crc_ok.extend(_column(crcs, 0, 1))
+
+
+class MeasuresReader(object):
+    """ Read binary measures from a file descriptor
+
+    Each chunk of read frames is decoded in a new `MeasuresRecords` given
+    to `handler`. """
+    READ_SIZE = 256 * FRAME_SIZE
+
+    def __init__(self, read_fd, handler):
+        self.read_fd = read_fd
+        self.handler = handler
+
+    def run(self):
+        """ Read and decode until end of file, then close fd """
+        remaining = b''
+        while True:
+            try:
+                data = os.read(self.read_fd, self.READ_SIZE)
+            except OSError as err:
+                if err.errno == errno.EINTR:  # pragma: no cover
+                    continue
+                LOGGER.error('Binary measures read error: %r', err)
+                break
+            if not data:
+                break
+            data = remaining + data
+            records = MeasuresRecords()
+            decoded = records.decode(data)
+            remaining = data[decoded:]
+            if decoded:
+                self.handler(records)
+        os.close(self.read_fd)
@@ -22,20 +22,103 @@
 
 """ Protocol between python code and control_node_serial_interface C code """
 
+import logging
+import threading
+
+from gateway_code.utils import metrics
+
+LOGGER = logging.getLogger('gateway_code')
+
 
 class Protocol(object):
     """ Implements commands that can be sent to control node interface """
 
-    def __init__(self, sender):
+    def __init__(self, sender, batch_sender=None):
         self.sender = sender
+        self.batch_sender = batch_sender or self._sequential_sender
+        self._batch = threading.local()
+
+    def _sequential_sender(self, commands):
+        """ Send commands one by one with `sender` """
+        return [self.sender(command_list) for command_list in commands]
 
     def send_cmd(self, command_list):
         """ Send a command to the control node and wait for it's answer.  """
-        command = command_list[0]
-        answer = self.sender(command_list)
-        answer_valid = ([command, 'ACK'] == answer)
+        batch_commands = getattr(self._batch, 'commands', None)
+        if batch_commands is not None:
+            # answer will be checked by 'send_batch'
+            batch_commands.append(command_list)
+            return 0
+        with metrics.timer('cn_protocol.%s' % command_list[0]):
+            answer = self.sender(command_list)
+        return self._check_answer(command_list, answer)
+
+    @staticmethod
+    def _check_answer(command_list, answer):
+        """ Return 0 if answer is an ACK for command_list """
+        answer_valid = ([command_list[0], 'ACK'] == answer)
         return 0 if answer_valid else 1   # 0 on success
 
+    def send_batch(self, calls):
+        """ Run `calls` with the commands they send pipelined
+
+        Commands sent by calls are collected then written back-to-back
+        using `batch_sender`, answers being matched in order.
+        A call sending no command keeps its own return value.
+        When run inside another `send_batch`, commands are added to the
+        outer batch which checks the answers.
+
+        :param calls: list of (function, arg, ...) tuples, functions sending
+            commands using this protocol like `(protocol.set_time,)`
+        :return: list of each call result, 0 on success
+        """
+        outer_batch = getattr(self._batch, 'commands', None)
+        commands = [] if outer_batch is None else outer_batch
+        self._batch.commands = commands
+        try:
+            calls_cmds = []
+            for call in calls:
+                first = len(commands)
+                ret = call[0](*call[1:])
+                calls_cmds.append((ret, first, len(commands)))
+        finally:
+            self._batch.commands = outer_batch
+
+        if outer_batch is not None:
+            return [ret for ret, _, _ in calls_cmds]
+
+        answers = []
+        if commands:
+            with metrics.timer('cn_protocol.batch'):
+                answers = self.batch_sender(commands)
+        answers_ret = self._check_answers(commands, answers)
+        return [ret + sum(answers_ret[first:last])
+                for ret, first, last in calls_cmds]
+
+    @classmethod
+    def _check_answers(cls, commands, answers):
+        """ Check each command answer, matching them by command name
+
+        A command not answered by the control node shifts the following
+        answers, so once an answer does not match its command, remaining
+        commands are failed.
+
+        >>> Protocol._check_answers([['a'], ['b', '1'], ['c']],
+        ...     [['a', 'ACK'], ['b', 'NACK'], ['c', 'ACK']])
+        [0, 1, 0]
+        >>> Protocol._check_answers([['a'], ['b'], ['c']],
+        ...     [['a', 'ACK'], ['c', 'ACK'], None])
+        [0, 1, 1]
+        """
+        rets = []
+        for command, answer in zip(commands, answers):
+            if answer and answer[0] != command[0]:
+                LOGGER.error('Control node answer %r does not match %r',
+                             answer, command)
+                break
+            rets.append(cls._check_answer(command, answer))
+        return rets + [1] * (len(commands) - len(rets))
+
     def start_stop(self, command, alim):
         """ Start/stop open node
 
@@ -0,0 +1,115 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for cn_interface_async """
+
+# pylint: disable=missing-docstring
+# pylint: disable=protected-access
+
+import os
+import sys
+import time
+import logging
+import unittest
+
+import mock
+from testfixtures import LogCapture
+
+if sys.version_info >= (3, 8):
+    from .. import cn_interface_async
+
+FAKE_CN_SERIAL = [sys.executable,
+                  os.path.join(os.path.dirname(__file__), 'fake_cn_serial.py')]
+
+
+@unittest.skipIf(sys.version_info < (3, 8), 'Requires python >= 3.8')
+class TestAsyncControlNodeSerial(unittest.TestCase):
+
+    def setUp(self):
+        self.cn = cn_interface_async.AsyncControlNodeSerial('tty')
+        mock.patch.object(self.cn, '_cn_interface_args',
+                          return_value=FAKE_CN_SERIAL).start()
+        self.log = LogCapture('gateway_code', level=logging.WARNING)
+
+    def tearDown(self):
+        self.cn.stop()
+        mock.patch.stopall()
+        self.log.uninstall()
+
+    def test_start_send_stop(self):
+        self.cn.measures_debug = mock.Mock()
+        self.assertEqual(0, self.cn.start())
+        self.assertEqual(['start', 'ACK'], self.cn.send_command(['start']))
+        self.assertEqual([['a', 'ACK'], ['b', 'ACK']],
+                         self.cn.send_commands([['a', '1'], ['b']]))
+        self.assertEqual(['measure', 'ACK'], self.cn.send_command(['measure']))
+        self.cn.measures_debug.assert_called_with(
+            'measures_debug: radio_measure 1.0 11 -91')
+
+        self.assertEqual(0, self.cn.stop())
+        self.assertIsNone(self.cn.process)
+        self.assertIsNone(self.cn.measures_debug)
+        self.log.check()
+
+    def test_answer_timeout(self):
+        self.cn.ANSWER_TIMEOUT = 0.1
+        self.cn.start()
+        self.assertEqual([['a', 'ACK'], None],
+                         self.cn.send_commands([['a'], ['silent']]))
+        # no answer mixed with next command
+        self.assertEqual(['b', 'ACK'], self.cn.send_command(['b']))
+        self.log.check(
+            ('gateway_code', 'ERROR', 'control_node_serial answer timeout'))
+
+    def test_send_command_timeout(self):
+        self.cn.start()
+        t_ref = time.time()
+        self.assertIsNone(self.cn.send_command(['silent'], timeout=0.1))
+        self.assertGreater(0.5, time.time() - t_ref)
+
+    def test_send_command_not_started(self):
+        self.assertIsNone(self.cn.send_command(['a']))
+        self.cn.start()
+        self.cn.stop()
+        self.assertIsNone(self.cn.send_command(['a']))
+
+    def test_start_error(self):
+        self.cn._cn_interface_args.return_value = ['/non/existent/program']
+        self.assertEqual(1, self.cn.start())
+
+        self.cn._cn_interface_args.return_value = [sys.executable, '-c', '']
+        self.assertEqual(1, self.cn.start())
+        self.log.check(
+            ('gateway_code', 'ERROR',
+             "Control node serial start failed: FileNotFoundError(2, "
+             "'No such file or directory')"),
+            ('gateway_code', 'ERROR',
+             'Control node serial reader ended prematurely'))
+
+    def test_stop_kill(self):
+        self.cn.STOP_TIMEOUT = 0.5
+        self.cn.start()
+        self.cn.send_command(['sigterm_ignore'])
+        self.cn.stop()
+        self.log.check(
+            ('gateway_code', 'WARNING',
+             'Control node serial not terminated, kill it'))
@@ -46,8 +46,8 @@ class TestControlNodeSerial(unittest.TestCase):
     def setUp(self):
         self.popen_patcher = mock.patch(
             'gateway_code.utils.subprocess_timeout.Popen')
-        popen_class = self.popen_patcher.start()
-        self.popen = popen_class.return_value
+        self.popen_class = self.popen_patcher.start()
+        self.popen = self.popen_class.return_value
 
         self.popen.terminate.side_effect = self._terminate
         self.popen.poll.return_value = None
@@ -140,6 +140,33 @@ class TestControlNodeSerial(unittest.TestCase):
         self.assertEqual(['start', 'ACK'], ret)
         self.cn.stop()
 
+    def test_send_commands(self):
+        def _answers(*_):
+            self.readline_ret_vals.put('set_time ACK\n')
+            self.readline_ret_vals.put('start ACK\n')
+        self.popen.stdin.write.side_effect = _answers
+
+        self.cn.start()
+        ret = self.cn.send_commands([['set_time'], ['start', 'DC']])
+        self.assertEqual([['set_time', 'ACK'], ['start', 'ACK']], ret)
+        self.popen.stdin.write.assert_called_once_with('set_time\nstart DC\n')
+        self.cn.stop()
+
+    def test_send_commands_missing_answer(self):
+        self.popen.stdin.write.side_effect = \
+            (lambda *x: self.readline_ret_vals.put('set_time ACK\n'))
+
+        self.cn.start()
+        ret = self.cn.send_commands([['set_time'], ['start', 'DC']])
+        self.assertEqual([['set_time', 'ACK'], None], ret)
+        self.cn.stop()
+        self.log_error.check(
+            ('gateway_code', 'ERROR', 'control_node_serial answer timeout'))
+
+    def test_send_commands_cn_interface_stoped(self):
+        ret = self.cn.send_commands([['lala'], ['lili']])
+        self.assertEqual([None, None], ret)
+
     def test_send_command_no_answer(self):
         self.cn.start()
         ret = self.cn.send_command(['start', 'DC'])
@@ -184,6 +211,22 @@ class TestControlNodeSerial(unittest.TestCase):
 
 # _config_oml coverage tests
 
+    def test_measures_binary(self):
+        handler = mock.Mock()
+        self.cn.measures_binary = handler
+        self.cn.start()
+
+        args, kwargs = self.popen_class.call_args
+        write_fd = int(args[0][args[0].index('-b') + 1])
+        self.assertEqual((write_fd,), kwargs['pass_fds'])
+        # Process is mocked, pipe is closed and reader stops on EOF
+        self.cn.binary_reader_thread.join(5)
+        self.assertFalse(self.cn.binary_reader_thread.is_alive())
+
+        self.cn.stop()
+        self.assertIsNone(self.cn.binary_reader_thread)
+        self.assertIsNone(self.cn.measures_binary)
+
     def test_empty_config_oml(self):
         # No experiment description
         ret = self.cn._oml_config_file(None)
@@ -38,11 +38,13 @@ class TestCnIotlab(unittest.TestCase):
         self.cn_node.default_profile.consumption = 'test_consumption'
         self.cn_node.default_profile.radio = 'test_radio'
         cn_serial_class = patch('gateway_code.control_nodes.cn_iotlab.'
-                                'cn_interface.ControlNodeSerial').start()
+                                'ControlNodeSerial').start()
         self.cn_node.cn_serial = cn_serial_class.return_value
         self.cn_node.cn_serial.oml_xml_config.return_value = 'oml_cfg_test'
         self.cn_node.cn_serial.start.return_value = 0
         self.cn_node.cn_serial.stop.return_value = 0
+        self.cn_node.cn_serial.send_command.return_value = [
+            'green_led_on', 'ACK']
 
         cn_protocol_class = patch('gateway_code.control_nodes.cn_iotlab.'
                                   'cn_protocol.Protocol').start()
@@ -54,6 +56,8 @@ class TestCnIotlab(unittest.TestCase):
         self.cn_node.protocol.set_node_id.return_value = 0
         self.cn_node.protocol.config_consumption.return_value = 0
         self.cn_node.protocol.config_radio.return_value = 0
+        self.cn_node.protocol.send_batch.side_effect = (
+            lambda calls: [call[0](*call[1:]) for call in calls])
 
         openocd_class = patch('gateway_code.utils.openocd.OpenOCD').start()
         self.cn_node.openocd = openocd_class.return_value
@@ -62,6 +66,8 @@ class TestCnIotlab(unittest.TestCase):
 
         # Let's be fast
         patch('time.sleep').start()
+        self.wait_tty = patch('gateway_code.utils.tty_watcher.wait_tty',
+                              return_value=True).start()
 
     def tearDown(self):
         patch.stopall()
@@ -126,6 +132,16 @@ class TestCnIotlab(unittest.TestCase):
         self.cn_node.protocol.start_stop.assert_called_with(
             'stop', 'test_power')
 
+    def test_start_experiment_batch(self):
+        """Test start experiment commands are sent in one batch."""
+        assert self.cn_node.start_experiment(None) == 0
+        self.cn_node.protocol.send_batch.assert_any_call([
+            (self.cn_node.protocol.green_led_blink,),
+            (self.cn_node.protocol.set_time,),
+            (self.cn_node.protocol.set_node_id, 'test'),
+            (self.cn_node.configure_profile, None),
+        ])
+
     def test_stop_experiment(self):
         """Test stop experiment of iotlab control node."""
         assert self.cn_node.stop_experiment() == 0
@@ -148,6 +164,23 @@ class TestCnIotlab(unittest.TestCase):
         self.cn_node.cn_serial.start.assert_called_with()
         self.cn_node.protocol.set_time.assert_called_once()
 
+    def test_autotest_setup_binary(self):
+        """Test autotest setup with binary measures."""
+        text_handler, binary_handler = Mock(), Mock()
+        cn_serial = self.cn_node.cn_serial
+        assert self.cn_node.autotest_setup(text_handler, binary_handler) == 0
+        assert cn_serial.measures_binary == binary_handler
+        cn_serial.start.assert_called_once()
+        assert not cn_serial.stop.called
+
+        # serial program without binary measures, fallback to text measures
+        cn_serial.start.reset_mock()
+        cn_serial.start.side_effect = [1, 0]
+        assert self.cn_node.autotest_setup(text_handler, binary_handler) == 0
+        assert cn_serial.start.call_count == 2
+        cn_serial.stop.assert_called_once()
+        assert cn_serial.measures_debug == text_handler
+
     def test_autotest_teardown(self):
         """Test autotest setup of iotlab control node."""
         assert self.cn_node.autotest_teardown(False) == 0
@@ -159,6 +192,40 @@ class TestCnIotlab(unittest.TestCase):
         self.cn_node.protocol.start_stop.assert_called_once()
         self.cn_node.protocol.start_stop.assert_called_with('stop', 'dc')
 
+    def test_wait_control_node_ready(self):
+        """Test waiting control node after reset and flash."""
+        assert self.cn_node.reset() == 0
+        self.wait_tty.assert_called_with(ControlNodeIotlab.TTY, True, 3)
+        assert self.cn_node.flash() == 0
+        assert self.wait_tty.call_count == 2
+
+        # errors are returned
+        self.wait_tty.return_value = False
+        assert self.cn_node.reset() == 1
+        assert self.cn_node.flash() == 1
+
+    def test_wait_protocol_ready(self):
+        """Test waiting control node firmware answers after start."""
+        send_command = self.cn_node.cn_serial.send_command
+        send_command.side_effect = [None, None, ['green_led_on', 'ACK']]
+        assert self.cn_node.start('123') == 0
+        assert send_command.call_count == 3
+        send_command.assert_called_with(['green_led_on'], 0.1)
+
+        # firmware never answers
+        send_command.side_effect = None
+        send_command.return_value = None
+        self.cn_node.READY_TIMEOUT = 0.2
+        assert self.cn_node.start('123') == 1
+        assert self.cn_node.autotest_setup(None) == 1
+        self.cn_node.protocol.set_time.assert_called_once()
+
+        # serial interface start error, no need to wait
+        send_command.reset_mock()
+        self.cn_node.cn_serial.start.return_value = 1
+        assert self.cn_node.start('123') != 0
+        assert not send_command.called
+
     def test_status(self):
         """Test status method of iotlab control node."""
         with patch('gateway_code.utils.ftdi_check.ftdi_check') as ftdi_check:
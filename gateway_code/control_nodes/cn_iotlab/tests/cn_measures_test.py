@@ -0,0 +1,106 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for cn_measures binary measures decoding """
+
+# pylint: disable=missing-docstring
+
+import os
+import struct
+import unittest
+
+import mock
+
+from .. import cn_measures
+
+# Frame as written by control node serial program
+FRAME = struct.Struct('=BBHIIIdddd')
+
+
+def frame(kind, t_s, t_us, values=(), crc_ok=0):
+    values = tuple(values) + (0.0,) * (4 - len(values))
+    return FRAME.pack(kind, crc_ok, 0, t_s, t_us, 0, *values)
+
+
+class TestMeasuresRecords(unittest.TestCase):
+
+    def test_frame_size(self):
+        self.assertEqual(cn_measures.FRAME_SIZE, FRAME.size)
+
+    def test_decode_consumption(self):
+        data = (frame(cn_measures.CONSUMPTION, 42, 500000, (1.0, 2.0, 3.0)) +
+                frame(cn_measures.CONSUMPTION, 43, 0, (4.0, 5.0, 6.0)))
+        records = cn_measures.MeasuresRecords()
+        self.assertEqual(len(data), records.decode(data))
+
+        conso = records['consumption']
+        self.assertEqual(2, len(conso))
+        self.assertEqual([42.5, 43.0], list(conso.timestamps))
+        self.assertEqual([1.0, 4.0], list(conso['power']))
+        self.assertEqual([2.0, 5.0], list(conso['voltage']))
+        self.assertEqual([3.0, 6.0], list(conso['current']))
+        self.assertEqual(0, len(records['radio']))
+
+    def test_decode_mixed_and_partial(self):
+        data = (frame(cn_measures.RADIO, 1, 0, (11, -91)) +
+                frame(cn_measures.SNIFFER, 2, 0, (26, -40, 255, 42), 1) +
+                frame(cn_measures.RADIO, 3, 0, (12, -60)) +
+                frame(42, 4, 0) +
+                frame(cn_measures.CONSUMPTION, 5, 0)[:10])
+        records = cn_measures.MeasuresRecords()
+        self.assertEqual(4 * FRAME.size, records.decode(data))
+
+        radio = records['radio']
+        self.assertEqual([1.0, 3.0], list(radio.timestamps))
+        self.assertEqual([11, 12], list(radio['channel']))
+        self.assertEqual([-91, -60], list(radio['rssi']))
+
+        sniffer = records['sniffer']
+        self.assertEqual([2.0], list(sniffer.timestamps))
+        self.assertEqual([255], list(sniffer['lqi']))
+        self.assertEqual([42], list(sniffer['length']))
+        self.assertEqual([1], list(records.sniffer_crc_ok))
+        self.assertEqual(0, len(records['consumption']))
+
+        self.assertEqual(0, records.decode(data[:10]))
+
+
+class TestMeasuresReader(unittest.TestCase):
+
+    def test_read_until_eof(self):
+        read_fd, write_fd = os.pipe()
+        handler = mock.Mock()
+        reader = cn_measures.MeasuresReader(read_fd, handler)
+
+        data = b''.join(frame(cn_measures.RADIO, i, 0, (11, -91))
+                        for i in range(10))
+        # split frames between writes
+        os.write(write_fd, data[:100])
+        os.write(write_fd, data[100:])
+        os.close(write_fd)
+        reader.run()
+
+        timestamps = []
+        for call in handler.call_args_list:
+            timestamps.extend(call[0][0]['radio'].timestamps)
+        self.assertEqual([float(i) for i in range(10)], timestamps)
+        self.assertRaises(OSError, os.close, read_fd)
@@ -41,6 +41,63 @@ class TestProtocol(unittest.TestCase):
     def _sender_wrapper(self, command_list):
         return self.sender(command_list)
 
+    def test_send_batch(self):
+        batch_sender = mock.Mock()
+        batch_sender.return_value = [['set_time', 'ACK'],
+                                     ['green_led_on', 'NACK'],
+                                     ['start', 'ACK']]
+        protocol = cn_protocol.Protocol(self.sender, batch_sender)
+
+        ret = protocol.send_batch([
+            (protocol.set_time,),
+            (protocol.set_node_id, 'leonardo-1'),  # no command
+            (protocol.green_led_on,),
+            (protocol.start_stop, 'start', 'dc'),
+        ])
+        self.assertEqual([0, 0, 1, 0], ret)
+        batch_sender.assert_called_once_with([['set_time'], ['green_led_on'],
+                                              ['start', 'dc']])
+        self.assertFalse(self.sender.called)
+
+        # Missing answers
+        batch_sender.return_value = [['set_time', 'ACK'], None]
+        ret = protocol.send_batch([(protocol.set_time,),
+                                   (protocol.green_led_on,)])
+        self.assertEqual([0, 1], ret)
+
+        # Not answered command shifts next answers
+        batch_sender.return_value = [['set_time', 'ACK'], ['start', 'ACK'],
+                                     None]
+        ret = protocol.send_batch([(protocol.set_time,),
+                                   (protocol.green_led_on,),
+                                   (protocol.start_stop, 'start', 'dc')])
+        self.assertEqual([0, 1, 1], ret)
+
+    def test_send_batch_nested(self):
+        batch_sender = mock.Mock()
+        batch_sender.return_value = [['set_time', 'ACK'],
+                                     ['green_led_on', 'NACK']]
+        protocol = cn_protocol.Protocol(self.sender, batch_sender)
+
+        def _nested():
+            return sum(protocol.send_batch([(protocol.green_led_on,)]))
+
+        ret = protocol.send_batch([(protocol.set_time,), (_nested,)])
+        self.assertEqual([0, 1], ret)
+        batch_sender.assert_called_once_with([['set_time'], ['green_led_on']])
+
+        # Not in batch anymore
+        self.sender.return_value = ['set_time', 'ACK']
+        self.assertEqual(0, protocol.set_time())
+
+    def test_send_batch_sequential_sender(self):
+        self.sender.side_effect = [['set_time', 'ACK'],
+                                   ['green_led_on', 'ACK']]
+        ret = self.protocol.send_batch([(self.protocol.set_time,),
+                                        (self.protocol.green_led_on,)])
+        self.assertEqual([0, 0], ret)
+        self.assertEqual(2, self.sender.call_count)
+
     def test_consumption_start(self):
 
         self.sender.return_value = ['config_consumption_measure', 'ACK']
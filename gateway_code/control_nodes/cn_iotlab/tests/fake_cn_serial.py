@@ -0,0 +1,48 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+"""Fake control node serial program, answers commands on stderr.
+
+  * 'silent' commands get no answer
+  * 'sigterm_ignore' makes the program ignore SIGTERM
+"""
+import sys
+import signal
+
+
+def main():  # pragma: no cover
+    """ Answer '<cmd> ACK' to each stdin command """
+    sys.stderr.write('cn_serial_ready\n')
+    sys.stderr.flush()
+    for line in iter(sys.stdin.readline, ''):
+        cmd = line.split()
+        if cmd[0] == 'silent':
+            continue
+        if cmd[0] == 'sigterm_ignore':
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        if cmd[0] == 'measure':
+            sys.stderr.write('measures_debug: radio_measure 1.0 11 -91\n')
+        sys.stderr.write('%s ACK\n' % cmd[0])
+        sys.stderr.flush()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
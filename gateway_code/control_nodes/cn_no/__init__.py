@@ -80,7 +80,7 @@ class ControlNodeNo(ControlNodeBase):
         ret_val += self.configure_profile(None)
         return ret_val
 
-    def autotest_setup(self, measures_handler):
+    def autotest_setup(self, measures_handler, binary_handler=None):
         """Setup for autotests."""
         return 0
 
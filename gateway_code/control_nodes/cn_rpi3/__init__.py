@@ -141,7 +141,7 @@ class ControlNodeRpi3(ControlNodeBase):
             LOGGER.debug("Process stopped: mjpg_streamer, ret: %d", ret_val)
         return ret_val
 
-    def autotest_setup(self, measures_handler):
+    def autotest_setup(self, measures_handler, binary_handler=None):
         """Setup for autotests."""
         return 0
 
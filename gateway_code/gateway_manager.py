@@ -28,13 +28,18 @@ import re
 import time
 import errno
 import shutil
+import functools
 from threading import RLock, Timer
 
 import gateway_code.config as config
 from gateway_code import common
 from gateway_code.common import logger_call, wait_tty, wait_no_tty
 from gateway_code.autotest import autotest
+from gateway_code.autotest import history as autotest_history
 from gateway_code.utils import elftarget
+from gateway_code.utils import metrics
+from gateway_code.utils import serial_capture
+from gateway_code.utils.step_scheduler import StepScheduler
 
 import gateway_code.board_config as board_config
 
@@ -64,10 +69,13 @@ class GatewayManager(object):  # pylint:disable=too-many-instance-attributes
         self.exp_id = None
         self.user = None
         self.exp_files = {}
+        self.exp_start_timings = {}
+        self.exp_start_state = {}  # values shared by exp_start steps
 
         self.experiment_is_running = False
         self.user_log_handler = None
         self.timeout_timer = None
+        self.last_status = None  # (ret, timestamp) of last status check
 
     @logger_call("Gateway Manager : Setup")
     def setup(self):
@@ -117,6 +125,10 @@ class GatewayManager(object):  # pylint:disable=too-many-instance-attributes
         4) Configure Control Node Profile and experiment
         5) Set Experiment expiration timer
 
+        Steps 1) to 4) are run by a `StepScheduler`, independent steps are
+        run concurrently, see `_exp_start_steps`.
+        Their durations are stored in `exp_start_timings`.
+
         """
         if self.experiment_is_running:
             LOGGER.debug('Experiment running. Stop previous experiment')
@@ -132,58 +144,152 @@ class GatewayManager(object):  # pylint:disable=too-many-instance-attributes
             LOGGER.error('Invalid firmware target, aborting experiment.')
             return 1
 
-        ret_val = 0
-
         self.experiment_is_running = True
         self.exp_id = exp_id
         self.user = user
+        self.exp_start_state = {}
 
-        if (self.board_cfg.robot_type == 'turtlebot2' or
-                self.board_cfg.cn_class.TYPE == 'no'):  # pragma: no cover
-            LOGGER.info('Create user exp folder')
-            self._create_user_exp_folders(user, exp_id)
+        steps = self._exp_start_steps(firmware_path, profile)
+        ret_val = steps.run()
+        self.exp_start_timings = dict(steps.timings)
+        LOGGER.debug('Start experiment steps timings: %r',
+                     self.exp_start_timings)
+        for step, duration in self.exp_start_timings.items():
+            metrics.observe('exp_start.%s' % step, duration)
 
-        self.exp_files = self.create_user_exp_files(self.board_cfg.node_id,
-                                                    user, exp_id)
+        if timeout != 0:
+            LOGGER.debug("Setting timeout to: %d", timeout)
+            self.timeout_timer = Timer(timeout, self._timeout_exp_stop,
+                                       args=(exp_id, user))
+            self.timeout_timer.start()
+        LOGGER.info("Start experiment succeeded")
+        return ret_val
 
-        # Create user log
-        self.user_log_handler = gateway_logging.user_logger(
-            self.exp_files['log'])
-        LOGGER.addHandler(self.user_log_handler)
-        LOGGER.info('Start experiment: %s-%i', user, exp_id)
+    def _exp_start_steps(self, firmware_path, profile):
+        """ Experiment start steps and their dependencies
+
+        Experiment files, OML configuration and serial capture are prepared
+        while the control node resets.
+        The open node can only be set up when it is powered, so after the
+        control node start when it handles the open node power.
+        Configuring the experiment on the control node may change the open
+        node power source, so it is done once the open node is set up.
+        """
+        steps = StepScheduler()
+        steps.add('exp_files', self._exp_start_files)
+        steps.add('serial_capture', self._serial_capture_start)
+
+        if hasattr(self.control_node, 'serial_start'):
+            steps.add('control_node_reset', self.control_node.reset)
+            steps.add('oml_config', self._exp_start_oml_config)
+            steps.add('control_node_start', self._exp_start_cn_serial,
+                      requires=('control_node_reset', 'oml_config',
+                                'exp_files'))
+        else:
+            cn_start = functools.partial(self.control_node.start,
+                                         self.exp_id, self.exp_files)
+            steps.add('control_node_start', cn_start,
+                      requires=('exp_files',))
 
-        # Init ControlNode
-        ret_val += self.control_node.start(self.exp_id, self.exp_files)
+        on_requires = ['serial_capture']
+        if 'open_node_power' in self.board_cfg.cn_class.FEATURES:
+            on_requires.append('control_node_start')
 
         # with Pycom boards, trigger 2 power-cycle to ensure REPL is correctly
         # started
         if self.open_node.TYPE == 'pycom':
-            for _ in range(2):
-                LOGGER.debug("Power cycle %s board", self.open_node.TYPE)
-                ret_val += self.control_node.open_stop()
-                ret_val += wait_no_tty(self.open_node.TTY, timeout=10)
-                ret_val += self.control_node.open_start()
-                ret_val += wait_tty(self.open_node.TTY, LOGGER, timeout=10)
+            steps.add('pycom_power_cycle', self._pycom_power_cycle,
+                      requires=('control_node_start',))
+            on_requires.append('pycom_power_cycle')
+
         # Configure Open Node
-        ret_val += self.open_node.setup(firmware_path)
+        steps.add('open_node_setup', functools.partial(
+            self.open_node.setup, firmware_path), requires=on_requires)
+
         # Configure experiment and monitoring on ControlNode
-        ret_val += self.control_node.start_experiment(profile)
+        cn_experiment = functools.partial(self.control_node.start_experiment,
+                                          profile)
+        steps.add('control_node_experiment', cn_experiment,
+                  requires=('control_node_start', 'open_node_setup'))
 
         # nrf52dk and nrf52840dk needs a power cycle before their serial
         # becomes fully usable.
         if (firmware_path is not None and
                 self._board_require_power_cycle(self.open_node.TYPE)):
-            LOGGER.info("Power cycle node %s",
-                        self.control_node.node_id.replace('_', '-'))
+            steps.add('open_node_power_cycle', self._open_node_power_cycle,
+                      requires=('control_node_experiment',))
+        return steps
+
+    def _exp_start_oml_config(self):
+        """ Generate control node OML configuration from exp files paths """
+        exp_files = self.user_exp_files_paths(
+            self.board_cfg.node_id, self.user, self.exp_id)
+        self.exp_start_state['oml_config'] = \
+            self.control_node.oml_xml_config(self.exp_id, exp_files)
+        return 0
+
+    def _exp_start_cn_serial(self):
+        """ Start control node serial interface with OML configuration """
+        return self.control_node.serial_start(
+            self.exp_start_state['oml_config'])
+
+    def _exp_start_files(self):
+        """ Create user experiment files and log """
+        if (self.board_cfg.robot_type == 'turtlebot2' or
+                self.board_cfg.cn_class.TYPE == 'no'):  # pragma: no cover
+            LOGGER.info('Create user exp folder')
+            self._create_user_exp_folders(self.user, self.exp_id)
+
+        # update in place, 'control_node_start' step references it
+        self.exp_files.clear()
+        self.exp_files.update(self.create_user_exp_files(
+            self.board_cfg.node_id, self.user, self.exp_id))
+
+        # Create user log
+        self.user_log_handler = gateway_logging.user_logger(
+            self.exp_files['log'])
+        LOGGER.addHandler(self.user_log_handler)
+        LOGGER.info('Start experiment: %s-%i', self.user, self.exp_id)
+        return 0
+
+    def _serial_capture_start(self):
+        """ Capture open node serial output if enabled and supported """
+        redirection = getattr(self.open_node, 'serial_redirection', None)
+        if hasattr(redirection, 'capture'):
+            redirection.capture = serial_capture.from_config(
+                self.board_cfg.node_id, self.user, self.exp_id)
+        return 0
+
+    def _serial_capture_stop(self):
+        """ Close open node serial capture, merge its last rotated file
+        and remove it if empty """
+        redirection = getattr(self.open_node, 'serial_redirection', None)
+        capture = getattr(redirection, 'capture', None)
+        if capture is None:
+            return
+        redirection.capture = None
+        capture.close()
+        capture.merge_backups()
+        config.clean_user_file(capture.path)
+
+    def _pycom_power_cycle(self):
+        """ Power cycle twice pycom open node """
+        ret_val = 0
+        for _ in range(2):
+            LOGGER.debug("Power cycle %s board", self.open_node.TYPE)
             ret_val += self.control_node.open_stop()
+            ret_val += wait_no_tty(self.open_node.TTY, timeout=10)
             ret_val += self.control_node.open_start()
+            ret_val += wait_tty(self.open_node.TTY, LOGGER, timeout=10)
+        return ret_val
 
-        if timeout != 0:
-            LOGGER.debug("Setting timeout to: %d", timeout)
-            self.timeout_timer = Timer(timeout, self._timeout_exp_stop,
-                                       args=(exp_id, user))
-            self.timeout_timer.start()
-        LOGGER.info("Start experiment succeeded")
+    def _open_node_power_cycle(self):
+        """ Power cycle open node """
+        LOGGER.info("Power cycle node %s",
+                    self.control_node.node_id.replace('_', '-'))
+        ret_val = 0
+        ret_val += self.control_node.open_stop()
+        ret_val += self.control_node.open_start()
         return ret_val
 
     @common.synchronous('rlock')
@@ -241,6 +347,7 @@ class GatewayManager(object):  # pylint:disable=too-many-instance-attributes
         self.control_node.stop()
 
         # Remove empty user experiment files
+        self._serial_capture_stop()
         self.cleanup_user_exp_files(self.exp_files)
         self.exp_files = {}
 
@@ -359,14 +466,29 @@ class GatewayManager(object):  # pylint:disable=too-many-instance-attributes
     def auto_tests(self, channel, blink, flash, gps):
         """ Run Auto-tests on nodes and gateway """
         autotest_manager = autotest.AutoTestManager(self)
-        return autotest_manager.auto_tests(channel, blink, flash, gps)
+        ret_dict = autotest_manager.auto_tests(channel, blink, flash, gps)
+
+        history = autotest_history.from_config()
+        if history is not None:
+            history.append(ret_dict)
+        return ret_dict
 
     @common.synchronous('rlock')
+    def quick_tests(self, budget=autotest.QUICK_BUDGET):
+        """ Run quick health checks on nodes, within `budget` seconds """
+        autotest_manager = autotest.AutoTestManager(self)
+        return autotest_manager.quick_tests(budget)
+
     def status(self):
-        """ Run a node sanity status check """
+        """ Run a node sanity status check
+
+        Nodes only check their devices, so it does not take the lock and
+        can run while other commands are running.
+        Result and its time are kept in `last_status` """
         ret = 0
         ret += self.control_node.status()
         ret += self.open_node.status()
+        self.last_status = (ret, time.time())
         return ret
 
     @common.synchronous('rlock')
@@ -381,15 +503,19 @@ class GatewayManager(object):  # pylint:disable=too-many-instance-attributes
     def create_user_exp_files(node_id, user, exp_id):
         """ Create user experiment files with 0666 permissions """
 
-        exp_dir = config.EXP_FILES_DIR.format(user=user, exp_id=exp_id)
-        exp_files = {}
-
-        for name, exp_file in config.EXP_FILES.items():
-            file_path = os.path.join(exp_dir, exp_file.format(node_id=node_id))
-            exp_files[name] = config.create_user_file(file_path)
-
+        exp_files = GatewayManager.user_exp_files_paths(node_id, user, exp_id)
+        for file_path in exp_files.values():
+            config.create_user_file(file_path)
         return exp_files
 
+    @staticmethod
+    def user_exp_files_paths(node_id, user, exp_id):
+        """ User experiment files paths """
+        exp_dir = config.EXP_FILES_DIR.format(user=user, exp_id=exp_id)
+        return dict((name, os.path.join(exp_dir,
+                                        exp_file.format(node_id=node_id)))
+                    for name, exp_file in config.EXP_FILES.items())
+
     @staticmethod
     def cleanup_user_exp_files(exp_files):
         """ Delete empty user experiment files """
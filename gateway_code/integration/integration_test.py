@@ -44,6 +44,7 @@ from gateway_code.tests.rest_server_test import query_string
 from gateway_code.integration import test_integration_mock
 from gateway_code.autotest import autotest
 from gateway_code.utils.node_connection import OpenNodeConnection
+from gateway_code.utils.measures_buffer import MeasuresBuffer
 from gateway_code.common import wait_cond, abspath, wait_tty, wait_no_tty
 from gateway_code.common import object_attr_has
 
@@ -341,7 +342,12 @@ class TestComplexExperimentRunning(ExperimentRunningMock):
         self._update_profile(None)
         time.sleep(2)
 
-        measures = autotest.extract_measures(self.cn_measures)
+        measures = {
+            'consumption': MeasuresBuffer(('power', 'voltage', 'current')),
+            'radio': MeasuresBuffer(('channel', 'rssi')),
+        }
+        for meas in self.cn_measures:
+            autotest.store_measure(measures, meas)
         self.cn_measures = []
 
         # # # # # # # # # #
@@ -349,22 +355,24 @@ class TestComplexExperimentRunning(ExperimentRunningMock):
         # # # # # # # # # #
 
         # Got consumption and radio
-        self.assertNotEqual([], measures['consumption']['values'])
-        self.assertNotEqual([], measures['radio']['values'])
+        self.assertNotEqual(0, len(measures['consumption']))
+        self.assertNotEqual(0, len(measures['radio']))
 
         # Validate values
-        for values in measures['consumption']['values']:
+        for values in autotest.consumption_values(measures['consumption']):
             # no power, voltage in 3.3V, current not null
             self.assertTrue(math.isnan(values[0]))
             self.assertTrue(2.8 <= values[1] <= 3.5)
             self.assertNotEqual(0.0, values[2])
-        for values in measures['radio']['values']:
+        radio = measures['radio']
+        for values in zip(radio.column('channel'), radio.column('rssi')):
             self.assertIn(values[0], [15, 26])
             self.assertLessEqual(-91, values[1])
 
         # check timestamps are sorted in correct order
         for values in measures.values():
-            timestamps = [t_start] + values['timestamps'] + [time.time()]
+            timestamps = ([t_start] + list(values.timestamps) +
+                          [time.time()])
             _sorted = all([a < b for a, b in zip(timestamps, timestamps[1:])])
             self.assertTrue(_sorted)
 
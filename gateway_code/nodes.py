@@ -23,11 +23,10 @@
 
 """ Common logic for plugin nodes classes """
 import abc
-import os
-import inspect
-import pkgutil
+import importlib
 
 from gateway_code.utils import elftarget
+from gateway_code.utils import verify_cache
 
 
 def with_metaclass(meta, *bases):
@@ -74,8 +73,11 @@ class ControlNodeBase(NodeBase):
         pass  # pragma: no cover
 
     @abc.abstractmethod
-    def autotest_setup(self, measures_handler):
-        """ Setup the control node for the open node autotest """
+    def autotest_setup(self, measures_handler, binary_handler=None):
+        """ Setup the control node for the open node autotest
+
+        Measures are given to `binary_handler` when supported, to
+        `measures_handler` as text otherwise """
         pass  # pragma: no cover
 
     @abc.abstractmethod
@@ -130,51 +132,79 @@ class OpenNodeBase(NodeBase):
         return ret_val
 
 
+# Nodes implementations by TYPE: (module, class name)
+# Modules are only imported when their node class is requested
+OPEN_NODES = {
+    'a8': ('node_a8', 'NodeA8'),
+    'a8_m3': ('node_a8_m3', 'NodeA8M3'),
+    'arduino_zero': ('node_arduino_zero', 'NodeArduinoZero'),
+    'dwm1001': ('node_dwm1001', 'NodeDwm1001'),
+    'firefly': ('node_firefly', 'NodeFirefly'),
+    'fox': ('node_fox', 'NodeFox'),
+    'frdm_kw41z': ('node_frdm_kw41z', 'NodeFrdmKw41z'),
+    'leonardo': ('node_leonardo', 'NodeLeonardo'),
+    'lora_gw': ('node_lora_gateway', 'NodeLoraGateway'),
+    'm3': ('node_m3', 'NodeM3'),
+    'microbit': ('node_microbit', 'NodeMicrobit'),
+    'nrf51dk': ('node_nrf51dk', 'NodeNrf51Dk'),
+    'nrf52832mdk': ('node_nrf52832mdk', 'NodeNrf52832Mdk'),
+    'nrf52840dk': ('node_nrf52840dk', 'NodeNrf52840Dk'),
+    'nrf52840mdk': ('node_nrf52840mdk', 'NodeNrf52840Mdk'),
+    'nrf52dk': ('node_nrf52dk', 'NodeNrf52Dk'),
+    'nucleo_f070rb': ('node_nucleo_f070rb', 'NodeNucleof070RB'),
+    'nucleo_wb55': ('node_nucleo_wb55', 'NodeNucleoWb55'),
+    'phynode': ('node_phynode', 'NodePhynode'),
+    'pycom': ('node_pycom', 'NodePycom'),
+    'rpi3': ('node_rpi3', 'NodeRpi3'),
+    'rtl_sdr': ('node_rtl_sdr', 'NodeRtlSdr'),
+    'samd21': ('node_samd21', 'NodeSamd21'),
+    'samr21': ('node_samr21', 'NodeSamr21'),
+    'samr30': ('node_samr30', 'NodeSamr30'),
+    'samr34': ('node_samr34', 'NodeSamr34'),
+    'st_cell02': ('node_st_cell02', 'NodeStCell02'),
+    'st_iotnode': ('node_st_iotnode', 'NodeStIotnode'),
+    'st_lrwan1': ('node_st_lrwan1', 'NodeStLrwan1'),
+    'zigduino': ('node_zigduino', 'NodeZigduino'),
+}
+
+CONTROL_NODES = {
+    'iotlab': ('cn_iotlab', 'ControlNodeIotlab'),
+    'iotlabm3': ('cn_iotlabm3', 'ControlNodeIotlabm3'),
+    'no': ('cn_no', 'ControlNodeNo'),
+    'rpi3': ('cn_rpi3', 'ControlNodeRpi3'),
+}
+
+# Node classes registered at runtime, take precedence over the index
 REGISTRY = dict()
 
 
-# import all the nodes/plugins
-def import_all_nodes(pkg_dir):
-    """Looks into the given relative path for modules and imports them"""
-    pkg_dir = os.path.join(os.path.dirname(__file__), pkg_dir)
-    for module_loader, name, _ in pkgutil.iter_modules([pkg_dir]):
-        if name in ['tests', 'common']:
-            continue
-        module = module_loader.find_module(name).load_module(name)
-        class_members = inspect.getmembers(module, inspect.isclass)
-        for class_member_tuple in class_members:
-            class_member_name, class_member = class_member_tuple
-            if (not issubclass(
-                    class_member, NodeBase) or
-                    class_member_name.endswith("Base")):
-                continue
-            REGISTRY[class_member.TYPE] = class_member
-
-
-import_all_nodes('open_nodes')
-import_all_nodes('control_nodes')
-
-
-def _node_class(board_type):
-    """Return the open node class implementation for `board_type`.
+def _load_class(node_type, index, package, base_class):
+    """Return `base_class` subclass implementing `node_type`.
 
     :raises ValueError: if board class can't be found """
+    node_class = REGISTRY.get(node_type)
+    if node_class is not None and issubclass(node_class, base_class):
+        return node_class
     try:
-        output_class = REGISTRY[board_type]
-        # Class sanity check
-        assert output_class.TYPE == board_type
+        module_name, class_name = index[node_type]
     except KeyError:
-        raise ValueError('Board %s not implemented' % board_type)
-    else:
-        return output_class
+        raise ValueError('Board %s not implemented' % node_type)
+
+    module = importlib.import_module(
+        'gateway_code.%s.%s' % (package, module_name))
+    output_class = getattr(module, class_name)
+    # Class sanity check
+    assert output_class.TYPE == node_type
+    return output_class
 
 
 def open_node_class(board_type):
     """Return the open node class implementation for `board_type`.
 
     :raises ValueError: if board class can't be found """
-    output_class = _node_class(board_type)
-    if output_class.verify() != 0:
+    output_class = _load_class(board_type, OPEN_NODES, 'open_nodes',
+                               OpenNodeBase)
+    if verify_cache.verify(output_class) != 0:
         raise ValueError('Invalid open node class {}'.format(
             output_class.__name__))
     return output_class
@@ -184,16 +214,22 @@ def control_node_class(cn_type):
     """Return the control node class implementation for `cn_type`.
 
     :raises ValueError: if board class can't be found """
-    return _node_class(cn_type)
+    return _load_class(cn_type, CONTROL_NODES, 'control_nodes',
+                       ControlNodeBase)
+
+
+def _all_types(index, base_class):
+    """Return nodes types in `index` and registered `base_class` ones."""
+    registered = [key for key, value in REGISTRY.items()
+                  if issubclass(value, base_class) and key not in index]
+    return sorted(index) + registered
 
 
 def all_open_nodes_types():
     """Returns all the open nodes classes"""
-    return [key for key in REGISTRY
-            if issubclass(REGISTRY[key], OpenNodeBase)]
+    return _all_types(OPEN_NODES, OpenNodeBase)
 
 
 def all_control_nodes_types():
     """Returns all the control nodes classes"""
-    return [key for key in REGISTRY
-            if issubclass(REGISTRY[key], ControlNodeBase)]
+    return _all_types(CONTROL_NODES, ControlNodeBase)
@@ -40,7 +40,7 @@ class TestNodePycom(unittest.TestCase):
         patch.stopall()
 
     @patch('gateway_code.common.wait_tty')
-    @patch('gateway_code.utils.external_process.ExternalProcess.start')
+    @patch('gateway_code.utils.serial_redirection.SerialRedirection.start')
     def test_setup(self, serial_start, wait, ser):
         """Test pycom node setup."""
         serial_start.return_value = 0
@@ -65,7 +65,7 @@ class TestNodePycom(unittest.TestCase):
         assert self.node.setup() == 3
         assert ser.call_count == 3
 
-    @patch('gateway_code.utils.external_process.ExternalProcess.stop')
+    @patch('gateway_code.utils.serial_redirection.SerialRedirection.stop')
     def test_teardown(self, serial_stop, ser):
         """Test pycom node teardown."""
         serial_stop.return_value = 0
@@ -23,10 +23,16 @@
 
 from __future__ import print_function
 
+import os
+import inspect
+import pkgutil
+import importlib
+
 import pytest
 
 from mock import patch
 
+from gateway_code import nodes
 from gateway_code.nodes import (open_node_class, control_node_class,
                                 all_open_nodes_types, all_control_nodes_types,
                                 OpenNodeBase, ControlNodeBase, REGISTRY)
@@ -40,6 +46,35 @@ def test_node_class():
     assert NodeA8.__name__ == open_node_class('a8').__name__
 
 
+def _implemented_nodes(package, base_class):
+    """Return {TYPE: (module, class name)} of all `package` modules."""
+    pkg_dir = os.path.join(os.path.dirname(nodes.__file__), package)
+    implemented = {}
+    for _, name, _ in pkgutil.iter_modules([pkg_dir]):
+        if name in ['tests', 'common']:
+            continue
+        module = importlib.import_module(
+            'gateway_code.%s.%s' % (package, name))
+        for cls_name, cls in inspect.getmembers(module, inspect.isclass):
+            if (cls.__module__ == module.__name__ and
+                    issubclass(cls, base_class) and
+                    not cls_name.endswith('Base')):
+                implemented[cls.TYPE] = (name, cls_name)
+    return implemented
+
+
+def test_nodes_index():
+    """Test nodes index matches the implemented nodes."""
+    assert nodes.OPEN_NODES == _implemented_nodes('open_nodes',
+                                                  OpenNodeBase)
+    assert nodes.CONTROL_NODES == _implemented_nodes('control_nodes',
+                                                     ControlNodeBase)
+
+    # same TYPE for an open and a control node
+    assert issubclass(open_node_class('rpi3'), OpenNodeBase)
+    assert issubclass(control_node_class('rpi3'), ControlNodeBase)
+
+
 def test_open_node_class_errors():
     """Test error while loading an open node class."""
     # No module
@@ -25,6 +25,7 @@
 REST server listening to the experiment handler
 """
 
+import time
 import argparse
 import json
 import errno
@@ -39,6 +40,12 @@ from bottle import request
 from gateway_code.gateway_manager import GatewayManager
 from gateway_code import board_config
 from gateway_code.common import booleanize
+from gateway_code.autotest import autotest
+from gateway_code.autotest import history as autotest_history
+from gateway_code.utils import metrics
+from gateway_code.utils import jobs
+from gateway_code.utils import firmware_cache
+from gateway_code.utils import firmware_upload
 
 LOGGER = logging.getLogger('gateway_code')
 
@@ -49,12 +56,17 @@ class GatewayRest(bottle.Bottle):
     Gateway Rest class
 
     It calls the `gateway_ manager` to handle commands
+
+    Long running commands are run in a background job when the 'async'
+    query string is set. They return the job description and its state and
+    result are available on '/jobs/<id>'.
     """
 
     def __init__(self, gateway_manager):
         super(GatewayRest, self).__init__()
         self.gateway_manager = gateway_manager
         self.board_config = board_config.BoardConfig()
+        self.jobs = jobs.JobQueue()
         self._app_routing()
 
     def _app_routing(self):
@@ -65,6 +77,10 @@ class GatewayRest(bottle.Bottle):
         self.route('/exp/start/<exp_id:int>/<user>', 'POST', self.exp_start)
         self.route('/exp/stop', 'DELETE', self.exp_stop)
         self.route('/status', 'GET', self.status)
+        self.route('/jobs', 'GET', self.jobs_list)
+        self.route('/jobs/<job_id:int>', 'GET', self.job_get)
+        self.route('/metrics', 'GET', self.metrics)
+        self.route('/metrics/json', 'GET', self.metrics_json)
 
         # Control node functions
         self.route('/exp/update', 'POST', self.exp_update_profile)
@@ -76,6 +92,8 @@ class GatewayRest(bottle.Bottle):
         # query_string: channel=int[11:26]
         self.route('/autotest', 'PUT', self.auto_tests)
         self.route('/autotest/<mode>', 'PUT', self.auto_tests)
+        self.route('/autotest/history', 'GET', self.autotest_history)
+        self.route('/autotest/drift', 'GET', self.autotest_drift)
         # Test function
         self.route('/sleep/<seconds:int>', 'GET', self.sleep)
 
@@ -110,7 +128,11 @@ class GatewayRest(bottle.Bottle):
             timeout = 0
 
         # Extract firmware file
-        firmware_file = self._extract_firmware()
+        try:
+            firmware_file = self._extract_firmware(self._elf_target())
+        except ValueError as err:
+            LOGGER.error('REST: Invalid firmware: %s', err)
+            return {'ret': 1}
         firmware = firmware_file.name if firmware_file else None
 
         # Extract profile to a dict
@@ -120,22 +142,28 @@ class GatewayRest(bottle.Bottle):
             LOGGER.error('REST: Invalid json for profile')
             return {'ret': 1}
 
-        ret = self.gateway_manager.exp_start(user, exp_id, firmware, profile,
-                                             timeout)
+        def _exp_start():
+            ret = self.gateway_manager.exp_start(user, exp_id, firmware,
+                                                 profile, timeout)
+            if ret:  # pragma: no cover
+                LOGGER.error('REST: Start experiment with errors: ret: %d',
+                             ret)
+            return {'ret': ret}
+
         # cleanup of temp file
-        if firmware_file is not None:
-            firmware_file.close()
-        if ret:  # pragma: no cover
-            LOGGER.error('REST: Start experiment with errors: ret: %d', ret)
-        return {'ret': ret}
+        return self._call('exp_start', _exp_start, firmware_file)
 
     def exp_stop(self):
         """ Stop the current experiment """
         LOGGER.debug('REST: Stop experiment')
-        ret = self.gateway_manager.exp_stop()
-        if ret:  # pragma: no cover
-            LOGGER.error('REST: Stop experiment errors: ret: %d', ret)
-        return {'ret': ret}
+
+        def _exp_stop():
+            ret = self.gateway_manager.exp_stop()
+            if ret:  # pragma: no cover
+                LOGGER.error('REST: Stop experiment errors: ret: %d', ret)
+            return {'ret': ret}
+
+        return self._call('exp_stop', _exp_stop)
 
     def exp_update_profile(self):
         """ Update current experiment profile """
@@ -167,9 +195,16 @@ class GatewayRest(bottle.Bottle):
         LOGGER.debug('REST: Profile json dict: %r', profile)
         return profile
 
+    def _elf_target(self):
+        """ Open node firmwares ELF target, None if not checked """
+        return getattr(self.board_config.board_class, 'ELF_TARGET', None)
+
     @staticmethod
-    def _extract_firmware():
-        """ Extract firmware from request files """
+    def _extract_firmware(elf_target=None):
+        """ Extract firmware from request files
+
+        Checks it is an elf file for `elf_target` if given
+        :raises: ValueError on an invalid firmware """
         try:
             # Issues with 'request.files'
             # pylint:disable=unsubscriptable-object
@@ -180,8 +215,15 @@ class GatewayRest(bottle.Bottle):
 
         # save http file to disk
         firmware_file = NamedTemporaryFile(suffix='--' + _firm.filename)
-        firmware_file.write(_firm.file.read())
+        try:
+            sha256 = firmware_upload.save_firmware(_firm.file, firmware_file,
+                                                   elf_target)
+        except ValueError:
+            firmware_file.close()
+            raise
         firmware_file.flush()
+        # flash will not read the file again to compute its digest
+        firmware_cache.register_sha256(firmware_file.name, sha256)
         return firmware_file
 
     # Open node commands
@@ -201,23 +243,28 @@ class GatewayRest(bottle.Bottle):
             offset = 0
         else:
             offset = int(offset_value)
-        firmware_file = self._extract_firmware()
+        try:
+            firmware_file = self._extract_firmware(
+                None if binary else self._elf_target())
+        except ValueError as err:
+            LOGGER.error('REST: Invalid firmware: %s', err)
+            return {'ret': 1, 'error': 'Invalid firmware: %s' % err}
         if firmware_file is None:
             return {'ret': 1, 'error': "Wrong file args: required 'firmware'"}
 
-        ret = self.gateway_manager.node_flash(
-            'open', firmware_file.name, binary, offset
-        )
+        def _flash():
+            return {'ret': self.gateway_manager.node_flash(
+                'open', firmware_file.name, binary, offset
+            )}
 
-        firmware_file.close()
-        return {'ret': ret}
+        return self._call('open_flash', _flash, firmware_file)
 
     # Open node commands
     def open_flash_idle(self):
         """Flash open node."""
         LOGGER.debug('REST: Flash Idle OpenNode')
-        ret = self.gateway_manager.node_flash('open', None)
-        return {'ret': ret}
+        return self._call('open_flash_idle', lambda: {
+            'ret': self.gateway_manager.node_flash('open', None)})
 
     def open_soft_reset(self):
         """ Soft reset open node """
@@ -252,19 +299,24 @@ class GatewayRest(bottle.Bottle):
     def auto_tests(self, mode=None):
         """ Run auto-tests
 
-        :param mode: 'blink'
+        :param mode: 'blink' or 'quick'
          Query string: 'channel' int 11-26
          Query string: 'gps' int 0-1
          Query string: 'flash' int 0-1
+         Query string: 'budget' float, 'quick' mode time budget in seconds
 
         Mode:
          * 'blink': leds keep blinking
+         * 'quick': quick health check, nodes are not flashed, no control
+           node command is sent during an experiment
         """
         LOGGER.debug('REST: Autotests')
 
         # get mode
-        if mode not in ['blink', None]:
+        if mode not in ['blink', 'quick', None]:
             return {'ret': 1, 'success': [], 'errors': ['invalid_mode']}
+        if mode == 'quick':
+            return self._quick_tests()
         blink = (mode == 'blink')
 
         # query optionnal channel
@@ -289,8 +341,56 @@ class GatewayRest(bottle.Bottle):
             return {'ret': 1, 'success': [],
                     'errors': ['invalid_flash_option']}
 
-        ret_dict = self.gateway_manager.auto_tests(channel, blink, flash, gps)
-        return ret_dict
+        return self._call('autotest', functools.partial(
+            self.gateway_manager.auto_tests, channel, blink, flash, gps))
+
+    def _quick_tests(self):
+        """ Run quick health checks """
+        budget_str = request.query.budget  # pylint:disable=no-member
+        try:
+            budget = float(budget_str) if budget_str else autotest.QUICK_BUDGET
+        except ValueError:
+            budget = 0
+        if not budget > 0:  # also rejects 'nan'
+            return {'ret': 1, 'success': [], 'errors': ['invalid_budget']}
+        return self._call('autotest', functools.partial(
+            self.gateway_manager.quick_tests, budget))
+
+    @staticmethod
+    def autotest_history():
+        """ Return the last autotests results, oldest first
+
+        Query string: 'last' int, number of runs, default 10
+        """
+        history = autotest_history.from_config()
+        if history is None:
+            return {'ret': 1, 'error': 'Autotest history disabled'}
+        try:
+            last = int(request.query.last or 10)  # pylint:disable=no-member
+        except ValueError:
+            return {'ret': 1, 'error': 'Invalid last'}
+        return {'ret': 0, 'runs': history.runs(last)}
+
+    @staticmethod
+    def autotest_drift():
+        """ Return checks durations and values drifts and regressions of the
+        last autotest compared to the previous ones
+
+        Query string: 'runs' int, previous runs compared, default 10
+        Query string: 'ratio' float, relative change threshold, default 0.5
+        """
+        history = autotest_history.from_config()
+        if history is None:
+            return {'ret': 1, 'error': 'Autotest history disabled'}
+        query = request.query  # pylint:disable=no-member
+        try:
+            window = int(query.runs or 10)
+            ratio = float(query.ratio or 0.5)
+        except ValueError:
+            return {'ret': 1, 'error': 'Invalid runs or ratio'}
+        ret = history.drift(window, ratio)
+        ret['ret'] = 0
+        return ret
 
     def sleep(self, seconds):
         """Sleep `seconds` seconds."""
@@ -300,10 +400,64 @@ class GatewayRest(bottle.Bottle):
     def status(self):
         """ Return node status
          * Check nodes ftdi
+
+        It does not take the gateway lock. While jobs are queued or running,
+        the last status is returned with its age
         """
         LOGGER.debug('REST: Status')
+        last_status = self.gateway_manager.last_status
+        if last_status is not None and self.jobs.busy():
+            ret, timestamp = last_status
+            return {'ret': ret, 'cached': True,
+                    'age': time.time() - timestamp}
         return {'ret': self.gateway_manager.status()}
 
+    def jobs_list(self):
+        """ Return known jobs, oldest first """
+        return {'jobs': [job.as_dict() for job in self.jobs.jobs()]}
+
+    def job_get(self, job_id):
+        """ Return job `job_id` state and result """
+        job = self.jobs.get(job_id)
+        if job is None:
+            bottle.response.status = 404
+            return {'ret': 1, 'error': 'Unknown job %d' % job_id}
+        return job.as_dict()
+
+    def _call(self, name, func, tmp_file=None):
+        """ Return `func()` result, or run it in a job if 'async' query
+        string is set and return the job description.
+        `tmp_file` is closed after the call """
+        cleanup = tmp_file.close if tmp_file is not None else None
+        try:
+            run_async = booleanize(request.query.get('async') or False)
+        except ValueError:
+            run_async = False
+
+        if not run_async:
+            try:
+                return func()
+            finally:
+                if cleanup is not None:
+                    cleanup()
+
+        job = self.jobs.submit(name, func, cleanup)
+        LOGGER.debug('REST: %s started in job %d', name, job.id)
+        bottle.response.status = 202
+        bottle.response.set_header('Location', '/jobs/%d' % job.id)
+        return {'ret': 0, 'job': job.as_dict()}
+
+    @staticmethod
+    def metrics():
+        """ Return gateway steps durations in Prometheus text format """
+        bottle.response.content_type = 'text/plain; version=0.0.4'
+        return metrics.METRICS.prometheus()
+
+    @staticmethod
+    def metrics_json():
+        """ Return gateway steps durations histograms by step """
+        return metrics.METRICS.as_dict()
+
     def on_conditional_route(self, func, path, *route_args, **route_kwargs):
         """Add route if node implements 'func'."""
         return self._cond_route(self.board_config.board_class, func, path,
@@ -354,6 +508,30 @@ class GatewayRest(bottle.Bottle):
 # Command line functions
 
 
+# Bottle server adapters:
+# * 'paste', 'waitress': threads pool
+# * 'aiohttp': asyncio server, requires 'aiohttp-wsgi'
+# * 'wsgiref': single threaded, for debugging
+SERVERS = ('paste', 'waitress', 'aiohttp', 'wsgiref')
+
+
+def server_options(server, threads):
+    """ Return bottle `server` adapter options for `threads` workers
+
+    >>> server_options('waitress', 4)
+    {'threads': 4}
+    >>> server_options('wsgiref', 4)
+    {}
+    """
+    if server == 'paste':
+        # paste requires spawn_if_under <= workers, default 5
+        return {'use_threadpool': True, 'threadpool_workers': threads,
+                'threadpool_options': {'spawn_if_under': min(5, threads)}}
+    if server == 'waitress':
+        return {'threads': threads}
+    return {}
+
+
 def _parse_arguments(args):
     """
     Parse arguments:
@@ -374,6 +552,13 @@ def _parse_arguments(args):
     parser.add_argument(
         '--reloader', dest='reloader', action='store_true',
         help="Whether to auto-reload the bottle server on source code changes")
+    parser.add_argument(
+        '--server', choices=SERVERS, default='paste',
+        help="HTTP server backend, default %(default)s")
+    parser.add_argument(
+        '--threads', type=int, default=10,
+        help="Number of requests handled concurrently by threaded servers, "
+             "default %(default)s")
 
     arguments = parser.parse_args(args)
 
@@ -390,5 +575,6 @@ def _main(args):
     g_m.setup()
 
     server = GatewayRest(g_m)
-    server.run(host=args.host, port=args.port, server='paste',
-               reloader=args.reloader)
+    server.run(host=args.host, port=args.port, server=args.server,
+               reloader=args.reloader,
+               **server_options(args.server, args.threads))
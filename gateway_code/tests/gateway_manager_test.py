@@ -26,6 +26,8 @@ Complement the 'integration' tests
 """
 
 import os
+import time
+import threading
 
 import unittest
 import mock
@@ -64,10 +66,181 @@ class TestGatewayManager(unittest.TestCase):
         g_m = gateway_manager.GatewayManager()
         self.assertEqual(1, g_m.exp_update_profile(profile_dict={}))
 
+    def test_status_last_status(self):
+        g_m = gateway_manager.GatewayManager()
+        g_m.control_node.status = mock.Mock(return_value=0)
+        g_m.open_node.status = mock.Mock(return_value=1)
+        self.assertIsNone(g_m.last_status)
+
+        self.assertEqual(1, g_m.status())
+        self.assertEqual(1, g_m.last_status[0])
+
+    def test_status_overlap_command(self):
+        """ Commands are not refused while a status check runs """
+        g_m = gateway_manager.GatewayManager()
+        checking, release = threading.Event(), threading.Event()
+
+        def _status():
+            checking.set()
+            release.wait(5)
+            return 0
+        g_m.control_node.status = mock.Mock(side_effect=_status)
+        g_m.open_node.status = mock.Mock(return_value=0)
+
+        status = threading.Thread(target=g_m.status)
+        status.start()
+        try:
+            self.assertTrue(checking.wait(5))
+            self.assertEqual(0, g_m.sleep(0))
+        finally:
+            release.set()
+            status.join()
+        self.assertEqual(0, g_m.last_status[0])
+
+        # And status runs during commands
+        result = []
+        status = threading.Thread(target=lambda: result.append(g_m.status()))
+        with g_m.rlock:
+            status.start()
+            status.join()
+        self.assertEqual([0], result)
+
+    @mock.patch('gateway_code.autotest.autotest.AutoTestManager.auto_tests')
+    @mock.patch('gateway_code.autotest.history.from_config')
+    def test_auto_tests_history(self, from_config, auto_tests):
+        auto_tests.return_value = {'ret': 0, 'success': [], 'error': []}
+        g_m = gateway_manager.GatewayManager()
+
+        from_config.return_value = None
+        self.assertEqual(auto_tests.return_value,
+                         g_m.auto_tests(None, False, False, False))
+
+        from_config.return_value = mock.Mock()
+        g_m.auto_tests(None, False, False, False)
+        from_config.return_value.append.assert_called_with(
+            auto_tests.return_value)
+
+    @mock.patch('gateway_code.autotest.history.from_config')
+    @mock.patch('gateway_code.autotest.autotest.AutoTestManager.quick_tests')
+    def test_quick_tests(self, quick_tests, from_config):
+        quick_tests.return_value = {'ret': 0, 'success': [], 'error': []}
+        g_m = gateway_manager.GatewayManager()
+
+        self.assertEqual(quick_tests.return_value, g_m.quick_tests(0.5))
+        quick_tests.assert_called_with(0.5)
+        # quick checks are not kept with autotests results
+        self.assertFalse(from_config.called)
+
 # # # # # # # # # # # # # # # # # # # # #
 # Measures folder and files management  #
 # # # # # # # # # # # # # # # # # # # # #
 
+    @mock.patch('gateway_code.config.EXP_FILES_DIR', './iotlab/')
+    def test_exp_start_steps(self):
+        """ Run exp_start steps in dependencies order """
+        g_m, calls = self._exp_start_mocks()
+
+        g_m._create_user_exp_folders('user', 123)
+        try:
+            self.assertEqual(0, g_m.exp_start('user', 123))
+            self.assertEqual(['cn_reset', 'cn_serial_start', 'on_setup',
+                              'cn_start_experiment'],
+                             [c[0] for c in calls.mock_calls])
+            self.assertEqual({'exp_files', 'serial_capture',
+                              'control_node_reset', 'oml_config',
+                              'control_node_start', 'open_node_setup',
+                              'control_node_experiment'},
+                             set(g_m.exp_start_timings))
+            # OML configuration uses the experiment files
+            self.assertIn('./iotlab/consumption/m3-00.oml',
+                          calls.cn_serial_start.call_args[0][0])
+            self.assertEqual(0, g_m.exp_stop())
+        finally:
+            g_m._destroy_user_exp_folders('user', 123)
+
+    @staticmethod
+    def _exp_start_mocks():
+        """ GatewayManager with control node and open node calls mocked """
+        g_m = gateway_manager.GatewayManager()
+        calls = mock.Mock()
+        for method in ('reset', 'serial_start', 'start_experiment',
+                       'stop_experiment', 'stop'):
+            setattr(g_m.control_node, method,
+                    getattr(calls, 'cn_' + method))
+            getattr(calls, 'cn_' + method).return_value = 0
+        for method in ('setup', 'teardown'):
+            setattr(g_m.open_node, method, getattr(calls, 'on_' + method))
+            getattr(calls, 'on_' + method).return_value = 0
+        return g_m, calls
+
+    @mock.patch('gateway_code.config.EXP_FILES_DIR', './iotlab/')
+    def test_exp_start_steps_overlap(self):
+        """ Experiment is prepared while the control node resets """
+        g_m, calls = self._exp_start_mocks()
+        calls.cn_reset.side_effect = lambda: time.sleep(0.3) or 0
+        g_m._serial_capture_start = lambda: time.sleep(0.3) or 0
+
+        g_m._create_user_exp_folders('user', 123)
+        try:
+            with mock.patch('gateway_code.utils.elftarget.'
+                            'is_compatible_with_node', return_value=True):
+                t_ref = time.time()
+                self.assertEqual(0, g_m.exp_start('user', 123, 'fw.elf'))
+                self.assertGreater(0.55, time.time() - t_ref)
+                self.assertEqual(0, g_m.exp_stop())
+        finally:
+            g_m._destroy_user_exp_folders('user', 123)
+
+    def test_exp_start_invalid_firmware(self):
+        """ Invalid firmware aborts before the experiment starts """
+        g_m, calls = self._exp_start_mocks()
+        with mock.patch('gateway_code.utils.elftarget.'
+                        'is_compatible_with_node', return_value=False):
+            self.assertEqual(1, g_m.exp_start('user', 123, 'invalid.elf',
+                                              timeout=10))
+        self.assertFalse(g_m.experiment_is_running)
+        self.assertIsNone(g_m.exp_id)
+        self.assertIsNone(g_m.timeout_timer)
+        self.assertEqual([], calls.mock_calls)
+
+    @mock.patch('gateway_code.config.EXP_FILES_DIR', './iotlab/')
+    def test_exp_serial_capture(self):
+        """ Open node serial capture during experiment """
+        patcher = mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+            'm3', serial_capture='on'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        g_m = gateway_manager.GatewayManager()
+        g_m.control_node = mock.Mock()
+        g_m.control_node.configure_mock(**{
+            'reset.return_value': 0, 'serial_start.return_value': 0,
+            'start_experiment.return_value': 0,
+            'stop_experiment.return_value': 0})
+        g_m.open_node.setup = mock.Mock(return_value=0)
+        g_m.open_node.teardown = mock.Mock(return_value=0)
+        redirection = g_m.open_node.serial_redirection
+
+        g_m._create_user_exp_folders('user', 123)
+        try:
+            self.assertEqual(0, g_m.exp_start('user', 123))
+            capture = redirection.capture
+            self.assertEqual('./iotlab/serial/m3-00', capture.path)
+            self.assertTrue(os.path.exists(capture.path))
+            # rotated files
+            with open(capture.path + '.1', 'w') as rotated:
+                rotated.write('1.0;last rotated\n')
+            open(capture.path + '.2', 'w').close()
+
+            # Last rotated file merged, older removed
+            self.assertEqual(0, g_m.exp_stop())
+            self.assertIsNone(redirection.capture)
+            with open(capture.path) as merged:
+                self.assertEqual('1.0;last rotated\n', merged.read())
+            self.assertFalse(os.path.exists(capture.path + '.1'))
+            self.assertFalse(os.path.exists(capture.path + '.2'))
+        finally:
+            g_m._destroy_user_exp_folders('user', 123)
+
     @mock.patch('gateway_code.config.EXP_FILES_DIR', './iotlab/')
     def test_create_and_del_user_exp_files(self):  # pylint:disable=no-self-use
         """ Create files and clean them"""
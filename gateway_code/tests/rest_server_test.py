@@ -33,15 +33,23 @@ Complement the 'integration' tests
 # pylint: disable=no-member
 
 import os
+import time
 import errno
+import hashlib
 import unittest
+import threading
 
 import webtest
 import mock
 
 from gateway_code import rest_server
+from gateway_code import config
+from gateway_code.utils import firmware_cache
 from . import utils
 
+with open(config.static_path('m3_idle.elf'), 'rb') as _idle:
+    FIRMWARE = _idle.read()
+
 
 def query_string(query_str):
     """ Create extra_environ to add query_string to POST/PUT requests
@@ -121,7 +129,7 @@ class TestRestMethods(unittest.TestCase):
         self.g_m.exp_start.return_value = 0
 
         files = []
-        files += [('firmware', 'idle.elf', b'elf32arm0X1234')]
+        files += [('firmware', 'idle.elf', FIRMWARE)]
         files += [('profile', 'profile.json', self.PROFILE_STR.encode())]
 
         ret = self.server.post(self.EXP_START, upload_files=files)
@@ -133,6 +141,29 @@ class TestRestMethods(unittest.TestCase):
         self.assertTrue('idle.elf' in call_args[2])
         self.assertEqual(self.PROFILE_DICT, call_args[3])
 
+    def test_exp_start_invalid_firmware(self):
+        files = [('firmware', 'idle.elf', b'elf32arm0X1234')]
+        ret = self.server.post(self.EXP_START, upload_files=files)
+        self.assertEqual(1, ret.json['ret'])
+
+        with open(config.static_path('leonardo_idle.elf'), 'rb') as elf:
+            files = [('firmware', 'leonardo.elf', elf.read())]
+        ret = self.server.post(self.EXP_START, upload_files=files)
+        self.assertEqual(1, ret.json['ret'])
+        self.assertFalse(self.g_m.exp_start.called)
+
+    def test_exp_start_no_elf_target(self):
+        """ Boards without ELF_TARGET do not check the firmware """
+        self.g_m.exp_start.return_value = 0
+        files = [('firmware', 'firmware.bin', b'not an elf')]
+        for board in ('a8', 'rpi3'):
+            with mock.patch(utils.READ_CONFIG, utils.read_config_mock(board)):
+                server = webtest.TestApp(rest_server.GatewayRest(self.g_m))
+            ret = server.post(self.EXP_START, upload_files=files)
+            self.assertEqual(0, ret.json['ret'])
+            self.assertTrue(self.g_m.exp_start.called)
+            self.g_m.exp_start.reset_mock()
+
     def test_exp_start_invalid_profile(self):
 
         files = [('profile', 'inval_profile.json', b'invalid json profile}')]
@@ -220,14 +251,16 @@ class TestRestMethods(unittest.TestCase):
 
     def test_flash_function(self):
         self.g_m.node_flash.return_value = 0
-        files = [('firmware', 'idle.elf', b'elf32arm0X1234')]
+        files = [('firmware', 'idle.elf', FIRMWARE)]
 
-        # valid command
-        ret = self.server.post('/open/flash', upload_files=files)
+        # valid command, digest computed while uploading
+        with mock.patch.object(firmware_cache, 'register_sha256') as reg:
+            ret = self.server.post('/open/flash', upload_files=files)
         self.assertEqual(0, ret.json['ret'])
         self.g_m.node_flash.assert_called_once()
         args = self.g_m.node_flash.call_args[0]
         assert args[-3].endswith('idle.elf')  # firmware temporary file
+        reg.assert_called_with(args[-3], hashlib.sha256(FIRMWARE).hexdigest())
         assert args[-2] is False  # binary mode
         assert args[-1] == 0  # binary offset
 
@@ -248,6 +281,20 @@ class TestRestMethods(unittest.TestCase):
         ret = self.server.post('/open/flash', upload_files=[])
         self.assertEqual(1, ret.json['ret'])
 
+        # Error invalid elf, accepted as binary
+        self.g_m.node_flash.call_count = 0
+        files = [('firmware', 'idle.bin', b'binary')]
+        ret = self.server.post('/open/flash', upload_files=files)
+        self.assertEqual(1, ret.json['ret'])
+        self.assertIn('Invalid firmware', ret.json['error'])
+        self.assertEqual(0, self.g_m.node_flash.call_count)
+
+        extra = query_string('binary=true')
+        ret = self.server.post('/open/flash', upload_files=files,
+                               extra_environ=extra)
+        self.assertEqual(0, ret.json['ret'])
+        self.assertEqual(1, self.g_m.node_flash.call_count)
+
     def test_flash_idle(self):
         self.g_m.node_flash.return_value = 0
 
@@ -279,6 +326,108 @@ class TestRestMethods(unittest.TestCase):
         ret = self.server.get('/status')
         self.assertEqual(0, ret.json['ret'])
 
+    def test_status_job_running(self):
+        self.g_m.status.return_value = 0
+        event = threading.Event()
+        self.g_m.exp_stop.side_effect = lambda: event.wait(5) and 0
+        job = self.server.delete('/exp/stop',
+                                 extra_environ=query_string('async=1')).json
+
+        try:
+            # No status yet, checked
+            self.g_m.last_status = None
+            ret = self.server.get('/status')
+            self.assertEqual({'ret': 0}, ret.json)
+            self.assertEqual(1, self.g_m.status.call_count)
+
+            # Last status returned
+            self.g_m.last_status = (1, time.time() - 10)
+            ret = self.server.get('/status')
+            self.assertEqual(1, ret.json['ret'])
+            self.assertTrue(ret.json['cached'])
+            self.assertGreaterEqual(ret.json['age'], 10)
+            self.assertEqual(1, self.g_m.status.call_count)
+        finally:
+            event.set()
+        self.assertEqual('done', self._wait_job(job['job']['id'])['state'])
+
+        # Checked again when idle
+        self.assertEqual(0, self.server.get('/status').json['ret'])
+        self.assertEqual(2, self.g_m.status.call_count)
+
+    def _wait_job(self, job_id):
+        job = self.s_r.jobs.get(job_id)
+        self.assertTrue(job.wait(5))
+        return self.server.get('/jobs/%d' % job_id).json
+
+    def test_async_jobs(self):
+        self.g_m.exp_start.return_value = 0
+        files = [('firmware', 'idle.elf', FIRMWARE)]
+
+        extra = query_string('async=1')
+        ret = self.server.post(self.EXP_START, upload_files=files,
+                               extra_environ=extra)
+        self.assertEqual(202, ret.status_int)
+        self.assertEqual(0, ret.json['ret'])
+        job_id = ret.json['job']['id']
+        self.assertEqual('/jobs/%d' % job_id,
+                         ret.headers['Location'].split('localhost')[-1])
+
+        job = self._wait_job(job_id)
+        self.assertEqual('exp_start', job['name'])
+        self.assertEqual('done', job['state'])
+        self.assertEqual({'ret': 0}, job['result'])
+        # firmware still available when the job ran
+        firmware = self.g_m.exp_start.call_args[0][2]
+        self.assertTrue(firmware.endswith('idle.elf'))
+        self.assertFalse(os.path.exists(firmware))
+
+        # Error
+        self.g_m.auto_tests.side_effect = RuntimeError('autotest crash')
+        ret = self.server.put('/autotest', extra_environ=extra)
+        job = self._wait_job(ret.json['job']['id'])
+        self.assertEqual('autotest', job['name'])
+        self.assertEqual('error', job['state'])
+        self.assertEqual('autotest crash', job['error'])
+
+        # Other jobs
+        self.g_m.exp_stop.return_value = 0
+        self.g_m.node_flash.return_value = 0
+        for method, url in (('delete', '/exp/stop'),
+                            ('put', '/open/flash/idle')):
+            ret = getattr(self.server, method)(url, extra_environ=extra)
+            self._wait_job(ret.json['job']['id'])
+        ret = self.server.post('/open/flash', upload_files=files,
+                               extra_environ=extra)
+        self._wait_job(ret.json['job']['id'])
+        self.assertEqual(
+            ['exp_start', 'autotest', 'exp_stop', 'open_flash_idle',
+             'open_flash'],
+            [job['name'] for job in self.server.get('/jobs').json['jobs']])
+
+        # Sync call with invalid 'async' value
+        ret = self.server.delete('/exp/stop',
+                                 extra_environ=query_string('async=maybe'))
+        self.assertEqual({'ret': 0}, ret.json)
+
+        # Unknown job
+        ret = self.server.get('/jobs/1234', status='*')
+        self.assertEqual(404, ret.status_int)
+        self.assertEqual(1, ret.json['ret'])
+
+    @mock.patch('gateway_code.utils.metrics.METRICS',
+                rest_server.metrics.Metrics())
+    def test_metrics(self):
+        rest_server.metrics.METRICS.observe('GatewayManager.exp_start', 2.0)
+
+        ret = self.server.get('/metrics')
+        self.assertTrue(ret.content_type.startswith('text/plain'))
+        self.assertIn('gateway_step_duration_seconds_count'
+                      '{step="GatewayManager.exp_start"} 1', ret.text)
+
+        ret = self.server.get('/metrics/json')
+        self.assertEqual(2.0, ret.json['GatewayManager.exp_start']['sum'])
+
     def test_auto_test(self):
         self.g_m.auto_tests.return_value = {
             'ret': 0, 'error': [], 'success': ['test_ok'],
@@ -314,15 +463,76 @@ class TestRestMethods(unittest.TestCase):
         ret = self.server.put('/autotest', extra_environ=extra)
         self.assertEqual(1, ret.json['ret'])
 
+    def test_autotest_quick(self):
+        self.g_m.quick_tests.return_value = {
+            'ret': 0, 'error': [], 'success': ['quick_budget']}
+
+        ret = self.server.put('/autotest/quick')
+        self.assertEqual(0, ret.json['ret'])
+        self.g_m.quick_tests.assert_called_with(1.0)
+
+        extra = query_string('budget=0.5')
+        ret = self.server.put('/autotest/quick', extra_environ=extra)
+        self.assertEqual(0, ret.json['ret'])
+        self.g_m.quick_tests.assert_called_with(0.5)
+        self.assertFalse(self.g_m.auto_tests.called)
+
+        # invalid budgets
+        for budget in ('abc', '0', '-1', 'nan'):
+            extra = query_string('budget=%s' % budget)
+            ret = self.server.put('/autotest/quick', extra_environ=extra)
+            self.assertEqual(['invalid_budget'], ret.json['errors'])
+        self.assertEqual(2, self.g_m.quick_tests.call_count)
+
+    def test_autotest_history(self):
+        from_config = mock.patch('gateway_code.autotest.history.from_config',
+                                 return_value=None).start()
+        ret = self.server.get('/autotest/history')
+        self.assertEqual(1, ret.json['ret'])
+        ret = self.server.get('/autotest/drift')
+        self.assertEqual(1, ret.json['ret'])
+
+        history = mock.Mock()
+        history.runs.return_value = [{'ret': 0}]
+        history.drift.return_value = {'durations': {}, 'values': {},
+                                      'regressions': ['echo']}
+        from_config.return_value = history
+
+        ret = self.server.get('/autotest/history')
+        self.assertEqual({'ret': 0, 'runs': [{'ret': 0}]}, ret.json)
+        history.runs.assert_called_with(10)
+        self.server.get('/autotest/history', {'last': '3'})
+        history.runs.assert_called_with(3)
+
+        ret = self.server.get('/autotest/drift', {'runs': 5, 'ratio': 0.2})
+        self.assertEqual(0, ret.json['ret'])
+        self.assertEqual(['echo'], ret.json['regressions'])
+        history.drift.assert_called_with(5, 0.2)
+
+        # invalid calls
+        ret = self.server.get('/autotest/history', {'last': 'all'})
+        self.assertEqual(1, ret.json['ret'])
+        ret = self.server.get('/autotest/drift', {'ratio': 'big'})
+        self.assertEqual(1, ret.json['ret'])
+
 
 class TestServerRestMain(unittest.TestCase):
     """ Cover functions uncovered by unit tests """
 
     @mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3'))
     @mock.patch('gateway_code.utils.subprocess_timeout.call')  # CN flash
+    @mock.patch('gateway_code.utils.tty_watcher.wait_tty',
+                mock.Mock(return_value=True))  # CN tty
     @mock.patch('bottle.run')
     def test_main_function(self, run_mock, call_mock):
         call_mock.return_value = 0
         args = ['rest_server.py', 'localhost', '8080']
         rest_server._main(args)
         self.assertTrue(run_mock.called)
+        self.assertEqual('paste', run_mock.call_args[1]['server'])
+        self.assertEqual(10, run_mock.call_args[1]['threadpool_workers'])
+
+        args += ['--server', 'waitress', '--threads', '4']
+        rest_server._main(args)
+        self.assertEqual('waitress', run_mock.call_args[1]['server'])
+        self.assertEqual(4, run_mock.call_args[1]['threads'])
@@ -29,6 +29,7 @@ import tempfile
 from gateway_code import common
 from gateway_code.utils.elftarget import get_elf_load_addr
 from . import subprocess_timeout
+from . import metrics
 
 LOGGER = logging.getLogger('gateway_code')
 
@@ -57,11 +58,13 @@ class CC2538(object):
 
         self.out = None if verb else self.DEVNULL
 
+    @metrics.timed()
     def reset(self):
         """ Reset """
         cmd = self.CC2538BSL.format(port=self.port, cmd=self.RESET)
         return self._call_cmd(cmd)
 
+    @metrics.timed()
     def flash(self, elf_file):
         """ Flash firmware """
         try:
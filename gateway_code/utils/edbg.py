@@ -30,6 +30,7 @@ import tempfile
 
 from gateway_code import common
 from . import subprocess_timeout
+from . import metrics
 
 LOGGER = logging.getLogger('gateway_code')
 
@@ -55,6 +56,7 @@ class Edbg(object):
 
         self.out = None if verb else self.DEVNULL
 
+    @metrics.timed()
     def flash(self, fw_file, binary=False, offset=0):
         """ Flash firmware """
         try:
@@ -23,40 +23,130 @@
 
 from __future__ import print_function
 
+import os
 import sys
+import struct
 import logging
+import threading
+import collections
 
 from elftools.elf.constants import SH_FLAGS
 from elftools.elf.elffile import ELFFile
+from elftools.elf.enums import ENUM_EI_CLASS, ENUM_E_TYPE, ENUM_E_MACHINE
 import elftools.common.exceptions
 
 LOGGER = logging.getLogger('gateway_code')
 
 TYPE_EXECUTABLE = 'ET_EXEC'
 
+ELF_MAGIC = b'\x7fELF'
+# e_ident, e_type and e_machine
+ELF_HEADER_SIZE = 20
+
+# Metadata of an executable elf file
+# exec_addrs: addresses of executable sections, in file order
+# load_size: size of PT_LOAD segments content
+ElfInfo = collections.namedtuple(  # pylint:disable=invalid-name
+    'ElfInfo', ['e_class', 'e_machine', 'e_type', 'entry', 'exec_addrs',
+                'load_size'])
+
+# ElfInfo for (path, size, mtime), firmwares are parsed only once
+_ELF_INFO = collections.OrderedDict()
+_ELF_INFO_MAX = 32
+_ELF_INFO_LOCK = threading.Lock()
+
+
+def _file_key(filepath):
+    stat = os.stat(filepath)
+    return (os.path.abspath(filepath), stat.st_size, stat.st_mtime)
+
+
+def clear_cache():
+    """Forget parsed elf files metadata."""
+    with _ELF_INFO_LOCK:
+        _ELF_INFO.clear()
+
+
+def elf_info(filepath):
+    """Returns `ElfInfo` for executable elf file `filepath`.
+
+    Result is cached until the file size or mtime changes.
+
+    :raises: ValueError if file is not an executable elf file.
+    """
+    key = _file_key(filepath)
+    with _ELF_INFO_LOCK:
+        info = _ELF_INFO.get(key)
+    if info is not None:
+        return info
+
+    info = _parse_elf(filepath)
+    with _ELF_INFO_LOCK:
+        _ELF_INFO[key] = info
+        while len(_ELF_INFO) > _ELF_INFO_MAX:
+            _ELF_INFO.popitem(last=False)
+    return info
+
+
+def _parse_elf(filepath):
+    """Parse elf file metadata, invalid files rejected on their header."""
+    with open(filepath, 'rb') as _file:
+        e_class, e_machine = elf_header_target(_file.read(ELF_HEADER_SIZE))
+        _file.seek(0)
+        try:
+            elffile = ELFFile(_file)
+            exec_addrs = tuple(
+                section['sh_addr'] for section in elffile.iter_sections()
+                if section['sh_flags'] & SH_FLAGS.SHF_EXECINSTR)
+            load_size = sum(
+                segment['p_filesz'] for segment in elffile.iter_segments()
+                if segment['p_type'] == 'PT_LOAD')
+            entry = elffile.header['e_entry']
+        except elftools.common.exceptions.ELFError:
+            raise ValueError('Not a valid elf file')
+
+    return ElfInfo(e_class, e_machine, TYPE_EXECUTABLE, entry, exec_addrs,
+                   load_size)
+
 
 def elf_target(filepath):
     """Returns elf (class, machine) tuple.
 
     :raises: ValueError if file is not an executable elf file.
     """
-    try:
-        with open(filepath, 'rb') as _file:
-            elffile = ELFFile(_file)
-    except elftools.common.exceptions.ELFError:
-        raise ValueError('Not a valid elf file')
+    info = elf_info(filepath)
+    return info.e_class, info.e_machine
+
+
+def _enum_name(enum, value):
+    """Return `enum` name for `value`, `value` if unknown as pyelftools."""
+    for name, enum_value in enum.items():
+        if enum_value == value and not name.startswith('_'):
+            return name
+    return value
 
-    # Type
-    e_type = elffile.header['e_type']
-    # Class
-    e_class = elffile.header['e_ident']['EI_CLASS']
-    # Machine
-    e_machine = elffile.header['e_machine']
 
+def elf_header_target(header):
+    """Returns elf (class, machine) tuple from the first bytes of a file.
+
+    Allows checking a firmware before having received it completely.
+
+    :raises: ValueError if `header` is not an executable elf file header.
+    """
+    if len(header) < ELF_HEADER_SIZE or header[:4] != ELF_MAGIC:
+        raise ValueError('Not a valid elf file')
+    ei_class, ei_data = bytearray(header[4:6])
+    endianness = {1: '<', 2: '>'}.get(ei_data)
+    if endianness is None:
+        raise ValueError('Not a valid elf file')
+    e_type, e_machine = struct.unpack(endianness + 'HH', header[16:20])
+
+    e_type = _enum_name(ENUM_E_TYPE, e_type)
     if e_type != TYPE_EXECUTABLE:
         raise ValueError('Not an executable elf file: %s' % e_type)
 
-    return e_class, e_machine
+    return (_enum_name(ENUM_EI_CLASS, ei_class),
+            _enum_name(ENUM_E_MACHINE, e_machine))
 
 
 def is_compatible_with_node(firmware_path, node_class):
@@ -75,13 +165,8 @@ def is_compatible_with_node(firmware_path, node_class):
 
 def get_elf_load_addr(firmware_path):
     """ Read the load offset for the given elf """
-    with open(firmware_path, 'rb') as firmware_file:
-        elf_file = ELFFile(firmware_file)
-        for section in elf_file.iter_sections():
-            sh_flags = section['sh_flags']
-            if sh_flags & SH_FLAGS.SHF_EXECINSTR:
-                return section['sh_addr']
-    return None
+    exec_addrs = elf_info(firmware_path).exec_addrs
+    return exec_addrs[0] if exec_addrs else None
 
 
 def main():
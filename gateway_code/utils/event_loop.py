@@ -0,0 +1,109 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Shared asyncio event loop running in a background thread
+
+Subsystems implemented with asyncio schedule their coroutines on the same
+loop, and synchronous code waits for their results with `run`.
+
+>>> import asyncio
+>>> run(asyncio.sleep(0, result=42), timeout=5)
+42
+"""
+
+import atexit
+import threading
+import logging
+
+try:
+    import asyncio
+except ImportError:  # pragma: no cover
+    asyncio = None  # python2
+
+LOGGER = logging.getLogger('gateway_code')
+
+
+class EventLoopThread(object):
+    """ asyncio event loop run forever in a daemon thread, started on first
+    use """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def get_loop(self):
+        """ Return the running loop, start it if needed """
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self._run,
+                                               args=(self.loop,))
+                self.thread.daemon = True
+                self.thread.start()
+        return self.loop
+
+    @staticmethod
+    def _run(loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+        loop.close()
+
+    def in_loop(self):
+        """ Return if current thread is the loop thread """
+        return threading.current_thread() is self.thread
+
+    def run(self, coro, timeout=None):
+        """ Run coroutine `coro` in the loop and return its result
+
+        :raises: coroutine exception or concurrent.futures.TimeoutError """
+        if self.in_loop():
+            raise RuntimeError('Blocking call from the event loop thread')
+        future = asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+        return future.result(timeout)
+
+    def stop(self):
+        """ Stop the loop and wait for its thread """
+        with self._lock:
+            loop, thread = self.loop, self.thread
+            self.loop = self.thread = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+
+LOOP = EventLoopThread()
+
+
+def run(coro, timeout=None):
+    """ Run coroutine `coro` in the shared loop and return its result """
+    return LOOP.run(coro, timeout)
+
+
+def get_loop():
+    """ Return the shared event loop """
+    return LOOP.get_loop()
+
+
+# Loop is started on demand, stop it at exit after other atexit handlers
+atexit.register(LOOP.stop)
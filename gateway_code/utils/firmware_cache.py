@@ -0,0 +1,144 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Digest of the firmware last flashed on each node
+
+Allows skipping flashing a firmware already on the node. The cache is
+persisted in GATEWAY_STATE_PATH and shared by all gateway processes.
+
+It is enabled with the 'firmware_cache' gateway config key:
+
+* 'on': trust the cache, only reset the node instead of flashing
+* 'verify': also check the node flash content with 'verify_image'
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import collections
+
+from gateway_code import config
+
+LOGGER = logging.getLogger('gateway_code')
+
+CACHE_FILE = 'firmware_cache.json'
+MODES = ('off', 'on', 'verify')
+
+
+# sha256 of files already read, by (path, size, mtime)
+_KNOWN_SHA256 = collections.OrderedDict()
+_KNOWN_SHA256_MAX = 32
+_KNOWN_SHA256_LOCK = threading.Lock()
+
+
+def _file_key(fw_path):
+    stat = os.stat(fw_path)
+    return (os.path.abspath(fw_path), stat.st_size, stat.st_mtime)
+
+
+def register_sha256(fw_path, sha256):
+    """ Remember `fw_path` content `sha256` hexdigest, computed when the
+    file was written, so `firmware_digest` does not read it again """
+    with _KNOWN_SHA256_LOCK:
+        _KNOWN_SHA256[_file_key(fw_path)] = sha256
+        while len(_KNOWN_SHA256) > _KNOWN_SHA256_MAX:
+            _KNOWN_SHA256.popitem(last=False)
+
+
+def file_sha256(fw_path):
+    """ sha256 hexdigest of `fw_path` content """
+    with _KNOWN_SHA256_LOCK:
+        sha256 = _KNOWN_SHA256.get(_file_key(fw_path))
+    if sha256 is not None:
+        return sha256
+
+    sha = hashlib.sha256()
+    with open(fw_path, 'rb') as fw_file:
+        for chunk in iter(lambda: fw_file.read(65536), b''):
+            sha.update(chunk)
+    register_sha256(fw_path, sha.hexdigest())
+    return sha.hexdigest()
+
+
+def firmware_digest(fw_path, binary=False, offset=0):
+    """ Digest of firmware file content and flash options """
+    return '%s:%s:%d' % (file_sha256(fw_path), 'bin' if binary else 'elf',
+                         offset)
+
+
+class FirmwareCache(object):
+    """ Firmwares digests per node, stored in json file `path` """
+    _lock = threading.Lock()
+
+    def __init__(self, path, verify=False):
+        self.path = path
+        self.verify = verify
+
+    def flashed(self, node):
+        """ Return digest of firmware flashed on `node` or None """
+        return self._load().get(node)
+
+    def update(self, node, digest):
+        """ Set `node` firmware digest, `None` when unknown """
+        with self._lock:
+            entries = self._load()
+            if entries.get(node) == digest:
+                return
+            if digest is None:
+                entries.pop(node, None)
+            else:
+                entries[node] = digest
+            self._save(entries)
+
+    def _load(self):
+        try:
+            with open(self.path) as cache:
+                return json.load(cache)
+        except (IOError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        """ Atomically replace cache file """
+        tmp_path = '%s.%d' % (self.path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(tmp_path, 'w') as cache:
+                json.dump(entries, cache)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as err:
+            LOGGER.warning('Firmware cache write error: %r', err)
+
+
+def from_config():
+    """ Return FirmwareCache configured by 'firmware_cache' config key,
+    `None` when disabled """
+    mode = config.read_config('firmware_cache', 'off')
+    if mode not in MODES:
+        LOGGER.error('Invalid firmware_cache mode %r, disable it', mode)
+        return None
+    if mode == 'off':
+        return None
+    path = os.path.join(config.GATEWAY_STATE_PATH, CACHE_FILE)
+    return FirmwareCache(path, verify=(mode == 'verify'))
@@ -0,0 +1,67 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Save uploaded firmwares
+
+The upload is copied in chunks, its elf header checked on the first bytes
+and its sha256 computed in the same pass.
+"""
+
+import hashlib
+
+from gateway_code.utils import elftarget
+
+CHUNK_SIZE = 64 * 1024
+
+
+def save_firmware(src, dst, elf_target=None, chunk_size=CHUNK_SIZE):
+    """ Copy firmware file object `src` to `dst` and return its sha256
+
+    When `elf_target` (class, machine) is given, the elf header is checked
+    before copying the rest of the file.
+
+    :raises: ValueError on an invalid firmware
+    """
+    sha = hashlib.sha256()
+    header = b'' if elf_target is not None else None
+    for chunk in iter(lambda: src.read(chunk_size), b''):
+        if header is not None:
+            header += chunk[:elftarget.ELF_HEADER_SIZE]
+            if len(header) >= elftarget.ELF_HEADER_SIZE:
+                _check_target(header, elf_target)
+                header = None
+        sha.update(chunk)
+        dst.write(chunk)
+
+    if header is not None:
+        _check_target(header, elf_target)  # too small
+    return sha.hexdigest()
+
+
+def _check_target(header, elf_target):
+    """ Check elf header matches `elf_target`
+
+    :raises: ValueError if not """
+    target = elftarget.elf_header_target(header)
+    if target != tuple(elf_target):
+        raise ValueError('Invalid firmware target %r, expected %r' %
+                         (target, tuple(elf_target)))
@@ -0,0 +1,159 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Long running gateway operations run in background jobs
+
+Jobs are run one at a time, in submission order, by a worker thread. They
+are identified by an integer id and their state can be queried until they
+are removed from the history.
+
+>>> jobs = JobQueue()
+>>> job = jobs.submit('answer', lambda: {'ret': 42})
+>>> job.wait(5)
+True
+>>> jobs.get(job.id).as_dict()['result']
+{'ret': 42}
+"""
+
+import time
+import logging
+import threading
+import itertools
+import collections
+
+from gateway_code.common import queue
+
+LOGGER = logging.getLogger('gateway_code')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+
+
+class Job(object):
+    # pylint:disable=too-many-instance-attributes
+    """ Call to `func`, `cleanup` is always called after it """
+
+    def __init__(self, job_id, name, func, cleanup=None):
+        self.id = job_id  # pylint:disable=invalid-name
+        self.name = name
+        self.func = func
+        self.cleanup = cleanup
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.ended = None
+        self._done = threading.Event()
+
+    def run(self):
+        """ Run job function and store its result or error """
+        self.state = RUNNING
+        self.started = time.time()
+        LOGGER.debug('Job %d %s: start', self.id, self.name)
+        try:
+            self.result = self.func()
+            self.state = DONE
+        except Exception as err:  # pylint:disable=broad-except
+            LOGGER.error('Job %d %s: error %r', self.id, self.name, err)
+            self.error = str(err) or repr(err)
+            self.state = ERROR
+        finally:
+            if self.cleanup is not None:
+                self.cleanup()
+            self.ended = time.time()
+            self._done.set()
+        LOGGER.debug('Job %d %s: %s', self.id, self.name, self.state)
+
+    def wait(self, timeout=None):
+        """ Wait job end, return False on timeout """
+        return self._done.wait(timeout)
+
+    def finished(self):
+        """ Job has run """
+        return self.state in (DONE, ERROR)
+
+    def as_dict(self):
+        """ Job description """
+        end = self.ended or time.time()
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'duration': (end - self.started) if self.started else None,
+        }
+
+
+class JobQueue(object):
+    """ Run submitted jobs in a worker thread, keep `history` finished jobs
+    """
+
+    def __init__(self, history=64):
+        self.history = history
+        self._jobs = collections.OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def submit(self, name, func, cleanup=None):
+        """ Queue `func` call, return its Job """
+        with self._lock:
+            job = Job(next(self._ids), name, func, cleanup)
+            self._jobs[job.id] = job
+            self._prune()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run)
+                self._worker.daemon = True
+                self._worker.start()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        """ Return job `job_id` or None """
+        return self._jobs.get(job_id)
+
+    def busy(self):
+        """ Tell if a job is queued or running """
+        with self._lock:
+            return any(not job.finished() for job in self._jobs.values())
+
+    def jobs(self):
+        """ Known jobs, oldest first """
+        with self._lock:
+            self._prune()
+            return list(self._jobs.values())
+
+    def _prune(self):
+        """ Remove oldest finished jobs over history size """
+        finished = [job.id for job in self._jobs.values() if job.finished()]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            self._queue.get().run()
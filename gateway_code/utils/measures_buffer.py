@@ -0,0 +1,187 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Columnar ring buffer of timestamped measures
+
+Measures are stored in pre-allocated `array` columns, one for timestamps and
+one per value, the oldest samples being overwritten when full.
+Timestamps are expected to be added in non decreasing order, windows are
+found by binary search and aggregates computed on whole column slices.
+
+>>> conso = MeasuresBuffer(('power', 'voltage', 'current'), size=3)
+>>> conso.append(1.0, 0.1, 3.3, 0.03)
+>>> conso.extend([2.0, 3.0, 4.0], [[0.2, 0.3, 0.4], [3.3] * 3, [0.0] * 3])
+>>> len(conso)
+3
+>>> list(conso.timestamps)
+[2.0, 3.0, 4.0]
+>>> round(conso.mean('power', 2.5, 4.0), 2)
+0.35
+>>> conso.max('power', end=3.0)
+0.3
+>>> conso.nearest('power', 2.4)
+0.2
+"""
+
+import array
+
+DEFAULT_SIZE = 65536
+NAN = float('nan')
+
+
+class MeasuresBuffer(object):
+    """ Ring buffer of `size` timestamped samples of `columns` values """
+
+    def __init__(self, columns, size=DEFAULT_SIZE):
+        if size <= 0:
+            raise ValueError('Invalid buffer size %r' % size)
+        self.size = size
+        self.names = tuple(columns)
+        self._timestamps = array.array('d', [0.0]) * size
+        self._columns = dict((name, array.array('d', [0.0]) * size)
+                             for name in self.names)
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def clear(self):
+        """ Remove all samples """
+        self._start = 0
+        self._len = 0
+
+    def append(self, timestamp, *values):
+        """ Add one sample, `values` given in columns order """
+        self.extend([timestamp], [[value] for value in values])
+
+    def extend(self, timestamps, columns):
+        """ Add samples, `columns` are values sequences in columns order """
+        if len(columns) != len(self.names):
+            raise ValueError('Expected %d columns, got %d' %
+                             (len(self.names), len(columns)))
+        num = len(timestamps)
+        skip = max(0, num - self.size)  # only keep the last 'size' ones
+        pos = (self._start + self._len + skip) % self.size
+
+        self._write(self._timestamps, pos, timestamps[skip:])
+        for name, values in zip(self.names, columns):
+            self._write(self._columns[name], pos, values[skip:])
+
+        overflow = max(0, self._len + num - self.size)
+        self._start = (self._start + overflow) % self.size
+        self._len = min(self.size, self._len + num)
+
+    def _write(self, arr, pos, values):
+        """ Write `values` in ring `arr` starting at `pos` """
+        values = array.array('d', values)
+        first = min(len(values), self.size - pos)
+        arr[pos:pos + first] = values[:first]
+        arr[0:len(values) - first] = values[first:]
+
+    def _ordered(self, arr, low=0, high=None):
+        """ Return samples `low` to `high` of `arr` in chronological order """
+        high = self._len if high is None else high
+        low, high = self._start + low, self._start + high
+        if high <= self.size:
+            return arr[low:high]
+        if low >= self.size:
+            return arr[low - self.size:high - self.size]
+        return arr[low:] + arr[:high - self.size]
+
+    @property
+    def timestamps(self):
+        """ Samples timestamps in chronological order """
+        return self._ordered(self._timestamps)
+
+    def _timestamp(self, index):
+        return self._timestamps[(self._start + index) % self.size]
+
+    def _bisect(self, timestamp, right):
+        """ bisect.bisect_left/right on chronological timestamps """
+        low, high = 0, self._len
+        while low < high:
+            mid = (low + high) // 2
+            mid_ts = self._timestamp(mid)
+            if mid_ts < timestamp or (right and mid_ts == timestamp):
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def window(self, start=None, end=None):
+        """ Return (low, high) samples indexes with start <= ts <= end """
+        low = 0 if start is None else self._bisect(start, False)
+        high = self._len if end is None else self._bisect(end, True)
+        return low, max(low, high)
+
+    def column(self, name, start=None, end=None):
+        """ Values of column `name` between `start` and `end` timestamps """
+        return self._ordered(self._columns[name], *self.window(start, end))
+
+    def mean(self, name, start=None, end=None):
+        """ Mean of `name` in window, NaN if empty """
+        values = self.column(name, start, end)
+        return sum(values) / len(values) if values else NAN
+
+    def min(self, name, start=None, end=None):
+        """ Minimum of `name` in window, NaN if empty """
+        values = self.column(name, start, end)
+        return min(values) if values else NAN
+
+    def max(self, name, start=None, end=None):
+        """ Maximum of `name` in window, NaN if empty """
+        values = self.column(name, start, end)
+        return max(values) if values else NAN
+
+    def nearest_index(self, timestamp):
+        """ Chronological index of the sample nearest to `timestamp`
+
+        :raises IndexError: if buffer is empty """
+        if not self._len:
+            raise IndexError('Empty measures buffer')
+        index = self._bisect(timestamp, False)
+        if index == self._len:
+            return index - 1
+        if index and (timestamp - self._timestamp(index - 1) <=
+                      self._timestamp(index) - timestamp):
+            return index - 1
+        return index
+
+    def nearest(self, name, timestamp):
+        """ Value of column `name` for the sample nearest to `timestamp`
+
+        :raises IndexError: if buffer is empty """
+        index = self.nearest_index(timestamp)
+        return self._columns[name][(self._start + index) % self.size]
+
+    def to_numpy(self, start=None, end=None):
+        """ Export window as a dict of numpy arrays, with 'timestamps' """
+        import numpy  # pylint:disable=import-error
+        low, high = self.window(start, end)
+        ret = {'timestamps': numpy.array(
+            self._ordered(self._timestamps, low, high), dtype=numpy.float64)}
+        for name in self.names:
+            ret[name] = numpy.array(self._ordered(self._columns[name],
+                                                  low, high),
+                                    dtype=numpy.float64)
+        return ret
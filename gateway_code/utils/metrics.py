@@ -0,0 +1,195 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Duration histograms of gateway operations
+
+Steps durations are recorded in histograms, with the number of failed
+ones, and exported in Prometheus text format or as a dict.
+
+A step fails when it raises an exception or returns a non zero value.
+
+>>> metrics = Metrics(buckets=(0.1, 1))
+>>> metrics.observe('flash', 0.5)
+>>> metrics.observe('flash', 2, error=True)
+>>> print(metrics.prometheus())  # doctest: +NORMALIZE_WHITESPACE
+# HELP gateway_step_duration_seconds Gateway steps duration in seconds
+# TYPE gateway_step_duration_seconds histogram
+gateway_step_duration_seconds_bucket{step="flash",le="0.1"} 0
+gateway_step_duration_seconds_bucket{step="flash",le="1"} 1
+gateway_step_duration_seconds_bucket{step="flash",le="+Inf"} 2
+gateway_step_duration_seconds_sum{step="flash"} 2.5
+gateway_step_duration_seconds_count{step="flash"} 2
+# HELP gateway_step_errors_total Gateway steps errors
+# TYPE gateway_step_errors_total counter
+gateway_step_errors_total{step="flash"} 1
+"""
+
+import time
+import bisect
+import functools
+import threading
+import contextlib
+
+# seconds, from protocol commands to flash and experiment start
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram(object):
+    """ Durations histogram with upper `buckets` bounds """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, value, error=False):
+        """ Add `value` """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.errors += int(error)
+
+    def cumulative(self):
+        """ Return (upper bound, cumulative count) including '+Inf' """
+        bounds = ['%g' % bound for bound in self.buckets] + ['+Inf']
+        total, ret = 0, []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            ret.append((bound, total))
+        return ret
+
+    def as_dict(self):
+        """ Histogram as a dict """
+        return {'count': self.count, 'sum': self.sum, 'errors': self.errors,
+                'buckets': dict(self.cumulative())}
+
+
+def _label(value):
+    """ Escape Prometheus label value """
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class Metrics(object):
+    """ Steps durations histograms """
+    DURATION = 'gateway_step_duration_seconds'
+    ERRORS = 'gateway_step_errors_total'
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, step, duration, error=False):
+        """ Record `step` `duration` in seconds """
+        with self._lock:
+            try:
+                hist = self.histograms[step]
+            except KeyError:
+                hist = self.histograms[step] = Histogram(self.buckets)
+            hist.observe(duration, error)
+
+    @contextlib.contextmanager
+    def timer(self, step):
+        """ Context manager recording its block duration as `step`.
+        An exception is recorded as an error. """
+        t_start = time.time()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.observe(step, time.time() - t_start, error)
+
+    def timed(self, step=None):
+        """ Decorator recording function calls durations
+
+        :param step: step name, by default 'ClassName.method' for methods
+            or function name """
+        def _wrap(func):
+            @functools.wraps(func)
+            def _wrapped_f(*args, **kwargs):
+                t_start = time.time()
+                ret = 1
+                try:
+                    ret = func(*args, **kwargs)
+                    return ret
+                finally:
+                    error = bool(ret) if isinstance(ret, int) else False
+                    self.observe(step or step_name(func, args),
+                                 time.time() - t_start, error)
+            return _wrapped_f
+        return _wrap
+
+    def reset(self):
+        """ Remove all histograms """
+        with self._lock:
+            self.histograms = {}
+
+    def as_dict(self):
+        """ Histograms by step """
+        with self._lock:
+            return dict((step, hist.as_dict())
+                        for step, hist in self.histograms.items())
+
+    def prometheus(self):
+        """ Histograms in Prometheus text exposition format """
+        with self._lock:
+            steps = sorted(self.histograms.items())
+            lines = [
+                '# HELP %s Gateway steps duration in seconds' % self.DURATION,
+                '# TYPE %s histogram' % self.DURATION]
+            for step, hist in steps:
+                label = 'step="%s"' % _label(step)
+                lines.extend('%s_bucket{%s,le="%s"} %d' %
+                             (self.DURATION, label, bound, count)
+                             for bound, count in hist.cumulative())
+                lines.append('%s_sum{%s} %r' % (self.DURATION, label,
+                                                hist.sum))
+                lines.append('%s_count{%s} %d' % (self.DURATION, label,
+                                                  hist.count))
+
+            lines.extend([
+                '# HELP %s Gateway steps errors' % self.ERRORS,
+                '# TYPE %s counter' % self.ERRORS])
+            lines.extend('%s{step="%s"} %d' % (self.ERRORS, _label(step),
+                                               hist.errors)
+                         for step, hist in steps)
+        return '\n'.join(lines) + '\n'
+
+
+def step_name(func, args):
+    """ Return 'ClassName.method' when called as a method else func name """
+    name = func.__name__
+    if args and getattr(args[0], name, None) is not None:
+        return '%s.%s' % (type(args[0]).__name__, name)
+    return name
+
+
+# Gateway metrics
+METRICS = Metrics()
+observe = METRICS.observe  # pylint:disable=invalid-name
+timer = METRICS.timer  # pylint:disable=invalid-name
+timed = METRICS.timed  # pylint:disable=invalid-name
@@ -27,6 +27,8 @@ Connects to the serial_redirection tcp socket and allow sending commands """
 import time
 import socket
 
+from gateway_code.utils.serial_redirection import RECONNECT_DELAY
+
 import logging
 LOGGER = logging.getLogger('gateway_code')
 
@@ -62,7 +64,7 @@ class OpenNodeConnection(object):
         # Wait redirection restarted
         # Should not wait on start because connection should work instantly
         # As it's the real user use case
-        time.sleep(1.0)
+        time.sleep(RECONNECT_DELAY)
         return 0
 
     @staticmethod
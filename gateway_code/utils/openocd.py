@@ -24,7 +24,9 @@
 """ OpenOCD commands """
 
 import os
+import time
 import shlex
+import socket
 import subprocess
 
 import atexit
@@ -33,13 +35,97 @@ import logging
 from collections import namedtuple
 
 from gateway_code import common
+from gateway_code import config
 from . import subprocess_timeout
+from . import firmware_cache
+from . import metrics
 
 LOGGER = logging.getLogger('gateway_code')
 
 OpenOCDArgs = namedtuple("OpenOCDArgs", ['path', 'config_file', 'opts'])
 
 
+class OpenOCDServer(object):
+    """ Long running openocd, commands are sent on its TCL port
+
+    Command result is the TCL 'catch' value, `0` on success.
+    After a failed start, `start_failed` is set and the server is not used.
+    """
+    HOST = '127.0.0.1'
+    TERMINATOR = b'\x1a'
+    START_TIMEOUT = 10
+    STOP_TIMEOUT = 5
+
+    def __init__(self, popen_args, tcl_port):
+        self.popen_args = popen_args
+        self.tcl_port = tcl_port
+        self.process = None
+        self.sock = None
+        self.start_failed = False
+
+    def running(self):
+        """ Server process is started and still running """
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """ Start openocd and connect to its TCL port
+
+        :raises IOError: if openocd did not start """
+        self.stop()
+        LOGGER.debug('OpenOCD server start on port %d', self.tcl_port)
+        self.process = subprocess_timeout.Popen(**self.popen_args)
+        t_end = time.time() + self.START_TIMEOUT
+        while self.sock is None:
+            try:
+                self.sock = socket.create_connection(
+                    (self.HOST, self.tcl_port), timeout=1)
+            except socket.error:
+                if not self.running() or time.time() > t_end:
+                    self.stop()
+                    self.start_failed = True
+                    raise IOError('OpenOCD server start failed')
+                time.sleep(0.1)
+
+    def call(self, script, timeout):
+        """ Run TCL `script` and return its 'catch' value
+
+        :raises IOError: on connection error or timeout
+        :raises ValueError: on invalid answer """
+        if not self.running():
+            self.start()
+        self.sock.settimeout(timeout)
+        cmd = 'catch {%s}' % script
+        self.sock.sendall(cmd.encode('utf-8') + self.TERMINATOR)
+
+        answer = b''
+        while not answer.endswith(self.TERMINATOR):
+            data = self.sock.recv(4096)
+            if not data:
+                raise IOError('OpenOCD server connection closed')
+            answer += data
+        return int(answer[:-1].decode('utf-8', 'replace').strip())
+
+    def stop(self):
+        """ Stop server process """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if self.process is None:
+            return
+        try:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=self.STOP_TIMEOUT)
+            except subprocess_timeout.TimeoutExpired:
+                LOGGER.warning('OpenOCD server did not stop, kill it')
+                self.process.kill()
+                self.process.wait()
+        except OSError as err:
+            LOGGER.debug('OpenOCD server stop error: %r', err)
+        finally:
+            self.process = None
+
+
 class OpenOCD(object):
     """ Debugger class, implemented as a global variable storage """
     DEVNULL = open(os.devnull, 'w')
@@ -66,20 +152,42 @@ class OpenOCD(object):
                  ' -c "reset run"'
                  ' -c "shutdown"')
 
+    VERIFY = (' -c "reset halt"'
+              ' -c "verify_image {0} {1}"'
+              ' -c "reset run"'
+              ' -c "shutdown"')
+
     DEBUG = ' -c "reset halt"'
     TIMEOUT = 100
 
-    def __init__(self, openocd_args,
-                 verb=False, timeout=TIMEOUT):
+    SERVER = (' -c "bindto 127.0.0.1"'
+              ' -c "tcl_port {tcl_port}"'
+              ' -c "telnet_port disabled"'
+              ' -c "gdb_port {gdb_port}"')
+
+    def __init__(self, openocd_args,  # pylint:disable=too-many-arguments
+                 verb=False, timeout=TIMEOUT, tcl_port=None, gdb_port=None,
+                 fw_cache=None):
         self.openocd_path = openocd_args.path
         self.config = self._config(openocd_args.config_file, openocd_args.opts)
         self.timeout = timeout
+        self.fw_cache = fw_cache
 
         self.out = None if verb else self.DEVNULL
 
         self._debug = None
         atexit.register(self.debug_stop)
 
+        # Optional long running openocd, 'debug' only with a gdb port
+        self.server = None
+        self.server_gdb = gdb_port is not None
+        if tcl_port is not None:
+            server_cmd = self.SERVER.format(tcl_port=tcl_port,
+                                            gdb_port=gdb_port or 'disabled')
+            self.server = OpenOCDServer(self._openocd_args('', server_cmd),
+                                        tcl_port)
+            atexit.register(self.server.stop)
+
     @staticmethod
     def _config(config_file, opts=()):
         """Return config options for `config_file` and `opts`.
@@ -100,26 +208,70 @@ class OpenOCD(object):
         opts = ('-f "%s"' % opt for opt in opts)
         return ' '.join(opts)
 
+    @metrics.timed()
     def reset(self):
         """ Reset """
         return self._call_cmd(self.RESET)
 
+    @metrics.timed()
     def flash(self, fw_file, binary=False, offset=0):
-        """ Flash firmware """
+        """ Flash firmware
+
+        With a firmware cache, if firmware is already on the node, only
+        reset it, or verify and reset in 'verify' mode. """
         try:
             path = common.abspath(fw_file)
+            digest = self._fw_digest(path, binary, offset)
+            if digest is not None and self._fw_flashed(path, digest,
+                                                       binary, offset):
+                LOGGER.info('Firmware already flashed, skip flash')
+                return 0
+
+            self._fw_cache_update(None)
             if binary:
-                return self._call_cmd(self.FLASH_BIN.format(path, hex(offset)))
-            return self._call_cmd(self.FLASH.format(path))
+                ret = self._call_cmd(self.FLASH_BIN.format(path, hex(offset)))
+            else:
+                ret = self._call_cmd(self.FLASH.format(path))
+            self._fw_cache_update(digest if ret == 0 else None)
+            return ret
         except IOError as err:
             LOGGER.error('%s', err)
             return 1
 
+    def _fw_digest(self, path, binary, offset):
+        """ Firmware digest, `None` without cache """
+        if self.fw_cache is None:
+            return None
+        return firmware_cache.firmware_digest(path, binary, offset)
+
+    def _fw_flashed(self, path, digest,  # pylint:disable=too-many-arguments
+                    binary, offset):
+        """ Check if firmware is already flashed, reset the node if so """
+        if self.fw_cache.flashed(self.config) != digest:
+            return False
+        if self.fw_cache.verify:
+            # elf files give their own addresses
+            bin_args = '%s bin' % hex(offset) if binary else ''
+            cmd = self.VERIFY.format(path, bin_args)
+        else:
+            cmd = self.RESET
+        return self._call_cmd(cmd) == 0
+
+    def _fw_cache_update(self, digest):
+        """ Store flashed firmware `digest`, `None` when unknown """
+        if self.fw_cache is not None:
+            self.fw_cache.update(self.config, digest)
+
+    @metrics.timed()
     def debug_start(self):
         """ Start a debugger process """
         LOGGER.debug('Debug start')
         self.debug_stop()  # kill previous process
-        self._debug = subprocess.Popen(**self._openocd_args(self.DEBUG))
+        self._fw_cache_update(None)  # debugger may write flash
+        if self.server_gdb and self._server_call(self.DEBUG) == 0:
+            self._debug = self.server  # gdb served by openocd server
+        else:
+            self._debug = subprocess.Popen(**self._openocd_args(self.DEBUG))
         LOGGER.debug('Debug started')
         return 0
 
@@ -127,7 +279,10 @@ class OpenOCD(object):
         """ Stop the debugger process """
         try:
             LOGGER.debug('Debug stop')
-            self._debug.terminate()
+            if self._debug is not None and self._debug is self.server:
+                LOGGER.debug('Keep openocd server running')
+            else:
+                self._debug.terminate()
         except AttributeError:
             LOGGER.debug('Debug not started.')  # None
         except OSError as err:
@@ -145,6 +300,10 @@ class OpenOCD(object):
             LOGGER.error("OpenOCD is in 'debug' mode, stop it to flash/reset")
             return 1
 
+        ret = self._server_call(command_str)
+        if ret is not None:
+            return ret
+
         kwargs = self._openocd_args(command_str)
         try:
             return subprocess_timeout.call(timeout=self.timeout, **kwargs)
@@ -152,11 +311,48 @@ class OpenOCD(object):
             LOGGER.error("Openocd '%s' timeout: %s", command_str, exc)
             return 1
 
-    def _openocd_args(self, command_str):
-        """ Get subprocess arguments for command_str """
+    def _server_call(self, command_str):
+        """ Run command_str on openocd server.
+
+        Return `None` if there is no server or on error, after stopping the
+        server, so the command can be run by spawning openocd.
+        After a failed server start, openocd is always spawned. """
+        if self.server is None or self.server.start_failed:
+            return None
+        try:
+            return self.server.call(self._tcl_script(command_str),
+                                    self.timeout)
+        except (IOError, OSError, ValueError) as err:
+            LOGGER.warning('OpenOCD server error, spawn openocd: %r', err)
+            self.server.stop()
+            return None
+
+    @staticmethod
+    def _tcl_script(command_str):
+        """ Convert '-c' options of command_str to a TCL script.
+
+        'shutdown' is removed to keep the server running.
+
+        >>> OpenOCD._tcl_script(OpenOCD.RESET)
+        'reset run'
+        >>> OpenOCD._tcl_script(OpenOCD.FLASH.format('/tmp/fw.elf'))
+        ... # doctest: +NORMALIZE_WHITESPACE
+        'reset halt; reset init; flash write_image erase /tmp/fw.elf;
+         verify_image /tmp/fw.elf; reset run'
+        """
+        args = shlex.split(command_str)
+        cmds = [cmd for opt, cmd in zip(args[::2], args[1::2])
+                if opt == '-c' and cmd != 'shutdown']
+        return '; '.join(cmds)
+
+    def _openocd_args(self, command_str, config_opts=''):
+        """ Get subprocess arguments for command_str
+
+        `config_opts` are given before 'init' """
         # Generate full command arguments
         cmd = self.OPENOCD.format(openocd_path=self.openocd_path,
-                                  config=self.config, cmd=command_str)
+                                  config=self.config + config_opts,
+                                  cmd=command_str)
         args = shlex.split(cmd)
         return {'args': args, 'stdout': self.out, 'stderr': self.out}
 
@@ -168,11 +364,22 @@ class OpenOCD(object):
         * nodeclass.OPENOCD_PATH: openocd command full path (optional)
         * nodeclass.OPENOCD_OPTS iterable telling other config options
           (optional) They will be added after configuration file with '-f'
+        * nodeclass.OPENOCD_TCL_PORT: run a long running openocd server
+          on this port for reset/flash, when 'openocd_server' config is 'on'
+          (optional)
+        * nodeclass.OPENOCD_GDB_PORT: server gdb port, allows 'debug' on
+          the server (optional)
         """
         if not hasattr(nodeclass, "OPENOCD_PATH"):
             nodeclass.OPENOCD_PATH = "openocd"
         if not hasattr(nodeclass, "OPENOCD_OPTS"):
             nodeclass.OPENOCD_OPTS = ()
+        if config.read_config('openocd_server', 'off') == 'on':
+            kwargs.setdefault('tcl_port',
+                              getattr(nodeclass, 'OPENOCD_TCL_PORT', None))
+            kwargs.setdefault('gdb_port',
+                              getattr(nodeclass, 'OPENOCD_GDB_PORT', None))
+        kwargs.setdefault('fw_cache', firmware_cache.from_config())
 
         return cls(OpenOCDArgs(nodeclass.OPENOCD_PATH,
                                nodeclass.OPENOCD_CFG_FILE,
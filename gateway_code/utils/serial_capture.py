@@ -0,0 +1,205 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Capture of the open node serial output in the experiment files
+
+Each line is prefixed with the host timestamp when its first byte was
+received: 'timestamp;line'.
+Data goes through a fixed size buffer written when full or every
+FLUSH_PERIOD seconds, and the file is rotated when reaching `max_size`
+so memory and disk usage stay bounded whatever the node output rate.
+At the experiment stop, the most recent rotated file is merged in the
+capture file and older ones are removed, so the user gets at least the last
+`max_size` bytes of output in one file.
+
+It is enabled with the 'serial_capture' gateway config key set to 'on'.
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+
+from gateway_code import config
+
+LOGGER = logging.getLogger('gateway_code')
+
+
+class SerialCapture(object):
+    # pylint:disable=too-many-instance-attributes
+    """ Write serial data to `path` with per-line timestamps
+
+    Keeps `backups` rotated files 'path.1', 'path.2', ...
+    """
+    BUFFER_SIZE = 256 * 1024
+    FLUSH_PERIOD = 1.0
+    FSYNC_PERIOD = 5.0
+    MAX_SIZE = 100 * 1024 * 1024
+    BACKUPS = 2
+
+    def __init__(self, path, max_size=MAX_SIZE, backups=BACKUPS):
+        self.path = path
+        self.max_size = max_size
+        self.backups = backups
+        self._view = memoryview(bytearray(self.BUFFER_SIZE))
+        self._end = 0
+        self._line_start = True
+        self._lock = threading.Lock()
+        self._fd = None
+        self._size = 0
+        self._flush_time = self._fsync_time = time.time()
+        self._open()
+
+    def write(self, data, timestamp=None):
+        """ Add serial `data` received at `timestamp` """
+        timestamp = time.time() if timestamp is None else timestamp
+        data = bytes(data)
+        prefix = ('%.6f;' % timestamp).encode()
+        with self._lock:
+            if self._fd is None:
+                return
+            try:
+                start = 0
+                while start < len(data):
+                    if self._line_start:
+                        self._append(prefix)
+                    end = data.find(b'\n', start) + 1 or len(data)
+                    self._append(data[start:end])
+                    self._line_start = data[end - 1:end] == b'\n'
+                    start = end
+                self._poll(timestamp)
+            except OSError as err:
+                self._error(err)
+
+    def poll(self, now=None):
+        """ Flush and sync file if their period elapsed """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._fd is None:
+                return
+            try:
+                self._poll(now)
+            except OSError as err:
+                self._error(err)
+
+    def close(self):
+        """ Write remaining data and close file """
+        with self._lock:
+            if self._fd is None:
+                return
+            try:
+                self._flush()
+                os.fsync(self._fd)
+            except OSError as err:
+                LOGGER.error('Serial capture %s error: %r', self.path, err)
+            os.close(self._fd)
+            self._fd = None
+
+    def merge_backups(self):
+        """ Prepend last rotated file to the closed capture file and remove
+        older ones """
+        last = '%s.1' % self.path
+        try:
+            if os.path.exists(last):
+                with open(last, 'ab') as merged:
+                    with open(self.path, 'rb') as current:
+                        shutil.copyfileobj(current, merged)
+                os.rename(last, self.path)
+        except (IOError, OSError) as err:
+            LOGGER.error('Serial capture %s merge error: %r', self.path, err)
+        for num in range(2, self.backups + 1):
+            try:
+                os.remove('%s.%d' % (self.path, num))
+            except OSError:
+                pass
+
+    def _error(self, err):
+        """ Stop capture on write error """
+        LOGGER.error('Serial capture %s error, stopping: %r', self.path, err)
+        os.close(self._fd)
+        self._fd = None
+
+    def _poll(self, now):
+        if now - self._flush_time >= self.FLUSH_PERIOD:
+            self._flush()
+            self._flush_time = now
+        if now - self._fsync_time >= self.FSYNC_PERIOD:
+            os.fsync(self._fd)
+            self._fsync_time = now
+
+    def _append(self, chunk):
+        """ Copy chunk in buffer, flush it when full """
+        if self._end + len(chunk) > len(self._view):
+            self._flush()
+        if len(chunk) > len(self._view):
+            self._write(chunk)
+            return
+        self._view[self._end:self._end + len(chunk)] = chunk
+        self._end += len(chunk)
+
+    def _flush(self):
+        if self._end:
+            self._write(self._view[:self._end])
+            self._end = 0
+
+    def _write(self, data):
+        if self._size and self._size + len(data) > self.max_size:
+            self._rotate()
+        written = 0
+        while written < len(data):
+            written += os.write(self._fd, data[written:])
+        self._size += written
+
+    def _open(self):
+        config.create_user_file(self.path, 'a')
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self._size = os.fstat(self._fd).st_size
+
+    def _rotate(self):
+        """ Rename files to 'path.1', 'path.2', ... and open a new one """
+        os.close(self._fd)
+        self._fd = None
+        for num in range(self.backups, 0, -1):
+            src = self.path if num == 1 else '%s.%d' % (self.path, num - 1)
+            if os.path.exists(src):
+                os.rename(src, '%s.%d' % (self.path, num))
+        if not self.backups:
+            os.remove(self.path)
+        self._open()
+
+
+def from_config(node_id, user, exp_id):
+    """ Return SerialCapture for experiment if enabled by 'serial_capture'
+    config key, `None` otherwise """
+    if config.read_config('serial_capture', 'off') != 'on':
+        return None
+    exp_dir = config.EXP_FILES_DIR.format(user=user, exp_id=exp_id)
+    path = os.path.join(exp_dir, config.SERIAL_CAPTURE_FILE.format(
+        node_id=node_id))
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        return SerialCapture(path)
+    except (IOError, OSError) as err:
+        LOGGER.error('Serial capture %s error: %r', path, err)
+        return None
@@ -29,11 +29,78 @@ Author: Gaëtan Harter gaetan.harter@inria.fr
 
 import re
 import time
+import select
 import serial
 
+from gateway_code.utils.serial_redirection import RECONNECT_DELAY
+
+
+def _to_bytes(data):
+    """ Encode text data """
+    return data if isinstance(data, (bytes, bytearray)) else data.encode()
+
+
+def _to_str(data):
+    r""" Decode bytes data to native str
+
+    >>> _to_str(bytearray(b'abc')) == 'abc'
+    True
+    """
+    if str is bytes:  # pragma: no cover
+        return bytes(data)
+    return bytes(data).decode('utf-8', 'replace')
+
+
+def _compile(pattern):
+    r""" Compile str, bytes or compiled regex `pattern` for bytes buffers
+
+    >>> _compile('a.c').pattern == b'a.c'
+    True
+    >>> _compile(re.compile('A', re.I)).search(b'a') is not None
+    True
+    """
+    flags = 0
+    if hasattr(pattern, 'pattern'):
+        flags, pattern = pattern.flags, pattern.pattern
+    if not isinstance(pattern, bytes):
+        pattern = pattern.encode()
+        flags &= ~re.UNICODE
+    return re.compile(pattern, flags)
+
+
+# pattern parts that may match a newline
+_NEWLINE_PARTS = (b'\n', b'\\n', b'\\s', b'\\D', b'\\W', b'[^',
+                  b'\\x0a', b'\\x0A', b'\\012')
+
+
+def _multiline(regexp):
+    r""" Tell if `regexp` may match a newline
+
+    Conservative, any newline, class matching newline or re.DOTALL flag
+    makes it multiline.
+
+    >>> _multiline(_compile('abc')), _multiline(_compile(r'a\S+\w'))
+    (False, False)
+    >>> _multiline(_compile(r'abc\ndef')), _multiline(_compile('a\nb'))
+    (True, True)
+    >>> _multiline(_compile(r'login:\s+')), _multiline(_compile('a[^#]*#'))
+    (True, True)
+    >>> _multiline(_compile(re.compile('a.*b', re.DOTALL)))
+    True
+    """
+    if regexp.flags & re.DOTALL:
+        return True
+    return any(part in regexp.pattern for part in _NEWLINE_PARTS)
+
 
 class SerialExpect(object):
-    """ Simple Expect implementation for serial """
+    """ Simple Expect implementation for serial
+
+    Received data is kept in a bytearray. For patterns without newline,
+    only the last line is kept and searched again on new data.
+    Patterns with newlines are searched in the last MAX_BUFFER bytes.
+    """
+    MAX_BUFFER = 64 * 1024
 
     def __init__(self, tty, baudrate, logger=None):
         self.fd = serial.Serial(tty, baudrate,  # pylint:disable=invalid-name
@@ -58,65 +125,65 @@ class SerialExpect(object):
         return self.expect(pattern, timeout)
 
     def expect(self, pattern, timeout=float('+inf')):
-        """ expect pattern
+        """ expect pattern, a string or a compiled regular expression
         return matching string on match
-        return '' on timeout
-        It cannot match multiline pattern correctly """
-
-        if '\n' in pattern:
-            raise ValueError("Does not handle multiline patterns with '\\n'")
-
+        return '' on timeout """
+        regexp = _compile(pattern)
+        multiline = _multiline(regexp)
         end_time = time.time() + timeout
 
-        buff = ''
-        print_buff = ''
-        regexp = re.compile(pattern)
+        buff = bytearray()
+        log_line = bytearray()
         while True:
-            # get new data
-            try:
-                read_bytes = self.fd.read(size=16)  # timeout 0.1
-            except (serial.SerialException, AttributeError):
-                break
-
-            if end_time <= time.time():
-                # last read_bytes may not be printed but don't care
-                break  # timeout
-
-            # no data, continue
-            if not read_bytes:
+            data = self._read(end_time - time.time())
+            if data is None:
+                break  # timeout or closed
+            if not data:
                 continue
 
-            # add new bytes to remaining of last line
-            # no multiline patterns
-            buff = buff.split('\n')[-1] + read_bytes
+            # search only from the line where new data starts
+            if not multiline:
+                del buff[:buff.rfind(b'\n') + 1]
+            buff += data
+            del buff[:-self.MAX_BUFFER]
 
-            # print each line with timestamp on front
             if self.logger is not None:
-                print_buff += read_bytes
-                lines = print_buff.splitlines()
-
-                # keep last line in buffer if not newline terminated
-                if print_buff[-1] not in '\r\n':
-                    print_buff = lines.pop(-1)
-                else:
-                    print_buff = ''
-
-                # print all lines
-                for line in lines:
-                    line = line.strip()
-                    if line:
-                        self.logger.debug(line)
+                self._log_lines(log_line, data)
 
             match = regexp.search(buff)
             if match:
                 # print last lines in case
-                if self.logger is not None:
-                    self.logger.debug(print_buff)
-                return match.group(0)
-
-            # continue
+                if self.logger is not None and log_line.strip():
+                    self.logger.debug(_to_str(log_line.strip()))
+                return _to_str(match.group(0))
         return ''
 
+    def _read(self, timeout):
+        """ Read available data, waiting at most `timeout`
+        Return None on timeout or error """
+        if timeout <= 0:
+            return None
+        try:
+            wait = None if timeout == float('+inf') else timeout
+            select.select([self.fd], [], [], wait)
+            return _to_bytes(self._read_available())
+        except (serial.SerialException, AttributeError, ValueError,
+                select.error):
+            return None
+
+    def _read_available(self):
+        """ Read data pending on the tty """
+        return self.fd.read(max(1, self.fd.in_waiting))
+
+    def _log_lines(self, log_line, data):
+        """ Print each complete line, keep last one in `log_line` """
+        lines = data.split(b'\n')
+        log_line += lines[0]
+        for line in lines[1:]:
+            line, log_line[:] = log_line.strip(), line
+            if line:
+                self.logger.debug(_to_str(line))
+
     def __enter__(self):
         return self
 
@@ -125,15 +192,23 @@ class SerialExpect(object):
 
 
 class SerialExpectForSocket(SerialExpect):
-    """ Simple Expect implementation for tcp connection adapter """
+    """ Simple Expect implementation for tcp connection adapter
+
+    The socket is non-blocking, reads get at most READ_SIZE pending bytes.
+    """
+    READ_SIZE = 4096
 
     # Just a hack to use the same class without changing init
     def __init__(self,  # pylint:disable=super-init-not-called
                  host='localhost', port=20000, logger=None):
         url = 'socket://{host}:{port}'.format(host=host, port=port)
-        self.fd = self.try_connect(url, timeout=0.1)
+        self.fd = self.try_connect(url, timeout=0)
         self.logger = logger
 
+    def _read_available(self):
+        """ Read pending socket data, socket 'in_waiting' is only 0 or 1 """
+        return self.fd.read(self.READ_SIZE)
+
     @staticmethod
     def try_connect(url, tries=10, step=0.5, *args, **kwargs):
         """ Try connecting 'tries' time to url tuple
@@ -156,4 +231,5 @@ class SerialExpectForSocket(SerialExpect):
     def close(self):
         """ Close connection and wait until it's restartable """
         super(SerialExpectForSocket, self).close()
-        time.sleep(1)  # Wait SerialRedirection restarts and can be reconnected
+        # Wait SerialRedirection restarts and can be reconnected
+        time.sleep(RECONNECT_DELAY)
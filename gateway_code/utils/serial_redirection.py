@@ -22,17 +22,31 @@
 
 """ Module managing the open node serial redirection """
 
+import os
 import os.path
+import time
+import fcntl
 import shlex
+import socket
+import threading
+import atexit
 
 import logging
 
+import serial
+
+from gateway_code import config
 from .external_process import ExternalProcess
 
+try:
+    import selectors
+except ImportError:  # pragma: no cover
+    selectors = None  # python2, use socat
+
 LOGGER = logging.getLogger('gateway_code')
 
 
-class SerialRedirection(ExternalProcess):
+class SocatSerialRedirection(ExternalProcess):
     """ Class providing node serial redirection to a tcp socket
 
     It's implemented as a stoppable thread running socat in a loop.
@@ -44,6 +58,8 @@ class SerialRedirection(ExternalProcess):
              ' TCP4-LISTEN:20000,reuseaddr'
              ' open:{tty},b{baud},{serial_opts}')
     NAME = "serial redirection"
+    # socat restarts after a client disconnects
+    RECONNECT_DELAY = 1.0
 
     def __init__(self, tty, baudrate, serial_opts=('echo=0', 'raw')):
         self.tty = tty
@@ -51,7 +67,7 @@ class SerialRedirection(ExternalProcess):
             self.SOCAT.format(tty=tty, baud=baudrate,
                               serial_opts=','.join(serial_opts)))
 
-        super(SerialRedirection, self).__init__()
+        super(SocatSerialRedirection, self).__init__()
 
     def check_error(self, retcode):
         """Check the return code on exit and print a warning on error."""
@@ -59,3 +75,381 @@ class SerialRedirection(ExternalProcess):
             if not os.path.exists(self.tty):
                 LOGGER.warning('%s: %s not found', self.NAME, self.tty)
         return retcode
+
+
+class _Buffer(object):
+    """ Preallocated buffer, filled by reads and drained by writes """
+
+    def __init__(self, size):
+        self.view = memoryview(bytearray(size))
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def free(self):
+        """ Size that can still be pushed """
+        return len(self.view) - len(self)
+
+    def clear(self):
+        """ Drop buffer content """
+        self.start = self.end = 0
+
+    def fill(self, read_into):
+        """ Fill empty buffer with `read_into(view)`, return read size """
+        self.start, self.end = 0, read_into(self.view)
+        return self.end
+
+    def push(self, data):
+        """ Copy data at the end of buffer, return the copied size """
+        if self.start and self.end + len(data) > len(self.view):
+            size = len(self)
+            self.view[:size] = self.view[self.start:self.end].tobytes()
+            self.start, self.end = 0, size
+        size = min(len(data), len(self.view) - self.end)
+        self.view[self.end:self.end + size] = data[:size]
+        self.end += size
+        return size
+
+    def drain(self, write):
+        """ Write pending data with `write(view)` """
+        self.start += write(self.view[self.start:self.end])
+        if self.start == self.end:
+            self.clear()
+
+
+class _Client(object):  # pylint:disable=too-few-public-methods
+    """ Connected client and the tty data waiting to be sent to it """
+
+    def __init__(self, sock, address, size):
+        self.sock = sock
+        self.address = address
+        self.out = _Buffer(size)
+        self.dropped = 0
+        self.callback = None
+
+
+def _crnl_to_tty(data):
+    r""" Convert NL to CRNL for tty, as socat 'crnl' option
+
+    >>> _crnl_to_tty(b'a\nb\r\n') == b'a\r\nb\r\r\n'
+    True
+    """
+    return data.replace(b'\n', b'\r\n')
+
+
+def _crnl_from_tty(data):
+    r""" Convert CRNL to NL from tty, as socat 'crnl' option
+
+    >>> _crnl_from_tty(b'a\r\nb\r') == b'a\nb\r'
+    True
+    """
+    return data.replace(b'\r\n', b'\n')
+
+
+def _max_clients():
+    """ Number of clients allowed by 'serial_redirection_clients' config """
+    value = config.read_config('serial_redirection_clients', '1')
+    try:
+        return max(1, int(value))
+    except ValueError:
+        LOGGER.error('Invalid serial_redirection_clients %r, use 1', value)
+        return 1
+
+
+class NativeSerialRedirection(object):
+    # pylint:disable=too-many-instance-attributes
+    """ Node serial redirection to a tcp socket, without external process
+
+    By default, same behaviour as the socat redirection, one client at a
+    time, but the tty stays open between clients and the port is listening
+    again as soon as the client disconnection is handled, clients should
+    wait `RECONNECT_DELAY` before reconnecting. Data received on the tty
+    without client is dropped.
+
+    With `max_clients` > 1, tty output is sent to all clients. Only the
+    oldest client writes to the tty, data from others is dropped. When it
+    disconnects the next oldest one becomes the writer.
+    The writer never loses data, reading the tty pauses while it is not
+    ready. Other clients have a bounded buffer and when it is full, new
+    data for them is dropped so they cannot slow down the writer.
+
+    Data is moved through preallocated buffers.
+
+    All tty output is also written to `capture` when set.
+
+    serial_opts: 'echo=0' and 'raw' are always set, 'crnl' converts line
+    endings like socat.
+    """
+    NAME = "serial redirection"
+    HOST = '0.0.0.0'
+    PORT = 20000
+    BUFFER_SIZE = 4096
+    CLIENT_BUFFER_SIZE = 16 * BUFFER_SIZE
+    RETRY_PERIOD = 0.5
+    # time for the redirection to see the previous client disconnect
+    RECONNECT_DELAY = 0.1
+
+    def __init__(self, tty, baudrate, serial_opts=('echo=0', 'raw'),
+                 port=PORT, max_clients=None):
+        # pylint:disable=too-many-arguments
+        self.tty = tty
+        self.baudrate = baudrate
+        self.port = port
+        self.max_clients = max_clients or _max_clients()
+        self.crnl = 'crnl' in serial_opts
+        unknown = set(serial_opts) - set(('echo=0', 'raw', 'crnl'))
+        if unknown:
+            LOGGER.warning('%s: ignored options %r', self.NAME, unknown)
+
+        self.thread = None
+        self.listener = None
+        self.clients = []
+        self.serial = None
+        self.capture = None  # SerialCapture like object, kept across restarts
+        self._run = False
+        self._selector = None
+        self._wakeup = None
+        self._from_tty = memoryview(bytearray(self.BUFFER_SIZE))
+        self._to_tty = _Buffer(self.BUFFER_SIZE)
+        self._pending = b''  # 'crnl' converted data not written to tty
+        self._tty_retry = 0
+
+        atexit.register(self.stop)  # cleanup in case of error
+
+    @property
+    def writer(self):
+        """ Client allowed to write to the tty """
+        return self.clients[0] if self.clients else None
+
+    def start(self):
+        """ Start listening and the redirection thread """
+        LOGGER.debug('%s start', self.NAME)
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = socket.socketpair()
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+        if not self._listen():
+            self._close_all()
+            return 1
+        self._tty_open()
+
+        self._run = True
+        self.thread = threading.Thread(target=self._loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return 0
+
+    def stop(self):
+        """ Stop the redirection thread and close everything """
+        LOGGER.debug('%s stop', self.NAME)
+        self._run = False
+        if self.thread is not None:
+            self._wakeup[1].send(b'\0')
+            self.thread.join()
+            self.thread = None
+        self._close_all()
+        LOGGER.debug('%s stopped', self.NAME)
+        return 0
+
+    def _close_all(self):
+        for client in list(self.clients):
+            self._client_close(client)
+        self._tty_close()
+        self._listener_close()
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        if self._wakeup is not None:
+            for sock in self._wakeup:
+                sock.close()
+            self._wakeup = None
+
+    # Loop
+
+    def _loop(self):
+        """ Redirection loop, handles sockets and tty events """
+        while self._run:
+            if self.serial is None and time.time() > self._tty_retry:
+                self._tty_open()
+            if self.listener is None and len(self.clients) < self.max_clients:
+                self._listen()
+            self._update_events()
+            for key, events in self._selector.select(self.RETRY_PERIOD):
+                if key.data is not None:
+                    key.data(events)
+            if self.capture is not None:
+                self.capture.poll()
+
+    def _update_events(self):
+        """ Register files for the events they are waiting for """
+        wanted = {}
+        read, write = selectors.EVENT_READ, selectors.EVENT_WRITE
+        to_tty = bool(self._to_tty or self._pending)
+        if self.listener is not None:
+            wanted[self.listener] = (read, self._on_listener)
+        for client in self.clients:
+            # writer reads only when previous data was written to tty
+            reading = client is not self.writer or not to_tty
+            wanted[client.sock] = ((write if client.out else 0) |
+                                   (read if reading else 0),
+                                   client.callback)
+        if self.serial is not None:
+            # reading tty must never drop writer data
+            writer = self.writer
+            reading = writer is None or writer.out.free() >= self.BUFFER_SIZE
+            wanted[self.serial] = ((write if to_tty else 0) |
+                                   (read if reading else 0),
+                                   self._on_tty)
+
+        registered = self._selector.get_map()
+        for fileobj in [key.fileobj for key in registered.values()]:
+            if fileobj is not self._wakeup[0] and fileobj not in wanted:
+                self._selector.unregister(fileobj)
+        for fileobj, (events, callback) in wanted.items():
+            if not events:
+                if fileobj in registered:
+                    self._selector.unregister(fileobj)
+            elif fileobj in registered:
+                self._selector.modify(fileobj, events, callback)
+            else:
+                self._selector.register(fileobj, events, callback)
+
+    # Listener
+
+    def _listen(self):
+        """ Open listening socket, return False on error """
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((self.HOST, self.port))
+            sock.listen(self.max_clients)
+            sock.setblocking(False)
+        except socket.error as err:
+            sock.close()
+            LOGGER.error('%s: listen error %r', self.NAME, err)
+            return False
+        self.listener = sock
+        return True
+
+    def _listener_close(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+    def _on_listener(self, _events):
+        try:
+            sock, address = self.listener.accept()
+        except socket.error:  # pragma: no cover
+            return
+        LOGGER.debug('%s: client %r connected', self.NAME, address)
+        sock.setblocking(False)
+        client = _Client(sock, address, self.CLIENT_BUFFER_SIZE)
+        client.callback = lambda events: self._on_client(client, events)
+        self.clients.append(client)
+        if len(self.clients) >= self.max_clients:
+            # refuse other clients like socat
+            self._listener_close()
+
+    # Clients
+
+    def _client_close(self, client):
+        LOGGER.debug('%s: client %r disconnected', self.NAME, client.address)
+        if client.dropped:
+            LOGGER.warning('%s: client %r was too slow, %d bytes dropped',
+                           self.NAME, client.address, client.dropped)
+        if client is self.writer:
+            self._to_tty.clear()
+            self._pending = b''
+        self.clients.remove(client)
+        client.sock.close()
+        if self.listener is None and self._run:
+            self._listen()  # accept a new client as soon as possible
+
+    def _on_client(self, client, events):
+        try:
+            if events & selectors.EVENT_WRITE:
+                client.out.drain(client.sock.send)
+            if events & selectors.EVENT_READ:
+                self._client_read(client)
+        except socket.error as err:
+            LOGGER.debug('%s: client error %r', self.NAME, err)
+            self._client_close(client)
+
+    def _client_read(self, client):
+        if client is not self.writer:
+            # only detect disconnection
+            if not client.sock.recv_into(self._from_tty):
+                self._client_close(client)
+        elif not self._to_tty.fill(client.sock.recv_into):
+            self._client_close(client)  # EOF
+        elif self.crnl:
+            self._pending = _crnl_to_tty(
+                self._to_tty.view[:self._to_tty.end].tobytes())
+            self._to_tty.clear()
+
+    # TTY
+
+    def _tty_open(self):
+        """ Open tty in raw mode, retry later on error """
+        try:
+            self.serial = serial.Serial(self.tty, self.baudrate)
+            fd_num = self.serial.fileno()
+            flags = fcntl.fcntl(fd_num, fcntl.F_GETFL)
+            fcntl.fcntl(fd_num, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        except (OSError, serial.SerialException) as err:
+            LOGGER.warning('%s: %s open error %r', self.NAME, self.tty, err)
+            self._tty_close()
+            self._tty_retry = time.time() + self.RETRY_PERIOD
+
+    def _tty_close(self):
+        if self.serial is not None:
+            self.serial.close()
+            self.serial = None
+
+    def _tty_write(self, data):
+        return os.write(self.serial.fileno(), data)
+
+    def _on_tty(self, events):
+        try:
+            if events & selectors.EVENT_WRITE:
+                if self._pending:
+                    written = self._tty_write(self._pending)
+                    self._pending = self._pending[written:]
+                else:
+                    self._to_tty.drain(self._tty_write)
+            if events & selectors.EVENT_READ:
+                self._tty_read()
+        except OSError as err:
+            LOGGER.warning('%s: %s error %r', self.NAME, self.tty, err)
+            # as socat, disconnect clients when tty fails
+            for client in list(self.clients):
+                self._client_close(client)
+            self._tty_close()
+            self._tty_retry = time.time() + self.RETRY_PERIOD
+
+    def _tty_read(self):
+        """ Read tty and copy data to all clients buffers """
+        size = os.readv(self.serial.fileno(), [self._from_tty])
+        if not size:
+            raise OSError('%s closed' % self.tty)
+        data = self._from_tty[:size]
+        if self.crnl:
+            data = _crnl_from_tty(data.tobytes())
+        if self.capture is not None:
+            self.capture.write(data)
+        for client in self.clients:
+            dropped = len(data) - client.out.push(data)
+            if dropped and not client.dropped:
+                LOGGER.warning('%s: client %r too slow, dropping data',
+                               self.NAME, client.address)
+            client.dropped += dropped
+
+
+if selectors is not None:
+    SerialRedirection = NativeSerialRedirection  # pylint:disable=invalid-name
+else:  # pragma: no cover
+    SerialRedirection = SocatSerialRedirection  # pylint:disable=invalid-name
+
+# Time to wait after a client disconnection before reconnecting
+RECONNECT_DELAY = SerialRedirection.RECONNECT_DELAY
@@ -0,0 +1,165 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Dependency aware steps scheduler
+
+Run a set of named steps, each one starting as soon as the steps it requires
+are finished. Independent steps are run concurrently in threads.
+
+Steps may also declare `resources` they need exclusive access to, like a
+serial link. Steps sharing a resource are not run concurrently and start in
+their declaration order.
+
+Steps follow the gateway_code convention of returning `0` on success and a
+positive value on error. Errors do not stop the execution, the sum of all the
+steps return values is returned, as done when chaining `ret_val += step()`.
+
+>>> sched = StepScheduler()
+>>> sched.add('a', lambda: 0)
+>>> sched.add('b', lambda: 1, requires=('a',))
+>>> sched.add('c', lambda: 0, requires=('a',))
+>>> sched.run()
+1
+>>> sorted(sched.timings.keys())
+['a', 'b', 'c']
+
+>>> order = []
+>>> sched = StepScheduler()
+>>> sched.add('x', lambda: order.append('x') or 0, resources=('serial',))
+>>> sched.add('y', lambda: order.append('y') or 0, resources=('serial',))
+>>> sched.run()
+0
+>>> order
+['x', 'y']
+"""
+
+import time
+import threading
+import collections
+
+import logging
+
+from gateway_code.common import queue
+
+LOGGER = logging.getLogger('gateway_code')
+
+Step = collections.namedtuple('Step', ['name', 'func', 'requires',
+                                       'resources'])
+
+
+class StepScheduler(object):
+    """ Run steps with dependencies, non dependent ones concurrently """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.steps = collections.OrderedDict()
+        self.timings = collections.OrderedDict()
+
+    def add(self, name, func, requires=(), resources=()):
+        """ Add step `name` running `func()` after `requires` steps.
+
+        Required steps must have already been added.
+        `resources` are not shared with other steps running concurrently.
+
+        :raises ValueError: for duplicated step or unknown required step """
+        if name in self.steps:
+            raise ValueError('Step %r already defined' % name)
+        unknown = [req for req in requires if req not in self.steps]
+        if unknown:
+            raise ValueError('Step %r requires unknown steps %r' %
+                             (name, unknown))
+        self.steps[name] = Step(name, func, tuple(requires),
+                                frozenset(resources))
+
+    def run(self):
+        """ Run all steps and return the sum of their return values.
+
+        If a step raises an exception, no new step is started, the running
+        ones are waited for and the exception is re-raised. """
+        done = set()
+        pending = list(self.steps.values())
+        running = 0
+        held = set()
+        results = queue.Queue()
+        ret_val = 0
+        error = None
+
+        while pending or running:
+            if error is None:
+                for step in self._ready_steps(pending, done, running, held):
+                    pending.remove(step)
+                    running += 1
+                    held.update(step.resources)
+                    self._start_step(step, results)
+            elif not running:
+                break
+
+            name, ret, step_error = results.get()
+            running -= 1
+            done.add(name)
+            held.difference_update(self.steps[name].resources)
+            if step_error is not None:
+                error = error or step_error
+            else:
+                ret_val += ret
+
+        if error is not None:
+            raise error
+        return ret_val
+
+    def _ready_steps(self, pending, done, running, held):
+        """ Steps that can be started now, in declaration order
+
+        A step waits for its resources held by running steps or wanted by
+        steps declared before it. """
+        slots = self.max_workers - running
+        busy = set(held)
+        ready = []
+        for step in pending:
+            if len(ready) >= slots:
+                break
+            if set(step.requires).issubset(done) and busy.isdisjoint(
+                    step.resources):
+                ready.append(step)
+            busy.update(step.resources)
+        return ready
+
+    def _start_step(self, step, results):
+        """ Run `step` in a thread, put (name, ret, error) in results """
+        thread = threading.Thread(target=self._run_step, args=(step, results),
+                                  name='step-%s' % step.name)
+        thread.daemon = True
+        thread.start()
+
+    def _run_step(self, step, results):
+        """ Run step and store its duration """
+        LOGGER.debug('Step %s: start', step.name)
+        t_start = time.time()
+        ret, error = 0, None
+        try:
+            ret = step.func()
+        except Exception as err:  # pylint:disable=broad-except
+            error = err
+        duration = time.time() - t_start
+        self.timings[step.name] = duration
+        LOGGER.debug('Step %s: ret %r in %.3fs', step.name, ret, duration)
+        results.put((step.name, ret, error))
@@ -23,6 +23,8 @@
 
 import os
 import logging
+import shutil
+import tempfile
 import unittest
 import runpy
 
@@ -67,6 +69,20 @@ class TestElfTarget(unittest.TestCase):
             elftarget.elf_target(firmware('wsn430_print_uids.hex'))
         assert 'Not a valid elf file' in str(exc_info.value)
 
+    def test_elf_header_target(self):
+        """Test target from elf header matches pyelftools one."""
+        for name in ('m3_idle.elf', 'leonardo_idle.elf', 'node.z1'):
+            with open(firmware(name), 'rb') as elf:
+                header = elf.read(elftarget.ELF_HEADER_SIZE)
+            self.assertEqual(elftarget.elf_header_target(header),
+                             elftarget.elf_target(firmware(name)))
+
+        with open(firmware('idle.c.o'), 'rb') as elf:
+            header = elf.read(elftarget.ELF_HEADER_SIZE)
+        self.assertRaises(ValueError, elftarget.elf_header_target, header)
+        self.assertRaises(ValueError, elftarget.elf_header_target, b'\x7fELF')
+        self.assertRaises(ValueError, elftarget.elf_header_target, b'')
+
 
 class TestElfTargetIsCompatibleWithNode(unittest.TestCase):
     """Test elftarget.is_compatible_with_node."""
@@ -119,12 +135,70 @@ class TestElftargetMain(unittest.TestCase):
         self.assertEqual(stdout.getvalue(), "('ELFCLASS32', 'EM_ARM')\n")
 
 
+class TestElfInfo(unittest.TestCase):
+    """Test elftarget.elf_info metadata cache."""
+
+    def setUp(self):
+        elftarget.clear_cache()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.elf = os.path.join(self.tmp_dir, 'fw.elf')
+        shutil.copy(firmware('m3_idle.elf'), self.elf)
+
+    def tearDown(self):
+        elftarget.clear_cache()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_elf_info(self):
+        """Test elf metadata."""
+        info = elftarget.elf_info(self.elf)
+        self.assertEqual(('ELFCLASS32', 'EM_ARM', 'ET_EXEC'), info[:3])
+        self.assertEqual(elftarget.get_elf_load_addr(self.elf),
+                         info.exec_addrs[0])
+        self.assertTrue(info.exec_addrs[0] <= info.entry)
+        self.assertTrue(0 < info.load_size <= os.path.getsize(self.elf))
+
+    @mock.patch('gateway_code.utils.elftarget.ELFFile',
+                side_effect=elftarget.ELFFile)
+    def test_parsed_once(self, elf_file):
+        """Test elf file is parsed once while it is not modified."""
+        info = elftarget.elf_info(self.elf)
+        self.assertEqual(('ELFCLASS32', 'EM_ARM'),
+                         elftarget.elf_target(self.elf))
+        self.assertTrue(elftarget.is_compatible_with_node(self.elf, NodeM3))
+        self.assertEqual(info.exec_addrs[0],
+                         elftarget.get_elf_load_addr(self.elf))
+        self.assertEqual(1, elf_file.call_count)
+
+        # file replaced
+        shutil.copy(firmware('leonardo_idle.elf'), self.elf)
+        self.assertEqual(('ELFCLASS32', 'EM_AVR'),
+                         elftarget.elf_target(self.elf))
+        self.assertEqual(2, elf_file.call_count)
+
+    @mock.patch('gateway_code.utils.elftarget.ELFFile')
+    def test_header_only_reject(self, elf_file):
+        """Test invalid files are rejected without full parsing."""
+        for name in ('idle.c.o', 'wsn430_print_uids.hex'):
+            self.assertRaises(ValueError, elftarget.elf_info, firmware(name))
+        self.assertFalse(elf_file.called)
+
+    def test_truncated_elf(self):
+        """Test valid header in an invalid elf file."""
+        with open(firmware('m3_idle.elf'), 'rb') as elf:
+            data = elf.read(64)
+        with open(self.elf, 'wb') as elf:
+            elf.write(data)
+        self.assertRaises(ValueError, elftarget.elf_info, self.elf)
+
+
 @mock.patch("elftools.elf.elffile.ELFFile.iter_sections")
 def test_elf_without_load_addr(iter_sections):
     # pylint:disable=unused-argument
     """Test load addr of a firmware without section returns None."""
     # no load addr in elf (because iter_sections function yields nothing)
+    elftarget.clear_cache()
     assert elftarget.get_elf_load_addr(firmware('m3_idle.elf')) is None
+    elftarget.clear_cache()
 
 
 def test_elf_with_load_addr():
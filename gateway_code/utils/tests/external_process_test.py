@@ -34,7 +34,7 @@ import mock
 from testfixtures import LogCapture
 
 from ..external_process import ExternalProcess
-from ..serial_redirection import SerialRedirection
+from ..serial_redirection import SocatSerialRedirection
 from ..rtl_tcp import RtlTcp
 from ..mjpg_streamer import MjpgStreamer
 from ..mosquitto import Mosquitto
@@ -153,12 +153,12 @@ class TestSignalsIter(unittest.TestCase):
 
 @mock.patch('subprocess.Popen')
 class TestProcessSocat(unittest.TestCase):
-    """SerialRedirection._call_process."""
+    """SocatSerialRedirection._call_process."""
 
     def test__call_socat_error(self, m_popen):
         """ Test the _call_process error case """
         m_popen.return_value.wait.return_value = -1
-        m_redirect = SerialRedirection(TTY_TEST, BAUDRATE_TEST)
+        m_redirect = SocatSerialRedirection(TTY_TEST, BAUDRATE_TEST)
         m_redirect._run = True
 
         ret = m_redirect._call_process(m_redirect.stdout)
@@ -167,7 +167,7 @@ class TestProcessSocat(unittest.TestCase):
     def test__call_socat_error_tty_not_found(self, m_popen):
         """ Test the _call_process error case when path can't be found"""
         m_popen.return_value.wait.return_value = -1
-        m_redirect = SerialRedirection('/dev/NotATty', BAUDRATE_TEST)
+        m_redirect = SocatSerialRedirection('/dev/NotATty', BAUDRATE_TEST)
         m_redirect._run = True
 
         ret = m_redirect._call_process(m_redirect.stdout)
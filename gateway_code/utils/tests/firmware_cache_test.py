@@ -0,0 +1,119 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for firmware_cache """
+
+# pylint: disable=missing-docstring
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from gateway_code.tests import utils
+from .. import firmware_cache
+
+
+class TestFirmwareCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'state', 'cache.json')
+        self.fw_path = os.path.join(self.tmp_dir, 'fw.elf')
+        with open(self.fw_path, 'wb') as fw_file:
+            fw_file.write(b'firmware')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_firmware_digest(self):
+        digest = firmware_cache.firmware_digest(self.fw_path)
+        self.assertTrue(digest.endswith(':elf:0'))
+        self.assertNotEqual(
+            digest, firmware_cache.firmware_digest(self.fw_path, True))
+        self.assertNotEqual(
+            firmware_cache.firmware_digest(self.fw_path, True, 0),
+            firmware_cache.firmware_digest(self.fw_path, True, 42))
+
+        with open(self.fw_path, 'wb') as fw_file:
+            fw_file.write(b'other firmware')
+        self.assertNotEqual(digest,
+                            firmware_cache.firmware_digest(self.fw_path))
+
+    def test_register_sha256(self):
+        digest = firmware_cache.firmware_digest(self.fw_path)
+        firmware_cache.register_sha256(self.fw_path, 'abc')
+        with mock.patch('hashlib.sha256') as sha256:
+            self.assertEqual('abc:elf:0',
+                             firmware_cache.firmware_digest(self.fw_path))
+            self.assertFalse(sha256.called)
+
+        # file changed, digest computed again
+        with open(self.fw_path, 'wb') as fw_file:
+            fw_file.write(b'firmware!')
+        self.assertNotEqual('abc:elf:0',
+                            firmware_cache.firmware_digest(self.fw_path))
+        self.assertNotEqual(digest,
+                            firmware_cache.firmware_digest(self.fw_path))
+
+    def test_update_persisted(self):
+        cache = firmware_cache.FirmwareCache(self.path)
+        self.assertIsNone(cache.flashed('node'))
+        cache.update('node', 'abc')
+        cache.update('other', 'def')
+
+        # shared with other instances/processes
+        cache = firmware_cache.FirmwareCache(self.path)
+        self.assertEqual('abc', cache.flashed('node'))
+        cache.update('node', None)
+        cache.update('node', None)
+        self.assertIsNone(cache.flashed('node'))
+        self.assertEqual('def', cache.flashed('other'))
+
+    @mock.patch('gateway_code.utils.firmware_cache.LOGGER.warning')
+    def test_write_error(self, warning):
+        # state directory is a file
+        cache = firmware_cache.FirmwareCache(
+            os.path.join(self.fw_path, 'cache.json'))
+        cache.update('node', 'abc')
+        self.assertTrue(warning.called)
+        self.assertIsNone(cache.flashed('node'))
+
+    def test_from_config(self):
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3')):
+            self.assertIsNone(firmware_cache.from_config())
+
+        with mock.patch(utils.READ_CONFIG,
+                        utils.read_config_mock('m3', firmware_cache='on')):
+            cache = firmware_cache.from_config()
+            self.assertFalse(cache.verify)
+            self.assertTrue(cache.path.endswith('firmware_cache.json'))
+
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+                'm3', firmware_cache='verify')):
+            self.assertTrue(firmware_cache.from_config().verify)
+
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+                'm3', firmware_cache='invalid')):
+            self.assertIsNone(firmware_cache.from_config())
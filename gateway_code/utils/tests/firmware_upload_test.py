@@ -0,0 +1,70 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+# pylint: disable=missing-docstring
+
+import io
+import hashlib
+import unittest
+
+from gateway_code.open_nodes.node_m3 import NodeM3
+from gateway_code.open_nodes.node_leonardo import NodeLeonardo
+from .elftarget_test import firmware
+from .. import firmware_upload
+
+
+def _read(name):
+    with open(firmware(name), 'rb') as fw_file:
+        return fw_file.read()
+
+
+class TestSaveFirmware(unittest.TestCase):
+
+    def test_save_firmware(self):
+        data = _read('m3_idle.elf')
+        for chunk_size in (1, 7, firmware_upload.CHUNK_SIZE):
+            dst = io.BytesIO()
+            digest = firmware_upload.save_firmware(
+                io.BytesIO(data), dst, NodeM3.ELF_TARGET, chunk_size)
+            self.assertEqual(data, dst.getvalue())
+            self.assertEqual(hashlib.sha256(data).hexdigest(), digest)
+
+    def test_no_target(self):
+        dst = io.BytesIO()
+        digest = firmware_upload.save_firmware(io.BytesIO(b'binary'), dst)
+        self.assertEqual(b'binary', dst.getvalue())
+        self.assertEqual(hashlib.sha256(b'binary').hexdigest(), digest)
+
+    def test_invalid_firmware(self):
+        # wrong target, rejected after reading the first chunk
+        dst = io.BytesIO()
+        self.assertRaises(ValueError, firmware_upload.save_firmware,
+                          io.BytesIO(_read('m3_idle.elf')), dst,
+                          NodeLeonardo.ELF_TARGET, 64)
+        self.assertEqual(b'', dst.getvalue())
+
+        # not elf files
+        for data in (b'', b'\x7fELF', _read('wsn430_print_uids.hex'),
+                     _read('idle.c.o')):
+            self.assertRaises(ValueError, firmware_upload.save_firmware,
+                              io.BytesIO(data), io.BytesIO(),
+                              NodeM3.ELF_TARGET)
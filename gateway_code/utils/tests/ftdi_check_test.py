@@ -22,61 +22,43 @@
 
 """ Test utils.ftdi_check """
 
-import textwrap
+import shutil
+import tempfile
 import unittest
 import mock
 
+from .. import usb_devices
 from ..ftdi_check import ftdi_check
+from .usb_devices_test import sysfs_tree
 
 
-@mock.patch('subprocess.check_output')
 class TestFtdiCheck(unittest.TestCase):
     """ Test utils.ftdi_check """
 
-    def test_ftdi_present(self, m_check_output):
-        """ Test the 'ftdi_check' method when it is present """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        devices = usb_devices.UsbDevices(self.root)
+        devices.hotplug = False
+        mock.patch.object(usb_devices, 'USB_DEVICES', devices).start()
+        self.addCleanup(mock.patch.stopall)
 
-        m_check_output.return_value = textwrap.dedent('''\
-            FTx232 devices lister by IoT-LAB
-            Listing FT4232 devices...
-            Found 1 device(s)
-            Device 0:
-                Manufacturer: IoT-LAB
-                Description: ControlNode
-                Serial:
-            All done, success!
-            ''')
+    def test_ftdi_present(self):
+        """ Test the 'ftdi_check' method when it is present """
+        sysfs_tree(self.root)
         self.assertEqual(0, ftdi_check('control', '4232'))
-        m_check_output.assert_called_with(['ftdi-devices-list', '-t', '4232'])
+        self.assertEqual(0, ftdi_check('m3', '2232'))
 
-    def test__ftdi_is_absent(self, m_check_output):
+    def test__ftdi_is_absent(self):
         """ Test the 'ftdi_check' method when it is absent """
-        m_check_output.return_value = textwrap.dedent('''\
-            FTx232 devices lister by IoT-LAB
-            Listing FT2232 devices...
-            No FTDI device found
-            All done, success!
-            ''')
         self.assertEqual(1, ftdi_check('open', '2232'))
-        m_check_output.assert_called_with(['ftdi-devices-list', '-t', '2232'])
+        sysfs_tree(self.root)
+        self.assertEqual(1, ftdi_check('open', '232H'))
 
-    def test_ftdi_list_present(self, m_check_output):
+    def test_ftdi_list_present(self):
         """ Test the 'ftdi_check' method with multiple nodes """
-
-        m_check_output.return_value = textwrap.dedent('''\
-            FTx232 devices lister by IoT-LAB
-            Listing FT4232 devices...
-            Found 1 device(s)
-            Device 0:
-                Manufacturer: IoT-LAB
-                Description: ControlNode
-                Serial:
-            Device 1:
-                Manufacturer: IoT-LAB
-                Description: M3
-                Serial:
-            All done, success!
-            ''')
-        self.assertEqual(0, ftdi_check('control', '4232'))
-        self.assertEqual(0, ftdi_check('control', '4232', description='M3'))
-        m_check_output.assert_called_with(['ftdi-devices-list', '-t', '4232'])
+        sysfs_tree(self.root)
+        self.assertEqual(0, ftdi_check('control', '4232',
+                                       description='ControlNode'))
+        self.assertEqual(0, ftdi_check('m3', '2232', description='M3'))
+        self.assertEqual(1, ftdi_check('control', '4232', description='M3'))
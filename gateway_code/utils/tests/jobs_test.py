@@ -0,0 +1,86 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for jobs """
+
+# pylint: disable=missing-docstring
+
+import threading
+import unittest
+
+import mock
+
+from .. import jobs
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.jobs = jobs.JobQueue(history=2)
+
+    def test_jobs_order(self):
+        calls = []
+        event = threading.Event()
+        self.assertFalse(self.jobs.busy())
+        first = self.jobs.submit('first', lambda: event.wait(5))
+        second = self.jobs.submit('second', lambda: calls.append(2) or 0)
+        self.assertTrue(self.jobs.busy())
+
+        self.assertEqual(jobs.QUEUED, second.as_dict()['state'])
+        self.assertIsNone(second.as_dict()['duration'])
+        self.assertFalse(second.wait(0.1))
+
+        event.set()
+        self.assertTrue(second.wait(5))
+        self.assertTrue(first.finished())
+        self.assertFalse(self.jobs.busy())
+        self.assertEqual([2], calls)
+        self.assertEqual((1, 2), (first.id, second.id))
+
+        ret = self.jobs.get(second.id).as_dict()
+        self.assertEqual('second', ret['name'])
+        self.assertEqual(jobs.DONE, ret['state'])
+        self.assertEqual(0, ret['result'])
+        self.assertIsNone(ret['error'])
+        self.assertGreaterEqual(ret['duration'], 0)
+
+    def test_job_error_and_cleanup(self):
+        cleanup = mock.Mock()
+        job = self.jobs.submit('error', mock.Mock(side_effect=IOError('err')),
+                               cleanup)
+        self.assertTrue(job.wait(5))
+        self.assertEqual(jobs.ERROR, job.state)
+        self.assertEqual('err', job.error)
+        self.assertIsNone(job.result)
+        self.assertTrue(cleanup.called)
+
+        # Worker still running
+        self.assertTrue(self.jobs.submit('ok', lambda: 0).wait(5))
+
+    def test_history(self):
+        submitted = [self.jobs.submit('job', lambda: 0) for _ in range(0, 4)]
+        submitted[-1].wait(5)
+        self.jobs.submit('last', lambda: 0).wait(5)
+
+        # Only 'history' finished jobs are kept
+        self.assertEqual([4, 5], [job.id for job in self.jobs.jobs()])
+        self.assertIsNone(self.jobs.get(1))
@@ -0,0 +1,96 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for measures_buffer """
+
+# pylint: disable=missing-docstring
+
+import math
+import unittest
+
+from gateway_code.utils.measures_buffer import MeasuresBuffer
+
+
+class TestMeasuresBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.buf = MeasuresBuffer(('power', 'rssi'), size=5)
+
+    def test_empty(self):
+        self.assertEqual(0, len(self.buf))
+        self.assertEqual([], list(self.buf.timestamps))
+        self.assertTrue(math.isnan(self.buf.mean('power')))
+        self.assertTrue(math.isnan(self.buf.min('power')))
+        self.assertTrue(math.isnan(self.buf.max('power')))
+        self.assertRaises(IndexError, self.buf.nearest, 'power', 1.0)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, MeasuresBuffer, ('power',), size=0)
+        self.assertRaises(ValueError, self.buf.extend, [1.0], [[1.0]])
+
+    def test_ring_overwrite(self):
+        for i in range(8):
+            self.buf.append(float(i), i * 10.0, -i)
+        self.assertEqual(5, len(self.buf))
+        self.assertEqual([3.0, 4.0, 5.0, 6.0, 7.0], list(self.buf.timestamps))
+        self.assertEqual([-3, -4, -5, -6, -7],
+                         list(self.buf.column('rssi')))
+
+        # windows over the buffer wrap
+        self.assertEqual([50.0, 60.0], list(self.buf.column('power', 5, 6)))
+        self.assertEqual(60.0, self.buf.mean('power', 4.5, 7.5))
+        self.assertEqual(40.0, self.buf.min('power', 3.5))
+        self.assertEqual(50.0, self.buf.max('power', end=5.9))
+        self.assertEqual((5, 5), self.buf.window(8, 10))
+        self.assertEqual((3, 3), self.buf.window(5.5, 4))
+
+        self.buf.clear()
+        self.assertEqual(0, len(self.buf))
+
+    def test_extend_more_than_size(self):
+        self.buf.append(0.0, 0.0, 0.0)
+        timestamps = [float(i) for i in range(1, 13)]
+        self.buf.extend(timestamps, [timestamps, timestamps])
+        self.assertEqual(timestamps[-5:], list(self.buf.timestamps))
+        self.assertEqual(timestamps[-5:], list(self.buf.column('rssi')))
+
+        self.buf.extend([13.0, 14.0], [[13.0, 14.0], [13.0, 14.0]])
+        self.assertEqual([10.0, 11.0, 12.0, 13.0, 14.0],
+                         list(self.buf.column('power')))
+
+    def test_nearest(self):
+        self.buf.extend([1.0, 2.0, 4.0], [[10.0, 20.0, 40.0], [0, 0, 0]])
+        self.assertEqual(10.0, self.buf.nearest('power', 0.0))
+        self.assertEqual(20.0, self.buf.nearest('power', 2.9))
+        self.assertEqual(40.0, self.buf.nearest('power', 3.1))
+        self.assertEqual(40.0, self.buf.nearest('power', 100))
+        self.assertEqual(1, self.buf.nearest_index(2.0))
+
+    def test_to_numpy(self):
+        try:
+            import numpy  # noqa pylint:disable=unused-variable
+        except ImportError:
+            self.skipTest('numpy not available')
+        self.buf.extend([1.0, 2.0, 4.0], [[10.0, 20.0, 40.0], [0, 0, 0]])
+        arrays = self.buf.to_numpy(start=2.0)
+        self.assertEqual([2.0, 4.0], arrays['timestamps'].tolist())
+        self.assertEqual([20.0, 40.0], arrays['power'].tolist())
@@ -0,0 +1,93 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for metrics """
+
+# pylint: disable=missing-docstring
+
+import unittest
+
+import mock
+
+from gateway_code.common import logger_call
+from .. import metrics
+
+
+class _Node(object):
+
+    @logger_call('Node: flash')
+    def flash(self, ret=0):  # pylint:disable=no-self-use
+        return ret
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.Metrics(buckets=(1, 10))
+
+    def test_histogram(self):
+        hist = metrics.Histogram((1, 10))
+        for value in (0.5, 1, 5, 100):
+            hist.observe(value)
+        self.assertEqual([('1', 2), ('10', 3), ('+Inf', 4)],
+                         hist.cumulative())
+        self.assertEqual(106.5, hist.as_dict()['sum'])
+
+    @mock.patch('time.time')
+    def test_timed(self, time_mock):
+        time_mock.side_effect = [0, 2, 10, 11, 20, 25]
+
+        @self.metrics.timed('step')
+        def _step(ret):
+            if ret is None:
+                raise ValueError()
+            return ret
+
+        self.assertEqual(0, _step(0))
+        self.assertEqual(1, _step(1))
+        self.assertRaises(ValueError, _step, None)
+
+        hist = self.metrics.as_dict()['step']
+        self.assertEqual(3, hist['count'])
+        self.assertEqual(8, hist['sum'])
+        self.assertEqual(2, hist['errors'])
+        self.assertEqual({'1': 1, '10': 3, '+Inf': 3}, hist['buckets'])
+
+    def test_timer(self):
+        with self.metrics.timer('block'):
+            pass
+        self.assertEqual(1, self.metrics.as_dict()['block']['count'])
+        self.metrics.reset()
+        self.assertEqual({}, self.metrics.as_dict())
+
+    def test_logger_call_step_name(self):
+        # logger_call records in gateway metrics
+        node = _Node()
+        node.flash()
+        node.flash(2)
+        hist = metrics.METRICS.as_dict()['_Node.flash']
+        self.assertEqual(2, hist['count'])
+        self.assertEqual(1, hist['errors'])
+
+    def test_prometheus_escape(self):
+        self.metrics.observe('a"b\\c', 1)
+        self.assertIn('step="a\\"b\\\\c"', self.metrics.prometheus())
@@ -27,13 +27,21 @@
 # serial mock note correctly detected
 # pylint: disable=maybe-no-member
 
+import os
 import time
+import shutil
+import socket
+import tempfile
+import threading
 import unittest
 import mock
 
 from gateway_code.open_nodes.node_m3 import NodeM3  # config file
+from gateway_code.tests import utils
 from gateway_code.utils.openocd import OpenOCDArgs
 from .. import openocd
+from .. import firmware_cache
+from .. import subprocess_timeout
 
 
 @mock.patch('gateway_code.utils.subprocess_timeout.call')
@@ -162,3 +170,215 @@ class TestsFlashInvalidPaths(unittest.TestCase):
             OpenOCDArgs('openocd', NodeM3.OPENOCD_CFG_FILE, ())
         ).flash('/invalid/path')
         self.assertNotEqual(0, ret)
+
+
+class FakeTCLServer(object):
+    """ Fake openocd TCL server, answers 'catch' with `self.ret` """
+    def __init__(self):
+        self.listen = socket.socket()
+        self.listen.bind(('127.0.0.1', 0))
+        self.listen.listen(1)
+        self.port = self.listen.getsockname()[1]
+        self.ret = b'0'
+        self.scripts = []
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _serve(self):
+        conn, _ = self.listen.accept()
+        data = b''
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+            while b'\x1a' in data:
+                cmd, data = data.split(b'\x1a', 1)
+                self.scripts.append(cmd.decode())
+                if self.ret is None:
+                    conn.close()
+                    return
+                conn.sendall(self.ret + b'\x1a')
+        conn.close()
+
+    def close(self):
+        self.listen.close()
+
+
+@mock.patch('gateway_code.utils.subprocess_timeout.call')
+class TestsServer(unittest.TestCase):
+    """ Tests openocd server mode """
+    def setUp(self):
+        self.tcl = FakeTCLServer()
+        self.popen = mock.patch(
+            'gateway_code.utils.subprocess_timeout.Popen').start()
+        self.popen.return_value.poll.return_value = None
+        self.ocd = openocd.OpenOCD.from_node(NodeM3, tcl_port=self.tcl.port,
+                                             gdb_port=3333)
+
+    def tearDown(self):
+        self.ocd.server.stop()
+        self.tcl.close()
+        mock.patch.stopall()
+
+    def test_server_args(self, _):
+        args = self.ocd.server.popen_args['args']
+        self.assertEqual(args[-12:],
+                         ['-c', 'bindto 127.0.0.1',
+                          '-c', 'tcl_port %d' % self.tcl.port,
+                          '-c', 'telnet_port disabled',
+                          '-c', 'gdb_port 3333',
+                          '-c', 'init', '-c', 'targets'])
+
+    def test_reset_flash(self, call_mock):
+        self.assertEqual(0, self.ocd.reset())
+        self.assertEqual(0, self.ocd.reset())
+        self.tcl.ret = b'1'
+        self.assertEqual(1, self.ocd.flash(NodeM3.FW_IDLE))
+
+        self.assertEqual(1, self.popen.call_count)
+        self.assertFalse(call_mock.called)
+        fw_path = openocd.common.abspath(NodeM3.FW_IDLE)
+        self.assertEqual(self.tcl.scripts, [
+            'catch {reset run}', 'catch {reset run}',
+            'catch {reset halt; reset init; flash write_image erase %s; '
+            'verify_image %s; reset run}' % (fw_path, fw_path)])
+
+    def test_fallback_connection_closed(self, call_mock):
+        call_mock.return_value = 0
+        self.tcl.ret = None
+        self.assertEqual(0, self.ocd.reset())
+        self.assertTrue(call_mock.called)
+        self.assertTrue(self.popen.return_value.terminate.called)
+        self.assertIsNone(self.ocd.server.process)
+
+    def test_fallback_start_error(self, call_mock):
+        call_mock.return_value = 0
+        self.popen.return_value.poll.return_value = 1  # process died
+        self.ocd.server.tcl_port = self.tcl.port + 1  # nothing listening
+        self.tcl.close()
+
+        self.assertEqual(0, self.ocd.reset())
+        self.assertTrue(call_mock.called)
+        self.assertIsNone(self.ocd.server.process)
+
+        # Server start is not retried
+        self.assertEqual(0, self.ocd.reset())
+        self.assertEqual(2, call_mock.call_count)
+        self.assertEqual(1, self.popen.call_count)
+
+    def test_stop_kill(self, _):
+        self.assertEqual(0, self.ocd.reset())
+        process = self.popen.return_value
+        process.wait.side_effect = [
+            subprocess_timeout.TimeoutExpired('openocd', 5), 0]
+
+        self.ocd.server.stop()
+        self.assertTrue(process.terminate.called)
+        self.assertTrue(process.kill.called)
+        self.assertIsNone(self.ocd.server.process)
+
+    def test_debug(self, call_mock):
+        self.assertEqual(0, self.ocd.debug_start())
+        self.assertEqual(['catch {reset halt}'], self.tcl.scripts)
+        self.assertEqual(1, self.popen.call_count)
+
+        # Cannot reset
+        self.assertEqual(1, self.ocd.reset())
+        self.assertFalse(call_mock.called)
+
+        # server is kept running
+        self.assertEqual(0, self.ocd.debug_stop())
+        self.assertFalse(self.popen.return_value.terminate.called)
+        self.assertEqual(0, self.ocd.reset())
+
+    def test_no_server(self, _):
+        ocd = openocd.OpenOCD.from_node(NodeM3)
+        self.assertIsNone(ocd.server)
+        self.assertIsNone(ocd._server_call(openocd.OpenOCD.RESET))
+
+    def test_server_config(self, _):
+        class _NodeServer(NodeM3):  # pylint:disable=too-few-public-methods
+            OPENOCD_TCL_PORT = 6667
+
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3')):
+            ocd = openocd.OpenOCD.from_node(_NodeServer)
+        self.assertIsNone(ocd.server)
+
+        with mock.patch(utils.READ_CONFIG,
+                        utils.read_config_mock('m3', openocd_server='on')):
+            ocd = openocd.OpenOCD.from_node(_NodeServer)
+        self.assertEqual(6667, ocd.server.tcl_port)
+
+
+@mock.patch('gateway_code.utils.subprocess_timeout.call')
+class TestsFirmwareCache(unittest.TestCase):
+    """ Tests openocd flash with firmware cache """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = firmware_cache.FirmwareCache(
+            os.path.join(self.tmp_dir, 'cache.json'))
+        self.ocd = openocd.OpenOCD.from_node(NodeM3, fw_cache=self.cache)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @staticmethod
+    def _cmd(call_mock):
+        return ' '.join(call_mock.call_args[1]['args'][-10:])
+
+    def test_skip_flash(self, call_mock):
+        call_mock.return_value = 0
+        self.assertEqual(0, self.ocd.flash(NodeM3.FW_IDLE))
+        self.assertIn('flash write_image', self._cmd(call_mock))
+
+        # only reset
+        self.assertEqual(0, self.ocd.flash(NodeM3.FW_IDLE))
+        self.assertEqual(2, call_mock.call_count)
+        self.assertTrue(self._cmd(call_mock).endswith(
+            'reset run -c shutdown'))
+        self.assertNotIn('flash write_image', self._cmd(call_mock))
+
+        # other firmware or flash options
+        self.assertEqual(0, self.ocd.flash(NodeM3.FW_AUTOTEST))
+        self.assertIn('flash write_image', self._cmd(call_mock))
+        self.assertEqual(0, self.ocd.flash(NodeM3.FW_AUTOTEST, True, 42))
+        self.assertIn('program', self._cmd(call_mock))
+
+    def test_invalidate(self, call_mock):
+        # flash failed
+        call_mock.return_value = 1
+        self.assertEqual(1, self.ocd.flash(NodeM3.FW_IDLE))
+        self.assertIsNone(self.cache.flashed(self.ocd.config))
+
+        call_mock.return_value = 0
+        self.ocd.flash(NodeM3.FW_IDLE)
+        self.assertIsNotNone(self.cache.flashed(self.ocd.config))
+
+        # debugger may write the flash
+        with mock.patch('subprocess.Popen'):
+            self.ocd.debug_start()
+            self.ocd.debug_stop()
+        self.assertIsNone(self.cache.flashed(self.ocd.config))
+
+    def test_verify(self, call_mock):
+        self.cache.verify = True
+        call_mock.return_value = 0
+        self.ocd.flash(NodeM3.FW_IDLE)
+
+        self.assertEqual(0, self.ocd.flash(NodeM3.FW_IDLE))
+        self.assertIn('verify_image', self._cmd(call_mock))
+        self.assertEqual(2, call_mock.call_count)
+
+        # verify failed, flash
+        call_mock.side_effect = [1, 0]
+        self.assertEqual(0, self.ocd.flash(NodeM3.FW_IDLE))
+        self.assertIn('flash write_image', self._cmd(call_mock))
+
+        # binary verify
+        call_mock.side_effect = None
+        self.ocd.flash(NodeM3.FW_IDLE, True, 4096)
+        self.ocd.flash(NodeM3.FW_IDLE, True, 4096)
+        self.assertIn('verify_image', self._cmd(call_mock))
+        self.assertIn('0x1000 bin', self._cmd(call_mock))
@@ -151,6 +151,8 @@ class TestsProgrammer(unittest.TestCase):
     @mock.patch(utils.READ_CONFIG,
                 utils.read_config_mock('m3', control_node_type='iotlab'))
     @mock.patch('gateway_code.utils.subprocess_timeout.call')
+    @mock.patch('gateway_code.utils.tty_watcher.wait_tty',
+                mock.Mock(return_value=True))  # CN tty
     def test_control_node_method(self, call_mock):
         """ Test control node method """
         call_mock.return_value = 0
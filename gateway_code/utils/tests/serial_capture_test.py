@@ -0,0 +1,153 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for serial_capture """
+
+# pylint: disable=missing-docstring
+# pylint: disable=protected-access
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from gateway_code.tests import utils
+from .. import serial_capture
+
+
+class TestSerialCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'm3-1')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _content(self, path=None):
+        with open(path or self.path, 'rb') as capture:
+            return capture.read()
+
+    def test_lines_timestamps(self):
+        capture = serial_capture.SerialCapture(self.path)
+        capture.write(b'hello ', timestamp=1.5)
+        capture.write(b'world\nsec', timestamp=2.0)
+        capture.write(memoryview(b'ond\n\nlast'), timestamp=3.25)
+        # Buffered
+        self.assertEqual(b'', self._content())
+
+        capture.close()
+        self.assertEqual(b'1.500000;hello world\n'
+                         b'2.000000;second\n'
+                         b'3.250000;\n'
+                         b'3.250000;last', self._content())
+
+        # Closed, ignored
+        capture.write(b'ignored')
+        capture.poll()
+        capture.close()
+        self.assertTrue(self._content().endswith(b'last'))
+
+    def test_periodic_flush(self):
+        capture = serial_capture.SerialCapture(self.path)
+        start = capture._flush_time
+        capture.write(b'line\n', timestamp=start)
+        self.assertEqual(b'', self._content())
+
+        with mock.patch('os.fsync') as fsync:
+            capture.poll(start + capture.FLUSH_PERIOD)
+            self.assertEqual(('%.6f;line\n' % start).encode(),
+                             self._content())
+            self.assertFalse(fsync.called)
+            capture.poll(start + capture.FSYNC_PERIOD)
+            self.assertTrue(fsync.called)
+        capture.close()
+
+    def test_buffer_full(self):
+        with mock.patch.object(serial_capture.SerialCapture, 'BUFFER_SIZE',
+                               32):
+            capture = serial_capture.SerialCapture(self.path)
+            capture.write(b'a' * 20 + b'\n', timestamp=1)
+            capture.write(b'b' * 20 + b'\n', timestamp=1)
+            self.assertEqual(b'1.000000;' + b'a' * 20 + b'\n',
+                             self._content())
+            # bigger than buffer
+            capture.write(b'c' * 40, timestamp=1)
+            capture.close()
+        self.assertEqual(3, self._content().count(b'1.000000;'))
+        self.assertTrue(self._content().endswith(b'c' * 40))
+
+    def test_rotation(self):
+        capture = serial_capture.SerialCapture(self.path, max_size=40,
+                                               backups=2)
+        for num in range(0, 7):
+            capture.write(b'line %d\n' % num, timestamp=1)
+            capture.poll(capture._flush_time + capture.FLUSH_PERIOD)
+        capture.close()
+
+        # 2 lines per file, oldest ones removed
+        self.assertEqual(b'1.000000;line 6\n', self._content())
+        self.assertEqual(b'1.000000;line 4\n1.000000;line 5\n',
+                         self._content(self.path + '.1'))
+        self.assertEqual(b'1.000000;line 2\n1.000000;line 3\n',
+                         self._content(self.path + '.2'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+
+        # last rotated file merged, older removed
+        capture.merge_backups()
+        self.assertFalse(os.path.exists(self.path + '.1'))
+        self.assertFalse(os.path.exists(self.path + '.2'))
+        self.assertEqual(b'1.000000;line 4\n1.000000;line 5\n'
+                         b'1.000000;line 6\n', self._content())
+
+        # Nothing to merge
+        capture.merge_backups()
+        self.assertEqual(b'1.000000;line 4\n1.000000;line 5\n'
+                         b'1.000000;line 6\n', self._content())
+
+    def test_write_error(self):
+        capture = serial_capture.SerialCapture(self.path)
+        with mock.patch('os.write', side_effect=OSError()):
+            capture.write(b'line\n')
+            capture.close()
+        self.assertIsNone(capture._fd)
+        capture.write(b'ignored\n')
+        self.assertEqual(b'', self._content())
+
+    def test_from_config(self):
+        exp_dir = os.path.join(self.tmp_dir, '{user}', '{exp_id}/')
+        with mock.patch('gateway_code.config.EXP_FILES_DIR', exp_dir):
+            self.assertIsNone(serial_capture.from_config('m3-1', 'user', 1))
+
+            with mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+                    'm3', serial_capture='on')):
+                capture = serial_capture.from_config('m3-1', 'user', 1)
+                self.assertEqual(
+                    os.path.join(self.tmp_dir, 'user', '1', 'serial', 'm3-1'),
+                    capture.path)
+                capture.close()
+
+                with mock.patch('os.makedirs', side_effect=OSError()):
+                    self.assertIsNone(
+                        serial_capture.from_config('m3-1', 'user', 2))
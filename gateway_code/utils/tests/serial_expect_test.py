@@ -22,6 +22,9 @@
 
 """ expect module test """
 
+import os
+import re
+import socket
 import time
 import unittest
 
@@ -46,6 +49,11 @@ class TestSerialExpect(unittest.TestCase):
         self.serial_class = self.serial_patcher.start()
         self.serial = self.serial_class.return_value
         self.serial.read = self.serial_read_mock
+        self.serial.in_waiting = 0
+        # Always readable file for 'select'
+        self.pipe = os.pipe()
+        os.write(self.pipe[1], b'x')
+        self.serial.fileno.return_value = self.pipe[0]
 
         self.expect = serial_expect.SerialExpect('TTY', 1234)
 
@@ -53,6 +61,8 @@ class TestSerialExpect(unittest.TestCase):
 
     def tearDown(self):
         self.serial_patcher.stop()
+        os.close(self.pipe[0])
+        os.close(self.pipe[1])
 
     def serial_read_mock(self, size):  # pylint:disable=unused-argument
         try:
@@ -105,7 +115,46 @@ class TestSerialExpect(unittest.TestCase):
         self.assertEqual('a00d', ret)
 
     def test_expect_newline_pattern(self):
-        self.assertRaises(ValueError, self.expect.expect, 'abc\rdef\nghi')
+        self.read_ret = ['abc\r', 'def\n', 'ghi\n']
+        ret = self.expect.expect('abc\rdef\nghi')
+        self.assertEqual('abc\rdef\nghi', ret)
+
+        self.read_ret = ['login:\n', 'root@node:~# ']
+        ret = self.expect.expect(r'login:\n.*# ')
+        self.assertEqual('login:\nroot@node:~# ', ret)
+
+        # classes matching newlines
+        self.read_ret = ['login:\n', 'root# ']
+        ret = self.expect.expect(r'login:\s+root')
+        self.assertEqual('login:\nroot', ret)
+
+        self.read_ret = ['start\n', 'end']
+        ret = self.expect.expect(re.compile('start.end', re.DOTALL))
+        self.assertEqual('start\nend', ret)
+
+    def test_expect_compiled_pattern(self):
+        self.read_ret = ['LOGIN: ']
+        ret = self.expect.expect(re.compile('login: ', re.IGNORECASE))
+        self.assertEqual('LOGIN: ', ret)
+
+        self.read_ret = [b'\x01bytes\xff\n']
+        ret = self.expect.expect(re.compile(b'bytes.'))
+        self.assertEqual(u'bytes\ufffd', ret)
+
+    def test_expect_reads_available(self):
+        self.serial.in_waiting = 42
+        self.serial.read = mock.Mock(return_value=b'abcd')
+        self.assertEqual('abcd', self.expect.expect('a.*d'))
+        self.serial.read.assert_called_with(42)
+
+    def test_expect_long_line(self):
+        self.read_ret = ['a' * 1000, 'b\n' * 1000, 'c' * 1000, 'd']
+        self.assertEqual('b\n' + 'c' * 1000 + 'd',
+                         self.expect.expect('b\nc+d'))
+
+        with mock.patch.object(self.expect, 'MAX_BUFFER', 100):
+            self.read_ret = ['start', 'a' * 1000, 'end']
+            self.assertEqual('', self.expect.expect('start.*end', 0.5))
 
     def test_expect_list_parameters(self):
         expect_mock = mock.Mock(return_value='')
@@ -146,3 +195,27 @@ class TestSerialExpect(unittest.TestCase):
             self.read_ret = ['123\n456', '789\n', 'abcd']
             ret = ser.expect('a.*d')
             self.assertEqual(ret, 'abcd')
+
+
+class TestSerialExpectForSocket(unittest.TestCase):
+
+    def setUp(self):
+        self.listen = socket.socket()
+        self.listen.bind(('127.0.0.1', 0))
+        self.listen.listen(1)
+        self.port = self.listen.getsockname()[1]
+
+    def tearDown(self):
+        self.listen.close()
+
+    def test_expect_reads_chunks(self):
+        with serial_expect.SerialExpectForSocket(port=self.port) as ser:
+            conn, _ = self.listen.accept()
+            conn.sendall(b'a' * 1000 + b'end')
+            time.sleep(0.1)
+            with mock.patch.object(ser.fd, 'read', wraps=ser.fd.read) as read:
+                self.assertEqual('end', ser.expect('end', 5))
+            # all pending data read at once
+            self.assertEqual(1, read.call_count)
+            read.assert_called_with(ser.READ_SIZE)
+            conn.close()
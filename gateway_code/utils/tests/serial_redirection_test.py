@@ -32,7 +32,10 @@ import unittest
 import mock
 
 from gateway_code.common import wait_tty
+from gateway_code.tests import utils
+from .. import serial_redirection
 from ..serial_redirection import SerialRedirection
+from ..serial_redirection import NativeSerialRedirection
 from ..node_connection import OpenNodeConnection
 
 # pylint: disable=invalid-name
@@ -122,3 +125,221 @@ class TestSerialRedirection(_SerialRedirectionTestCase):
                           socket.create_connection, ('0.0.0.0', 20000))
         conn.close()
         self.redirect.stop()
+
+
+class TestNativeSerialRedirectionPty(unittest.TestCase):
+    """Test NativeSerialRedirection with a pty pair, no socat needed."""
+    PORT = 20042
+
+    def setUp(self):
+        self.master, slave = os.openpty()
+        self.tty = os.ttyname(slave)
+        self.slave = slave
+        self.redirect = NativeSerialRedirection(self.tty, 500000,
+                                                port=self.PORT)
+        self.assertEqual(0, self.redirect.start())
+
+    def tearDown(self):
+        self.redirect.stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _connect(self):
+        return OpenNodeConnection.try_connect(('127.0.0.1', self.PORT),
+                                              step=0.05)
+
+    def _read_master(self, size):
+        data = b''
+        while len(data) < size:
+            data += os.read(self.master, size - len(data))
+        return data
+
+    @staticmethod
+    def _recv(conn, size):
+        data = b''
+        while len(data) < size:
+            data += conn.recv(size - len(data))
+        return data
+
+    def test_redirection_reconnect(self):
+        """ Test data in both directions and immediate reconnections """
+        for i in range(0, 3):
+            conn = self._connect()
+            conn.settimeout(5)
+
+            sock_txt = b'HelloFromSock: %u\n' % i
+            conn.sendall(sock_txt)
+            self.assertEqual(self._read_master(len(sock_txt)), sock_txt)
+
+            serial_txt = b'HelloFromSerial %u\n' % i
+            os.write(self.master, serial_txt)
+            self.assertEqual(self._recv(conn, len(serial_txt)), serial_txt)
+
+            conn.close()
+
+        # tty was never closed between clients
+        self.assertIsNotNone(self.redirect.serial)
+
+    def test_redirection_quick_reconnect(self):
+        """ Client reconnecting after RECONNECT_DELAY, without retries """
+        for i in range(0, 5):
+            conn = socket.create_connection(('127.0.0.1', self.PORT))
+            conn.settimeout(5)
+            sock_txt = b'HelloFromSock: %u\n' % i
+            conn.sendall(sock_txt)
+            self.assertEqual(self._read_master(len(sock_txt)), sock_txt)
+            conn.close()
+            time.sleep(NativeSerialRedirection.RECONNECT_DELAY)
+
+    def test_redirection_large_data(self):
+        """ Test sending more data than the buffer size """
+        conn = self._connect()
+        conn.settimeout(5)
+        data = bytes(bytearray(i % 256 for i in range(0, 3 * 4096 + 10)))
+        os.write(self.master, data)
+        self.assertEqual(self._recv(conn, len(data)), data)
+        conn.close()
+
+    def test_redirection_exclusion(self):
+        """ Check the exclusion of multiple connection """
+        conn = self._connect()
+        time.sleep(0.2)
+        self.assertRaises(IOError,
+                          socket.create_connection, ('127.0.0.1', self.PORT))
+        conn.close()
+
+        # Reconnection possible again
+        conn = self._connect()
+        conn.close()
+
+    def test_redirection_crnl(self):
+        """ Test the 'crnl' conversion option """
+        self.redirect.stop()
+        self.redirect = NativeSerialRedirection(
+            self.tty, 500000, ('echo=0', 'raw', 'crnl'), port=self.PORT)
+        self.assertEqual(0, self.redirect.start())
+
+        conn = self._connect()
+        conn.settimeout(5)
+        conn.sendall(b'cmd\n')
+        self.assertEqual(self._read_master(5), b'cmd\r\n')
+        os.write(self.master, b'answer\r\n')
+        self.assertEqual(self._recv(conn, 7), b'answer\n')
+        conn.close()
+
+    def test_redirection_multiple_uses(self):
+        """ Test calling multiple times start-stop """
+        self.assertEqual(0, self.redirect.stop())
+        self.assertEqual(0, self.redirect.start())
+        self.assertEqual(0, self.redirect.stop())
+        self.assertEqual(0, self.redirect.start())
+
+    def test_redirection_port_used(self):
+        """ Test start error when port is already used """
+        other = NativeSerialRedirection(self.tty, 500000, port=self.PORT)
+        self.assertEqual(1, other.start())
+        self.assertEqual(0, other.stop())
+
+    def test_redirection_capture(self):
+        """ Test tty output written to capture, with or without client """
+        captured = []
+        self.redirect.capture = mock.Mock()
+        # data buffer is reused, copy it
+        self.redirect.capture.write.side_effect = (
+            lambda data: captured.append(bytes(data)))
+        os.write(self.master, b'NoClient\n')
+        # wait it is read before connecting
+        for _ in range(0, 50):
+            if captured:
+                break
+            time.sleep(0.1)
+        conn = self._connect()
+        conn.settimeout(5)
+        # tty output is only sent to accepted clients
+        for _ in range(0, 50):
+            if self.redirect.clients:
+                break
+            time.sleep(0.1)
+        os.write(self.master, b'Client\n')
+        self.assertEqual(self._recv(conn, 7), b'Client\n')
+        conn.close()
+
+        self.assertEqual(b'NoClient\nClient\n', b''.join(captured))
+
+    def test_redirection_fanout(self):
+        """ Test multiple clients, one writer and observers """
+        self.redirect.stop()
+        self.redirect = NativeSerialRedirection(self.tty, 500000,
+                                                port=self.PORT, max_clients=2)
+        self.assertEqual(0, self.redirect.start())
+
+        writer = self._connect()
+        writer.settimeout(5)
+        observer = self._connect()
+        observer.settimeout(5)
+        time.sleep(0.2)
+        # Third connection should fail
+        self.assertRaises(IOError,
+                          socket.create_connection, ('127.0.0.1', self.PORT))
+
+        # tty output sent to all clients
+        os.write(self.master, b'HelloFromSerial\n')
+        self.assertEqual(self._recv(writer, 16), b'HelloFromSerial\n')
+        self.assertEqual(self._recv(observer, 16), b'HelloFromSerial\n')
+
+        # only the writer data goes to the tty
+        observer.sendall(b'ignored\n')
+        time.sleep(0.2)
+        writer.sendall(b'written\n')
+        self.assertEqual(self._read_master(8), b'written\n')
+
+        # observer becomes the writer
+        writer.close()
+        time.sleep(0.2)
+        observer.sendall(b'observer\n')
+        self.assertEqual(self._read_master(9), b'observer\n')
+
+        # listening again for a new client
+        conn = self._connect()
+        conn.close()
+        observer.close()
+
+
+class TestNativeSerialRedirectionUnits(unittest.TestCase):
+    """Test NativeSerialRedirection helpers."""
+
+    def test_buffer_push(self):
+        """ Test bounded client buffer """
+        buf = serial_redirection._Buffer(8)
+        self.assertEqual(5, buf.push(b'01234'))
+        self.assertEqual(3, buf.free())
+        self.assertEqual(3, buf.push(b'56789'))  # '89' dropped
+        self.assertEqual(0, buf.free())
+
+        written = []
+
+        def _write(data):
+            written.append(data[:4].tobytes())
+            return 4
+        buf.drain(_write)
+        self.assertEqual([b'0123'], written)
+        self.assertEqual(4, len(buf))
+
+        # data is moved to the beginning when needed
+        self.assertEqual(4, buf.push(b'abcdef'))
+        self.assertEqual(b'4567abcd', buf.view[buf.start:buf.end].tobytes())
+
+    def test_max_clients_config(self):
+        """ Test 'serial_redirection_clients' config """
+        redirect = NativeSerialRedirection('/dev/null', 500000)
+        self.assertEqual(1, redirect.max_clients)
+
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+                'm3', serial_redirection_clients='4')):
+            redirect = NativeSerialRedirection('/dev/null', 500000)
+            self.assertEqual(4, redirect.max_clients)
+
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+                'm3', serial_redirection_clients='many')):
+            redirect = NativeSerialRedirection('/dev/null', 500000)
+            self.assertEqual(1, redirect.max_clients)
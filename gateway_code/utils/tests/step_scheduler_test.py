@@ -0,0 +1,127 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for step_scheduler """
+
+# pylint: disable=missing-docstring
+
+import time
+import threading
+import unittest
+
+from gateway_code.utils.step_scheduler import StepScheduler
+
+
+class TestStepScheduler(unittest.TestCase):
+
+    def test_dependencies_order(self):
+        order = []
+        lock = threading.Lock()
+
+        def _step(name, ret=0):
+            def _func():
+                with lock:
+                    order.append(name)
+                return ret
+            return _func
+
+        sched = StepScheduler()
+        sched.add('a', _step('a'))
+        sched.add('b', _step('b', 1), requires=('a',))
+        sched.add('c', _step('c', 2), requires=('a',))
+        sched.add('d', _step('d'), requires=('b', 'c'))
+
+        self.assertEqual(3, sched.run())
+        self.assertEqual('a', order[0])
+        self.assertEqual(['b', 'c'], sorted(order[1:3]))
+        self.assertEqual('d', order[3])
+        self.assertEqual(['a', 'b', 'c', 'd'], sorted(sched.timings.keys()))
+
+    def test_independent_steps_are_concurrent(self):
+        sched = StepScheduler()
+        sched.add('a', lambda: time.sleep(0.5) or 0)
+        sched.add('b', lambda: time.sleep(0.5) or 0)
+
+        t_ref = time.time()
+        self.assertEqual(0, sched.run())
+        self.assertGreater(0.9, time.time() - t_ref)
+        self.assertLessEqual(0.5, sched.timings['a'])
+
+    def test_max_workers(self):
+        sched = StepScheduler(max_workers=1)
+        sched.add('a', lambda: time.sleep(0.3) or 0)
+        sched.add('b', lambda: time.sleep(0.3) or 0)
+
+        t_ref = time.time()
+        self.assertEqual(0, sched.run())
+        self.assertLessEqual(0.6, time.time() - t_ref)
+
+    def test_resources(self):
+        running = set()
+        overlaps = []
+        lock = threading.Lock()
+
+        def _step(name, duration=0.1):
+            def _func():
+                with lock:
+                    running.add(name)
+                time.sleep(duration)
+                with lock:
+                    overlaps.append((name, sorted(running)))
+                    running.discard(name)
+                return 0
+            return _func
+
+        sched = StepScheduler()
+        sched.add('serial_1', _step('serial_1'), resources=('serial',))
+        sched.add('cn', _step('cn', 0.4), resources=('cn',))
+        sched.add('both', _step('both'), resources=('serial', 'cn'))
+        sched.add('serial_2', _step('serial_2'), resources=('serial',))
+        self.assertEqual(0, sched.run())
+
+        overlaps = dict(overlaps)
+        # independent resources steps run concurrently
+        self.assertEqual(['cn', 'serial_1'], overlaps['serial_1'])
+        # declaration order kept for steps sharing resources
+        self.assertEqual(['both'], overlaps['both'])
+        self.assertEqual(['serial_2'], overlaps['serial_2'])
+
+    def test_exception(self):
+        called = []
+
+        def _raise():
+            raise RuntimeError('step error')
+
+        sched = StepScheduler()
+        sched.add('a', _raise)
+        sched.add('b', lambda: time.sleep(0.2) or 0)
+        sched.add('c', lambda: called.append('c') or 0, requires=('a',))
+
+        self.assertRaises(RuntimeError, sched.run)
+        self.assertEqual([], called)
+        self.assertIn('b', sched.timings)
+
+    def test_add_errors(self):
+        sched = StepScheduler()
+        sched.add('a', lambda: 0)
+        self.assertRaises(ValueError, sched.add, 'a', lambda: 0)
+        self.assertRaises(ValueError, sched.add, 'b', lambda: 0, ('unknown',))
@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Unit tests for tty_watcher """
+
+# pylint: disable=missing-docstring
+# pylint: disable=protected-access
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from gateway_code.utils import tty_watcher
+
+
+class TestTTYWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.tty = os.path.join(self.tmp_dir, 'ttyTEST')
+        self.watcher = tty_watcher.TTYWatcher()
+        self.timer = None
+
+    def tearDown(self):
+        if self.timer is not None:
+            self.timer.join()
+        shutil.rmtree(self.tmp_dir)
+
+    def _later(self, delay, func, *args):
+        self.timer = threading.Timer(delay, func, args)
+        self.timer.start()
+
+    def _create(self):
+        open(self.tty, 'w').close()
+
+    def test_wait_appear(self):
+        self._later(0.2, self._create)
+        t_ref = time.time()
+        self.assertTrue(self.watcher.wait(self.tty, True, 5))
+        # woken up by event, not by the recheck period
+        self.assertGreater(self.watcher.RECHECK_PERIOD, time.time() - t_ref)
+        self.assertIn(self.tmp_dir, self.watcher._watches)
+
+    def test_wait_disappear(self):
+        self._create()
+        self._later(0.2, os.remove, self.tty)
+        t_ref = time.time()
+        self.assertTrue(self.watcher.wait(self.tty, False, 5))
+        self.assertGreater(self.watcher.RECHECK_PERIOD, time.time() - t_ref)
+
+    def test_wait_timeout(self):
+        self.assertFalse(self.watcher.wait(self.tty, True, 0))
+        t_ref = time.time()
+        self.assertFalse(self.watcher.wait(self.tty, True, 0.3))
+        self.assertLessEqual(0.3, time.time() - t_ref)
+        self.assertTrue(self.watcher.wait(self.tty, False, 0))
+
+    def test_no_directory_polling(self):
+        tty = os.path.join(self.tmp_dir, 'not_a_dir', 'tty')
+        self.assertFalse(self.watcher.wait(tty, True, 0.2))
+        self.assertTrue(self.watcher.wait(tty, False, 0))
+        self.assertEqual({}, self.watcher._watches)
+
+    @mock.patch('gateway_code.utils.tty_watcher._inotify_libc')
+    def test_no_inotify_polling(self, libc):
+        libc.side_effect = OSError(38, 'inotify not available')
+        self._later(0.2, self._create)
+        self.assertTrue(self.watcher.wait(self.tty, True, 5))
+        self.assertFalse(self.watcher.available)
+        self.assertEqual({}, self.watcher._watches)
+
+    def test_module_wait_tty(self):
+        self.assertTrue(tty_watcher.wait_tty('/dev/null', True, 0))
+        self.assertTrue(tty_watcher.wait_tty('/dev/no_tty', False, 0))
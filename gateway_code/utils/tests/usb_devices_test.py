@@ -0,0 +1,168 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Test utils.usb_devices """
+
+import os
+import socket
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+from .. import usb_devices
+
+UEVENT = (b'add@/devices/pci0000:00/usb1/1-2\0ACTION=add\0'
+          b'DEVPATH=/devices/pci0000:00/usb1/1-2\0SUBSYSTEM=usb\0')
+NET_UEVENT = b'add@/devices/virtual/net/tap0\0ACTION=add\0SUBSYSTEM=net\0'
+
+
+def sysfs_device(root, name, **attrs):
+    """ Create a fake sysfs USB device `name` with `attrs` files """
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    for attr, value in attrs.items():
+        with open(os.path.join(path, attr), 'w') as attr_file:
+            attr_file.write(value + '\n')
+
+
+def sysfs_tree(root):
+    """ Fake sysfs with a root hub, a control node ftdi and an m3 ftdi """
+    sysfs_device(root, 'usb1', idVendor='1d6b', idProduct='0002',
+                 manufacturer='Linux 4.9.0 ehci_hcd', product='EHCI Host')
+    sysfs_device(root, '1-0:1.0', bInterfaceClass='09')
+    sysfs_device(root, '1-1', idVendor='0403', idProduct='6011',
+                 manufacturer='IoT-LAB', product='ControlNode')
+    sysfs_device(root, '1-1:1.0', bInterfaceClass='ff')
+    sysfs_device(root, '1-1.2', idVendor='0403', idProduct='6010',
+                 manufacturer='IoT-LAB', product='M3', serial='ABC42')
+
+
+class TestUsbDevices(unittest.TestCase):
+    """ Test usb devices sysfs enumeration and cache """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        sysfs_tree(self.root)
+        self.sock, self.events = socket.socketpair(socket.AF_UNIX,
+                                                   socket.SOCK_DGRAM)
+        self.addCleanup(self.events.close)
+        self.usb = usb_devices.UsbDevices(self.root)
+
+    def _start_monitor(self):
+        """ Start the devices monitor with a fake events socket """
+        with mock.patch.object(self.usb, '_monitor_socket',
+                               return_value=self.sock):
+            return self.usb.devices()
+
+    def _event(self, msg):
+        """ Send a hotplug event and wait it is handled """
+        handled = threading.Event()
+        invalidate = self.usb.invalidate
+
+        def _invalidate():
+            invalidate()
+            handled.set()
+
+        with mock.patch.object(self.usb, 'invalidate', _invalidate):
+            self.events.send(msg)
+            return handled.wait(0.5)
+
+    def test_enumerate_devices(self):
+        devices = usb_devices.enumerate_devices(self.root)
+        self.assertEqual(['1-1', '1-1.2', 'usb1'],
+                         [dev.name for dev in devices])
+        self.assertEqual(
+            usb_devices.UsbDevice('1-1.2', '0403', '6010', 'IoT-LAB', 'M3',
+                                  'ABC42'), devices[1])
+        self.assertIsNone(devices[0].serial)
+
+        self.assertEqual([], usb_devices.enumerate_devices(
+            os.path.join(self.root, 'not_a_dir')))
+
+    def test_find(self):
+        self._start_monitor()
+        self.assertEqual(['1-1', '1-1.2'],
+                         [dev.name for dev in self.usb.find('0403')])
+        self.assertEqual(['1-1.2'], [
+            dev.name for dev in self.usb.find('0403', '6010', 'M3')])
+        self.assertEqual([], self.usb.find('0403', '6011', 'M3'))
+        self.assertEqual([], self.usb.find('0403', '6014'))
+
+    def test_cache_invalidated_on_hotplug(self):
+        self.assertEqual(3, len(self._start_monitor()))
+        self.assertTrue(self.usb.hotplug)
+
+        # cached, new device not seen without event
+        sysfs_device(self.root, '1-2', idVendor='0403', idProduct='6014',
+                     product='Other')
+        with mock.patch('os.listdir') as listdir:
+            self.assertEqual(3, len(self.usb.devices()))
+            self.assertFalse(listdir.called)
+
+        # other subsystems events do not invalidate the cache
+        self.assertFalse(self._event(NET_UEVENT))
+        self.assertEqual(3, len(self.usb.devices()))
+
+        self.assertTrue(self._event(UEVENT))
+        self.assertEqual(4, len(self.usb.devices()))
+        self.assertEqual(['1-2'], [
+            dev.name for dev in self.usb.find('0403', '6014')])
+
+    def test_invalidated_during_enumeration(self):
+        self._start_monitor()
+        self.usb.invalidate()
+
+        enumerate_devices = usb_devices.enumerate_devices
+
+        def _enumerate(root):
+            devices = enumerate_devices(root)
+            self.usb.invalidate()  # hotplug event while enumerating
+            return devices
+
+        with mock.patch.object(usb_devices, 'enumerate_devices',
+                               side_effect=_enumerate) as enumerate_mock:
+            self.usb.devices()
+            self.usb.devices()
+        # result was not cached
+        self.assertEqual(2, enumerate_mock.call_count)
+
+    def test_no_hotplug_events(self):
+        with mock.patch.object(self.usb, '_monitor_socket',
+                               side_effect=OSError('no netlink')):
+            self.assertEqual(3, len(self.usb.devices()))
+        self.assertFalse(self.usb.hotplug)
+
+        # enumerated again on each lookup
+        sysfs_device(self.root, '1-2', idVendor='0403', idProduct='6014')
+        self.assertEqual(4, len(self.usb.devices()))
+
+    def test_monitor_stopped(self):
+        self._start_monitor()
+        self.events.send(b'')  # socket closed
+        self.usb._thread.join(1)  # pylint:disable=protected-access
+        self.assertFalse(self.usb.hotplug)
+
+        sysfs_device(self.root, '1-2', idVendor='0403', idProduct='6014')
+        self.assertEqual(4, len(self.usb.devices()))
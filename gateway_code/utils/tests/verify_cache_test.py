@@ -0,0 +1,130 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+# pylint: disable=missing-docstring
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from gateway_code.tests import utils
+from .elftarget_test import firmware
+from .. import verify_cache
+
+
+class TestVerifyCache(unittest.TestCase):
+
+    def setUp(self):
+        verify_cache.clear()
+        self.addCleanup(verify_cache.clear)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+        fw_idle = os.path.join(self.tmp_dir, 'idle.elf')
+        shutil.copy(firmware('m3_idle.elf'), fw_idle)
+
+        class Node(object):  # pylint:disable=too-few-public-methods
+            TYPE = 'node'
+            FW_IDLE = fw_idle
+            FW_AUTOTEST = None
+            verify = mock.Mock(return_value=0)
+
+        self.node = Node
+
+        patcher = mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enable(self):
+        patcher = mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+            'm3', verify_cache='on'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('gateway_code.config.GATEWAY_STATE_PATH',
+                             os.path.join(self.tmp_dir, 'state'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_process_cache(self):
+        self.assertEqual(0, verify_cache.verify(self.node))
+        self.assertEqual(0, verify_cache.verify(self.node))
+        self.assertEqual(1, self.node.verify.call_count)
+
+        # firmware changed
+        with open(self.node.FW_IDLE, 'ab') as fw_file:
+            fw_file.write(b'\0')
+        self.node.verify.return_value = 1
+        self.assertEqual(1, verify_cache.verify(self.node))
+        self.assertEqual(2, self.node.verify.call_count)
+
+        # firmware removed
+        os.remove(self.node.FW_IDLE)
+        self.assertEqual(1, verify_cache.verify(self.node))
+        self.assertEqual(3, self.node.verify.call_count)
+
+    def test_node_key(self):
+        key = verify_cache.node_key(self.node)
+        self.assertEqual(key, verify_cache.node_key(self.node))
+
+        with mock.patch('gateway_code.__version__', '0.0.0'):
+            self.assertNotEqual(key, verify_cache.node_key(self.node))
+
+        self.node.FW_AUTOTEST = firmware('m3_idle.elf')
+        self.assertNotEqual(key, verify_cache.node_key(self.node))
+
+    def test_disk_cache(self):
+        self._enable()
+        self.assertEqual(0, verify_cache.verify(self.node))
+        self.assertEqual(1, self.node.verify.call_count)
+
+        # new process
+        verify_cache.clear()
+        self.assertEqual(0, verify_cache.verify(self.node))
+        self.assertEqual(1, self.node.verify.call_count)
+
+        # other package version
+        verify_cache.clear()
+        with mock.patch('gateway_code.__version__', '0.0.0'):
+            self.assertEqual(0, verify_cache.verify(self.node))
+        self.assertEqual(2, self.node.verify.call_count)
+
+    @mock.patch('gateway_code.utils.verify_cache.LOGGER.warning')
+    def test_write_error(self, warning):
+        cache = verify_cache.VerifyCache(
+            os.path.join(self.node.FW_IDLE, 'cache.json'))
+        cache.update('node', 'abc', 0)
+        self.assertTrue(warning.called)
+        self.assertIsNone(cache.result('node', 'abc'))
+
+    def test_from_config(self):
+        self.assertIsNone(verify_cache.from_config())
+
+        self._enable()
+        self.assertTrue(verify_cache.from_config().path.endswith(
+            'verify_cache.json'))
+
+        with mock.patch(utils.READ_CONFIG, utils.read_config_mock(
+                'm3', verify_cache='invalid')):
+            self.assertIsNone(verify_cache.from_config())
@@ -0,0 +1,180 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Wait for devices files appearance or disappearance
+
+Uses Linux inotify on the device directory, like /dev or /dev/iotlab, so
+waiters are woken up as soon as udev creates or removes the tty.
+
+A single background thread reads inotify events for all the watched
+directories. When inotify is not available, or the directory does not
+exist, it falls back to polling the file presence.
+"""
+
+import os
+import time
+import errno
+import select
+import threading
+import ctypes
+import ctypes.util
+
+import logging
+LOGGER = logging.getLogger('gateway_code')
+
+# <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+def _inotify_libc():
+    """ Return libc with inotify functions.
+
+    :raises OSError: if inotify is not available """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+    except (OSError, AttributeError, TypeError) as err:
+        raise OSError(errno.ENOSYS, 'inotify not available: %s' % err)
+    return libc
+
+
+class TTYWatcher(object):
+    """ Wait for files presence changes using inotify """
+    EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ATTRIB
+    # Re-check files presence even without events, safety net for
+    # missed events like a symlink target appearing after the symlink
+    RECHECK_PERIOD = 1.0
+    POLL_PERIOD = 0.1
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._lock = threading.Lock()
+        self._libc = None
+        self._fd = None
+        self._watches = {}
+        self._thread = None
+        self.available = True
+
+    def wait(self, path, present=True, timeout=0):
+        """ Wait at max `timeout` for `path` presence to be `present`
+
+        :return: True if `path` presence was `present` before timeout """
+        end_time = time.time() + timeout
+        if not self._watch(os.path.dirname(os.path.abspath(path))):
+            return self._poll(path, present, end_time)
+
+        with self._cond:
+            while os.path.exists(path) != present:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, self.RECHECK_PERIOD))
+        return True
+
+    def _poll(self, path, present, end_time):
+        """ Fallback polling implementation """
+        while os.path.exists(path) != present:
+            if time.time() > end_time:
+                return False
+            time.sleep(self.POLL_PERIOD)
+        return True
+
+    def _watch(self, directory):
+        """ Add an inotify watch on `directory` if not already done
+
+        :return: False if directory cannot be watched """
+        with self._lock:
+            if directory in self._watches:
+                return True
+            if not self.available or not os.path.isdir(directory):
+                return False
+            try:
+                self._init_inotify()
+                self._add_watch(directory)
+            except OSError as err:
+                LOGGER.debug('TTY watcher: fallback to polling: %s', err)
+                return False
+            return True
+
+    def _init_inotify(self):
+        """ Init inotify and the reader thread on first call """
+        if self._fd is not None:
+            return
+        try:
+            self._libc = _inotify_libc()
+            fd_ = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd_ < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err))
+        except OSError:
+            self.available = False
+            raise
+        self._fd = fd_
+        self._thread = threading.Thread(target=self._reader,
+                                        name='tty-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _add_watch(self, directory):
+        """ Watch `directory` entries creation/deletion """
+        wd_ = self._libc.inotify_add_watch(self._fd, directory.encode(),
+                                           self.EVENTS)
+        if wd_ < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), directory)
+        self._watches[directory] = wd_
+
+    def _reader(self):
+        """ Wake up waiters on each inotify event """
+        while True:
+            select.select([self._fd], [], [])
+            try:
+                os.read(self._fd, 4096)
+            except OSError as err:
+                if err.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+                LOGGER.error('TTY watcher: read error %r', err)
+                self.available = False
+                break
+            with self._cond:
+                self._cond.notify_all()
+        with self._cond:
+            self._watches.clear()
+            self._cond.notify_all()
+
+
+WATCHER = TTYWatcher()
+
+
+def wait_tty(dev_tty, present=True, timeout=0):
+    """ Wait at max `timeout` for `dev_tty` presence to be `present`
+
+    :return: True if `dev_tty` presence was `present` before timeout """
+    return WATCHER.wait(dev_tty, present, timeout)
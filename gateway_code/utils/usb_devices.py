@@ -0,0 +1,198 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+""" USB devices enumeration from sysfs
+
+Devices attributes are read from /sys/bus/usb/devices instead of running
+an external lister. The enumeration is cached and invalidated on kernel
+USB hotplug events, received on a netlink uevent socket by a background
+thread. When hotplug events are not available, devices are enumerated
+on each lookup.
+"""
+
+import io
+import os
+import errno
+import socket
+import threading
+import collections
+
+import logging
+LOGGER = logging.getLogger('gateway_code')
+
+SYSFS_USB = '/sys/bus/usb/devices'
+
+# <linux/netlink.h>
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+UEVENT_BUFSIZE = 8192
+
+UsbDevice = collections.namedtuple(
+    'UsbDevice', ['name', 'vendor_id', 'product_id', 'manufacturer',
+                  'product', 'serial'])
+
+
+def _read_attr(path, attr):
+    """ Return sysfs attribute `attr` value, None if not readable """
+    try:
+        with io.open(os.path.join(path, attr), encoding='utf-8',
+                     errors='replace') as attr_file:
+            return attr_file.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def enumerate_devices(root=SYSFS_USB):
+    """ Return the USB devices found in sysfs `root` directory
+
+    Interfaces entries, like '1-1:1.0', are skipped. """
+    try:
+        entries = sorted(os.listdir(root))
+    except OSError as err:
+        LOGGER.error('USB devices: cannot list %r: %s', root, err)
+        return []
+
+    devices = []
+    for name in entries:
+        path = os.path.join(root, name)
+        vendor_id = _read_attr(path, 'idVendor')
+        if ':' in name or vendor_id is None:
+            continue
+        devices.append(UsbDevice(
+            name, vendor_id, _read_attr(path, 'idProduct'),
+            _read_attr(path, 'manufacturer'), _read_attr(path, 'product'),
+            _read_attr(path, 'serial')))
+    return devices
+
+
+def is_usb_event(msg):
+    """ Return if `msg` kernel uevent is about a USB device
+
+    >>> is_usb_event(b'add@/devices/usb1/1-1\\0ACTION=add\\0SUBSYSTEM=usb\\0')
+    True
+    >>> is_usb_event(b'add@/devices/virtual/net/lo\\0SUBSYSTEM=net\\0')
+    False
+    """
+    return b'\0SUBSYSTEM=usb\0' in msg + b'\0'
+
+
+class UsbDevices(object):
+    """ Cached USB devices enumeration """
+
+    def __init__(self, root=SYSFS_USB):
+        self.root = root
+        self._lock = threading.Lock()
+        self._devices = None
+        self._generation = 0
+        self._thread = None
+        self.hotplug = True
+
+    def devices(self):
+        """ Return USB devices, enumerated again after hotplug events """
+        with self._lock:
+            if self._devices is not None:
+                return self._devices
+            generation = self._generation
+            # listen to events before enumerating to not miss any
+            cached = self._monitor_start()
+
+        devices = enumerate_devices(self.root)
+
+        with self._lock:
+            if cached and generation == self._generation:
+                self._devices = devices
+        return devices
+
+    def find(self, vendor_id, product_id=None, product=None):
+        """ Return devices matching ids and `product` string when given """
+        return [dev for dev in self.devices()
+                if dev.vendor_id == vendor_id and
+                product_id in (None, dev.product_id) and
+                product in (None, dev.product)]
+
+    def invalidate(self):
+        """ Enumerate devices again on next lookup """
+        with self._lock:
+            self._generation += 1
+            self._devices = None
+
+    def _monitor_start(self):
+        """ Start hotplug events reader thread on first call
+
+        :return: False if hotplug events are not available """
+        if self._thread is not None or not self.hotplug:
+            return self.hotplug
+        try:
+            sock = self._monitor_socket()
+        except (AttributeError, OSError, socket.error) as err:
+            LOGGER.debug('USB devices: no hotplug events, no cache: %s', err)
+            self.hotplug = False
+            return False
+        self._thread = threading.Thread(target=self._reader, args=(sock,),
+                                        name='usb-hotplug')
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    @staticmethod
+    def _monitor_socket():
+        """ Return a socket receiving kernel uevents """
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                             NETLINK_KOBJECT_UEVENT)
+        try:
+            sock.bind((0, UEVENT_KERNEL_GROUP))
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def _reader(self, sock):
+        """ Invalidate devices on each USB hotplug event """
+        while True:
+            try:
+                msg = sock.recv(UEVENT_BUFSIZE)
+            except socket.error as err:
+                if err.errno == errno.EINTR:
+                    continue
+                if err.errno == errno.ENOBUFS:  # events lost
+                    self.invalidate()
+                    continue
+                LOGGER.error('USB devices: hotplug read error %r', err)
+                break
+            if not msg:
+                break
+            if is_usb_event(msg):
+                self.invalidate()
+
+        # stop caching without events
+        sock.close()
+        with self._lock:
+            self.hotplug = False
+            self._generation += 1
+            self._devices = None
+
+
+USB_DEVICES = UsbDevices()
+
+
+def find(vendor_id, product_id=None, product=None):
+    """ Return USB devices matching ids and `product` string when given """
+    return USB_DEVICES.find(vendor_id, product_id, product)
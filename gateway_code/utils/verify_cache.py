@@ -0,0 +1,152 @@
+# -*- coding:utf-8 -*-
+
+# This file is a part of IoT-LAB gateway_code
+# Copyright (C) 2015 INRIA (Contact: admin@iot-lab.info)
+# Contributor(s) : see AUTHORS file
+#
+# This software is governed by the CeCILL license under French law
+# and abiding by the rules of distribution of free software.  You can  use,
+# modify and/ or redistribute the software under the terms of the CeCILL
+# license as circulated by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info.
+#
+# As a counterpart to the access to the source code and  rights to copy,
+# modify and redistribute granted by the license, users are provided only
+# with a limited warranty  and the software's author,  the holder of the
+# economic rights,  and the successive licensors  have only  limited
+# liability.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+
+
+""" Open node classes verification results
+
+`OpenNodeBase.verify` checks the node firmwares elf targets and is run
+each time a `BoardConfig` is created. Its results are kept for the
+process and, with the 'verify_cache' gateway config key set to 'on',
+persisted in GATEWAY_STATE_PATH for the next processes (command line
+tools, gateway restarts).
+
+A result is valid for the same package version and the same content of
+the node class module and of its FW_IDLE and FW_AUTOTEST firmwares.
+"""
+
+import os
+import json
+import inspect
+import hashlib
+import logging
+import threading
+
+import gateway_code
+from gateway_code import config
+from gateway_code.utils import firmware_cache
+
+LOGGER = logging.getLogger('gateway_code')
+
+CACHE_FILE = 'verify_cache.json'
+MODES = ('off', 'on')
+FIRMWARES_ATTRS = ('FW_IDLE', 'FW_AUTOTEST')
+
+# verify results for this process, by node key
+_RESULTS = {}
+_RESULTS_LOCK = threading.Lock()
+
+
+def node_key(node_class):
+    """ Key of `node_class` verify result, changes with package version,
+    node module or node firmwares content """
+    files = [inspect.getsourcefile(node_class)]
+    files += [getattr(node_class, attr, None) for attr in FIRMWARES_ATTRS]
+
+    sha = hashlib.sha256()
+    name = getattr(node_class, '__qualname__', node_class.__name__)
+    sha.update(('%s:%s.%s' % (gateway_code.__version__, node_class.__module__,
+                              name)).encode())
+    for path in files:
+        try:
+            digest = firmware_cache.file_sha256(path) if path else 'none'
+        except (IOError, OSError):
+            digest = 'missing'
+        sha.update((':' + digest).encode())
+    return sha.hexdigest()
+
+
+def verify(node_class):
+    """ Return `node_class.verify()`, from cache when still valid """
+    key = node_key(node_class)
+    with _RESULTS_LOCK:
+        ret = _RESULTS.get(key)
+    if ret is not None:
+        return ret
+
+    cache = from_config()
+    ret = cache.result(node_class.TYPE, key) if cache else None
+    if ret is None:
+        ret = node_class.verify()
+        if cache:
+            cache.update(node_class.TYPE, key, ret)
+
+    with _RESULTS_LOCK:
+        _RESULTS[key] = ret
+    return ret
+
+
+def clear():
+    """ Forget this process verify results """
+    with _RESULTS_LOCK:
+        _RESULTS.clear()
+
+
+class VerifyCache(object):
+    """ Node types verify results with their key, stored in json `path` """
+    _lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+
+    def result(self, node_type, key):
+        """ Return `node_type` verify result for `key` or None """
+        entry = self._load().get(node_type)
+        if entry is None or entry.get('key') != key:
+            return None
+        return entry.get('verify')
+
+    def update(self, node_type, key, ret):
+        """ Store `node_type` verify result `ret` for `key` """
+        with self._lock:
+            entries = self._load()
+            entries[node_type] = {'key': key, 'verify': ret}
+            self._save(entries)
+
+    def _load(self):
+        try:
+            with open(self.path) as cache:
+                return json.load(cache)
+        except (IOError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        """ Atomically replace cache file """
+        tmp_path = '%s.%d' % (self.path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(tmp_path, 'w') as cache:
+                json.dump(entries, cache)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as err:
+            LOGGER.warning('Verify cache write error: %r', err)
+
+
+def from_config():
+    """ Return VerifyCache configured by 'verify_cache' config key,
+    `None` when disabled """
+    mode = config.read_config('verify_cache', 'off')
+    if mode not in MODES:
+        LOGGER.error('Invalid verify_cache mode %r, disable it', mode)
+        return None
+    if mode == 'off':
+        return None
+    return VerifyCache(os.path.join(config.GATEWAY_STATE_PATH, CACHE_FILE))
@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+# -*- coding:utf-8 -*-
+
+""" Benchmark nodes classes import
+
+Compares importing only the configured open and control nodes, with the
+nodes index, to importing all of them. Each case runs in a new interpreter
+and prints its median duration and the number of imported nodes modules.
+
+    python tests_utils/nodes_import_benchmark.py --runs 10
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import argparse
+import subprocess
+
+from gateway_code import nodes
+
+IMPORT_BENCH = """
+import sys
+import time
+t_0 = time.time()
+from gateway_code import nodes
+%s
+print(time.time() - t_0)
+print(len([mod for mod in sys.modules if mod.count('.') == 2 and
+           mod.startswith(('gateway_code.open_nodes.node_',
+                           'gateway_code.control_nodes.cn_'))]))
+"""
+
+CASES = [
+    ('lazy', "nodes.open_node_class('m3'); "
+             "nodes.control_node_class('iotlab')"),
+    ('all', "[nodes.open_node_class(node) for node in nodes.OPEN_NODES]; "
+            "[nodes.control_node_class(node) "
+            "for node in nodes.CONTROL_NODES]"),
+]
+
+
+def import_bench(code):
+    """ Run `code` after importing nodes in a new interpreter
+
+    Return (duration, imported nodes modules) """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(nodes.__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [path for path in [env.get('PYTHONPATH')] if path])
+    output = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_BENCH % code], env=env)
+    duration, modules = output.decode().split()
+    return float(duration), int(modules)
+
+
+def main(args=None):
+    """ Run benchmark and print results """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5,
+                        help="Interpreters started for each case")
+    opts = parser.parse_args(args)
+
+    for name, code in CASES:
+        results = [import_bench(code) for _ in range(0, opts.runs)]
+        durations = sorted(duration for duration, _ in results)
+        print('%-4s: %.3fs median, %d nodes modules' %
+              (name, durations[len(durations) // 2], results[0][1]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+# -*- coding:utf-8 -*-
+
+""" Benchmark GatewayRest server backends
+
+Runs the REST server with a mocked GatewayManager and sends concurrent
+status, flash and profile update requests. Some clients upload firmwares
+slowly, to check they do not delay other requests.
+Prints latency percentiles for each request type.
+
+    python tests_utils/rest_benchmark.py --server paste --clients 8
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import socket
+import argparse
+import threading
+import collections
+
+import mock
+
+try:
+    import http.client as httplib
+except ImportError:  # pragma: no cover
+    import httplib
+
+from gateway_code import rest_server
+from gateway_code.tests import utils
+
+BOUNDARY = 'rest-benchmark-boundary'
+FIRMWARE = b'\x7fELF' + b'\x00' * 64 * 1024
+PROFILE = b'{"profilename": "_default_profile", "power": "dc"}'
+
+
+def gateway_manager(flash_delay):
+    """ GatewayManager mock, flash takes `flash_delay` seconds """
+    g_m = mock.Mock()
+    g_m.status.return_value = 0
+    g_m.exp_update_profile.return_value = 0
+    g_m.node_flash.side_effect = lambda *_: time.sleep(flash_delay) or 0
+    return g_m
+
+
+def free_port():
+    """ Return an available tcp port """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_server(server, threads, port, flash_delay):
+    """ Run GatewayRest in a thread with `server` backend """
+    with mock.patch(utils.READ_CONFIG, utils.read_config_mock('m3')):
+        app = rest_server.GatewayRest(gateway_manager(flash_delay))
+    options = rest_server.server_options(server, threads)
+    if server == 'paste':
+        options['daemon_threads'] = True  # allow exiting
+    thread = threading.Thread(target=app.run, kwargs=dict(
+        host='127.0.0.1', port=port, server=server, quiet=True, **options))
+    thread.daemon = True
+    thread.start()
+
+    for _ in range(0, 100):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return
+        except socket.error:
+            time.sleep(0.1)
+    raise RuntimeError('Server %s not started' % server)
+
+
+def multipart(name, filename, content):
+    """ Encode a multipart/form-data body with one file """
+    return b''.join([
+        ('--%s\r\n' % BOUNDARY).encode(),
+        ('Content-Disposition: form-data; name="%s"; filename="%s"\r\n'
+         % (name, filename)).encode(),
+        b'Content-Type: application/octet-stream\r\n\r\n',
+        content,
+        ('\r\n--%s--\r\n' % BOUNDARY).encode()])
+
+
+def request(port, method, url, body=None, content_type=None, chunk_delay=0):
+    """ Send a request, `body` sent in 16 chunks separated by `chunk_delay`
+    Return the request duration """
+    start = time.time()
+    conn = httplib.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.putrequest(method, url)
+    if body is not None:
+        conn.putheader('Content-Type', content_type)
+        conn.putheader('Content-Length', str(len(body)))
+    conn.endheaders()
+    if body is not None:
+        size = len(body) // 16 + 1
+        for offset in range(0, len(body), size):
+            conn.send(body[offset:offset + size])
+            time.sleep(chunk_delay)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    assert response.status == 200, response.status
+    return time.time() - start
+
+
+REQUESTS = {
+    'status': lambda port: request(port, 'GET', '/status'),
+    'update': lambda port: request(port, 'POST', '/exp/update', PROFILE,
+                                   'application/json'),
+    'flash': lambda port: request(
+        port, 'POST', '/open/flash', multipart('firmware', 'fw.elf', FIRMWARE),
+        'multipart/form-data; boundary=%s' % BOUNDARY),
+    'slow_flash': lambda port: request(
+        port, 'POST', '/open/flash', multipart('firmware', 'fw.elf', FIRMWARE),
+        'multipart/form-data; boundary=%s' % BOUNDARY, chunk_delay=0.05),
+}
+
+
+def client(port, kinds, count, results):
+    """ Run `count` requests cycling on `kinds` """
+    for num in range(0, count):
+        kind = kinds[num % len(kinds)]
+        results[kind].append(REQUESTS[kind](port))
+
+
+def percentile(values, pct):
+    """ Nearest rank percentile
+
+    >>> percentile([1, 2, 3, 4], 50), percentile([1, 2, 3, 4], 100)
+    (2, 4)
+    """
+    values = sorted(values)
+    rank = int(round(pct / 100.0 * len(values) + 0.5)) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+def report(results, duration):
+    """ Print latency percentiles in ms by request type """
+    print('%-12s %6s %8s %8s %8s %8s' % (
+        'request', 'count', 'p50', 'p90', 'p99', 'max'))
+    for kind, values in sorted(results.items()):
+        print('%-12s %6d %8.1f %8.1f %8.1f %8.1f' % (
+            (kind, len(values)) +
+            tuple(1000 * percentile(values, pct) for pct in (50, 90, 99)) +
+            (1000 * max(values),)))
+    total = sum(len(values) for values in results.values())
+    print('%d requests in %.2fs: %.1f req/s' % (
+        total, duration, total / duration))
+
+
+def main(args=None):
+    """ Run benchmark """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=rest_server.SERVERS,
+                        default='paste')
+    parser.add_argument('--threads', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=8,
+                        help="Concurrent status/update/flash clients")
+    parser.add_argument('--slow-clients', type=int, default=1,
+                        help="Concurrent slow firmware uploads clients")
+    parser.add_argument('--requests', type=int, default=50,
+                        help="Requests per client")
+    parser.add_argument('--flash-delay', type=float, default=0.1,
+                        help="Mocked flash duration")
+    opts = parser.parse_args(args)
+
+    port = free_port()
+    start_server(opts.server, opts.threads, port, opts.flash_delay)
+
+    results = collections.defaultdict(list)
+    clients = [(['status', 'update', 'status', 'flash'], opts.requests)
+               for _ in range(0, opts.clients)]
+    clients += [(['slow_flash'], max(1, opts.requests // 10))
+                for _ in range(0, opts.slow_clients)]
+    threads = [threading.Thread(target=client,
+                                args=(port, kinds, count, results))
+               for kinds, count in clients]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report(results, time.time() - start)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())